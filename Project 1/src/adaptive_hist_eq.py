@@ -1,11 +1,448 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 import numpy as np
-from global_hist_eq import get_equalization_transform_of_img
+from global_hist_eq import get_equalization_transform_from_histogram
+from global_hist_eq import equalize_cumulative_distribution
+from global_hist_eq import get_bit_depth
+from global_hist_eq import get_equalization_transform_of_img_with_loops
+
+
+# The interpolation of the equalized image is done in bands of this many rows,
+# so that the temporary float arrays stay small even for very large images.
+INTERPOLATION_ROWS_PER_BAND = 256
+
+
+# This function takes as input an image.
+# It also takes as input the height and width of the contextual regions into which I will divide the input image.
+# It returns the equalization transforms of all the contextual regions in one array of shape
+# (number of regions in the first axis, number of regions in the second axis, 256).
+# transforms[x, y] is the equalization transform of the region (x * region_len_w, y * region_len_h).
+# It is also used for a band of rows of a bigger image, as long as the band starts at the first row of a region.
+# If a cache (an EqualizationTransformCache of transform_cache) is given, the transforms are taken from it when possible.
+def calculate_eq_transformations_of_region_band(img_array: np.ndarray, region_len_h: int, region_len_w: int,
+                                                cache=None):
+    levels_appearances = get_histograms_of_regions(img_array, region_len_h, region_len_w)
+    if cache is not None:
+        return cache.get_transforms_from_histograms(levels_appearances)
+    return get_equalization_transform_from_histogram(levels_appearances)
+
+
+# This function returns, for every pixel of an image with shape img_shape, the first bin of the histogram
+# of the contextual region it belongs to, i.e. region_index * levels, where region_index = x * regions_y + y.
+# It also returns the number of regions in each axis.
+def get_region_bin_offsets(img_shape, region_len_h, region_len_w, levels=256):
+    # The number of contextual regions in each axis (the last regions may be smaller than the others).
+    regions_x = -(-img_shape[0] // region_len_w)
+    regions_y = -(-img_shape[1] // region_len_h)
+
+    region_x_of_pixel = np.arange(img_shape[0]) // region_len_w
+    region_y_of_pixel = np.arange(img_shape[1]) // region_len_h
+    region_index = region_x_of_pixel[:, np.newaxis] * regions_y + region_y_of_pixel[np.newaxis, :]
+
+    return region_index * levels, regions_x, regions_y
+
+
+# This function counts the histograms of all the contextual regions of an image, in a single np.bincount.
+# The bin region_index * levels + k counts the appearances of the value k in that region.
+# It returns an array of shape (number of regions in the first axis, number of regions in the second axis, levels).
+def get_histograms_of_regions(img_array, region_len_h, region_len_w, region_bin_offsets=None, levels=256):
+    # The offsets can be calculated once and passed for many images of the same shape (e.g. the frames of a video).
+    if region_bin_offsets is None:
+        region_bin_offsets = get_region_bin_offsets(img_array.shape, region_len_h, region_len_w, levels)
+    offsets, regions_x, regions_y = region_bin_offsets
+
+    levels_appearances = np.bincount((offsets + img_array).ravel(), minlength=regions_x * regions_y * levels)
+    return levels_appearances.reshape(regions_x, regions_y, levels)
+
+
+# This class keeps the equalization transforms of the contextual regions in a sparse form,
+# only for the levels that appear in each region (instead of an array of shape (regions_x, regions_y, levels)).
+# keys is the sorted array of region_index * levels + k for every level k that appears in a region
+# (and for the level 0 of every region), and transforms[n] is the transform of the region at the level of keys[n].
+# A level that does not appear in a region has the same cumulative distribution as the previous level that appears,
+# so its transform is the transform of the largest key that is not larger than its own key.
+class SparseRegionTransforms:
+
+    def __init__(self, keys, transforms, regions_x, regions_y, levels):
+        self.keys = keys
+        self.transforms = transforms
+        self.shape = (regions_x, regions_y, levels)
+        self.dtype = transforms.dtype
+
+    # This function returns the transforms at the flat indices region_index * levels + k
+    # (the same indices as in the flat array of the dense transforms).
+    def take(self, flat_indices):
+        return self.transforms[np.searchsorted(self.keys, flat_indices, side='right') - 1]
+
+
+# This function returns a function that takes flat indices region_index * levels + k and returns
+# the transforms of the regions at the levels k, for dense (an array) or sparse (SparseRegionTransforms) transforms.
+def get_transform_take(transforms):
+    if isinstance(transforms, SparseRegionTransforms):
+        return transforms.take
+    return transforms.reshape(-1).take
+
+
+# This function replaces the pixel values of an image by their rank among the levels that appear in the image.
+# The level 0 always has rank 0, so that the cumulative distribution of the ranks starts like the one of the levels.
+# The equalization transforms of the ranks are the same as the transforms of the levels they replace,
+# but the histograms need only as many levels as there are distinct values in the image (at most 65536 for uint16).
+# It returns the image of the ranks and the number of levels that appear.
+def get_ranks_of_present_levels(img_array):
+    present = np.bincount(np.ravel(img_array)) > 0
+    present[0] = True
+    rank_of_level = (np.cumsum(present) - 1).astype(np.uint16 if present.size <= 65536 else np.uint32)
+    return np.take(rank_of_level, img_array), int(np.count_nonzero(present))
+
+
+# This function calculates the equalization transforms of all the contextual regions of an image of levels levels,
+# in the sparse form of SparseRegionTransforms. The pixels are sorted by region and value (np.unique),
+# so the memory that is used is proportional to the number of pixels and not to regions * levels.
+def calculate_sparse_eq_transformations_of_regions(img_array, region_len_h, region_len_w, levels, output_levels):
+    offsets, regions_x, regions_y = get_region_bin_offsets(img_array.shape, region_len_h, region_len_w, levels)
+    region_first_keys = np.arange(regions_x * regions_y) * levels
+
+    # The level 0 of every region is added once (and removed from the counts), so every region starts with its level 0.
+    keys, levels_appearances = np.unique(np.concatenate([(offsets + img_array).ravel(), region_first_keys]),
+                                         return_counts=True)
+    region_starts = np.searchsorted(keys, region_first_keys)
+    levels_appearances[region_starts] -= 1
+    region_ends = np.append(region_starts[1:], keys.size) - 1
+    region_of_key = keys // levels
+
+    # The cumulative distribution of each region is the cumulative sum of its counts divided by its number of pixels.
+    cumulative_appearances = np.cumsum(levels_appearances)
+    cumulative_appearances -= (cumulative_appearances[region_starts] - levels_appearances[region_starts])[region_of_key]
+    u_list = cumulative_appearances / cumulative_appearances[region_ends][region_of_key]
+
+    # The smallest element of the cumulative distribution of a region is the one of its level 0, and the largest the last one.
+    transforms = equalize_cumulative_distribution(u_list, u_list[region_starts][region_of_key],
+                                                  u_list[region_ends][region_of_key], output_levels)
+
+    return SparseRegionTransforms(keys, transforms, regions_x, regions_y, levels)
+
+
+# This function calculates the equalization transforms of all the contextual regions of a high bit depth image
+# (e.g. uint16 with 12-16 bits of data), which map every pixel to a value of output_bits bits.
+# The pixel values are replaced by their ranks (get_ranks_of_present_levels), and the histograms of the regions are
+# dense (like the ones of the uint8 images) if they are not larger than the image, otherwise they are sparse.
+# It returns the transforms and the image of the ranks, which must be passed together to apply_eq_transformations_of_regions.
+def calculate_high_bit_depth_eq_transformations_of_regions(img_array, region_len_h, region_len_w, output_bits=None):
+    if output_bits is None:
+        output_bits = get_bit_depth(img_array.dtype)
+    output_levels = 2 ** output_bits
+
+    ranks, present_levels = get_ranks_of_present_levels(img_array)
+
+    regions = -(-img_array.shape[0] // region_len_w) * -(-img_array.shape[1] // region_len_h)
+    if regions * present_levels <= img_array.size:
+        levels_appearances = get_histograms_of_regions(ranks, region_len_h, region_len_w, levels=present_levels)
+        transforms = get_equalization_transform_from_histogram(levels_appearances, output_levels)
+    else:
+        transforms = calculate_sparse_eq_transformations_of_regions(ranks, region_len_h, region_len_w, present_levels,
+                                                                    output_levels)
+
+    return transforms, ranks
+
+
+# The same as calculate_eq_transformations_of_region_band, for the band [x_start, x_end) of an image
+# that is stored in shared memory. It runs in the worker processes of a process pool,
+# which attach to the shared memory, so the image is never pickled.
+def calculate_eq_transformations_of_shared_band(shm_name, shape, dtype, region_len_h, region_len_w, x_start, x_end):
+    shm = SharedMemory(name=shm_name)
+    img_array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    try:
+        return calculate_eq_transformations_of_region_band(img_array[x_start:x_end], region_len_h, region_len_w)
+    finally:
+        del img_array
+        shm.close()
+
+
+# This function returns the number of workers of an executor of concurrent.futures.
+# ThreadPoolExecutor and ProcessPoolExecutor keep it in _max_workers. For other executors, which may not have it,
+# it is the number of CPUs.
+def get_executor_workers(executor):
+    workers = getattr(executor, '_max_workers', None)
+    if not isinstance(workers, int) or workers < 1:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+# This function takes as input an image.
+# It also takes as input the height and width of the contextual regions into which I will divide the input image.
+# It returns the equalization transforms of all the contextual regions in one array of shape
+# (number of regions in the first axis, number of regions in the second axis, 256).
+# If an executor (from concurrent.futures) is given, the rows of regions are split into bands
+# (by default one for each worker of the executor, see get_executor_workers)
+# and the transforms of each band are calculated in parallel.
+# With a ThreadPoolExecutor the workers read the image directly (numpy releases the GIL),
+# and with a ProcessPoolExecutor the image is copied once into shared memory.
+# If a cache of transforms is given, the transforms are taken from it when possible
+# (the cache is not used by the workers of a ProcessPoolExecutor, because it cannot be shared between processes).
+def calculate_eq_transformations_of_regions_grid(img_array: np.ndarray, region_len_h: int, region_len_w: int,
+                                                 executor=None, bands=None, cache=None):
+    if executor is None:
+        return calculate_eq_transformations_of_region_band(img_array, region_len_h, region_len_w, cache)
+
+    regions_x = -(-img_array.shape[0] // region_len_w)
+    regions_y = -(-img_array.shape[1] // region_len_h)
+    if bands is None:
+        bands = get_executor_workers(executor)
+
+    # The first row of regions of each band. Each band is a contiguous block of rows of regions.
+    band_regions = np.linspace(0, regions_x, min(bands, regions_x) + 1).astype(int)
+    band_rows = [(band_regions[b] * region_len_w, band_regions[b + 1] * region_len_w)
+                 for b in range(len(band_regions) - 1)]
+
+    transforms = np.empty((regions_x, regions_y, 256), dtype=np.uint8)
+
+    if isinstance(executor, ProcessPoolExecutor):
+        shm = SharedMemory(create=True, size=max(img_array.nbytes, 1))
+        shared_img = np.ndarray(img_array.shape, dtype=img_array.dtype, buffer=shm.buf)
+        try:
+            shared_img[...] = img_array
+            futures = [executor.submit(calculate_eq_transformations_of_shared_band, shm.name, img_array.shape,
+                                       img_array.dtype, region_len_h, region_len_w, x_start, x_end)
+                       for x_start, x_end in band_rows]
+            for b, future in enumerate(futures):
+                transforms[band_regions[b]:band_regions[b + 1]] = future.result()
+        finally:
+            del shared_img
+            shm.close()
+            shm.unlink()
+    else:
+        futures = [executor.submit(calculate_eq_transformations_of_region_band, img_array[x_start:x_end],
+                                   region_len_h, region_len_w, cache)
+                   for x_start, x_end in band_rows]
+        for b, future in enumerate(futures):
+            transforms[band_regions[b]:band_regions[b + 1]] = future.result()
+
+    return transforms
 
 
 # This function takes as input an image.
 # It also takes as input the height and width of the contextual regions into which I will divide the input image.
 # It returns the equalization transform for each contextual region (in a dictionary).
-def calculate_eq_transformations_of_regions(img_array: np.ndarray, region_len_h: int, region_len_w: int):
+# The dictionary is built from the array of calculate_eq_transformations_of_regions_grid
+# (the executor and the cache are passed to it).
+def calculate_eq_transformations_of_regions(img_array: np.ndarray, region_len_h: int, region_len_w: int,
+                                            executor=None, cache=None):
+    # In this dictionary, each key is a tuple representing a specific contextual region.
+    # The region_to_eq_transform[key] is the equalization transform of the corresponding contextual region.
+    region_to_eq_transform = {}
+
+    transforms = calculate_eq_transformations_of_regions_grid(img_array, region_len_h, region_len_w, executor,
+                                                              cache=cache)
+    for x in range(transforms.shape[0]):
+        for y in range(transforms.shape[1]):
+            # I write (i, j) because in indexing, the first coordinate is the width and the second coordinate is the height.
+            # Otherwise, if I wrote (j, i), I would have an error.
+            region_to_eq_transform[(x * region_len_w, y * region_len_h)] = transforms[x, y]
+
+    return region_to_eq_transform  # It returns a dictionary
+
+
+# This function maps the pixels img_array[rows][:, cols] through the equalization transform
+# of the contextual region that each one of them belongs to.
+# rows and cols are arrays with the indices of the pixels in the first and second axis.
+def map_pixels_through_their_regions(img_array, transforms, rows, cols, region_len_h, region_len_w):
+    regions_y, levels = transforms.shape[1], transforms.shape[2]
+    region_index = (rows // region_len_w)[:, np.newaxis] * regions_y + (cols // region_len_h)[np.newaxis, :]
+    return get_transform_take(transforms)(region_index * levels + img_array[np.ix_(rows, cols)])
+
+
+# This function maps the pixels of a contextual region that satisfy a condition through the transform of that region.
+# The condition takes the coordinates i, j of the pixels and the center of the region and returns a boolean mask.
+# Only the pixels inside the window (x_start, x_end, y_start, y_end) of the image are mapped.
+def map_region_pixels_where(equalized_img, img_array, transforms, region, region_center, region_len_h,
+                            region_len_w, condition, window):
+    x0 = max(region[0] * region_len_w, window[0])
+    x1 = min((region[0] + 1) * region_len_w, window[1])
+    y0 = max(region[1] * region_len_h, window[2])
+    y1 = min((region[1] + 1) * region_len_h, window[3])
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    i = np.arange(x0, x1)[:, np.newaxis]
+    j = np.arange(y0, y1)[np.newaxis, :]
+    mask = condition(i, j, region_center)
+
+    # The first flat index of the region (as an np.intp, so that adding the pixel values does not overflow their type).
+    region_first_index = np.intp((region[0] * transforms.shape[1] + region[1]) * transforms.shape[2])
+    equalized_block = equalized_img[x0:x1, y0:y1]
+    equalized_block[mask] = get_transform_take(transforms)(region_first_index + img_array[x0:x1, y0:y1][mask])
+
+
+# This function takes as input an image.
+# It also takes as input the height and width of the contextual regions of the input image.
+# It returns the equalized image, which is generated using adaptive equalization transform.
+# If an executor is given, the transforms of the regions are calculated in parallel with it,
+# and if a cache of transforms is given, the transforms are taken from it when possible.
+# uint16 images (and uint8 images with output_bits other than 8) are equalized with
+# calculate_high_bit_depth_eq_transformations_of_regions, and the equalized image has output_bits bits
+# (by default the bits of the image type). This path does not support the executor and the cache
+# (its histograms are of the ranks of the whole image), so giving them raises a ValueError.
+def perform_adaptive_hist_equalization(img_array, region_len_h, region_len_w, executor=None, cache=None,
+                                       output_bits=None):
+    if img_array.dtype != np.uint8 or output_bits not in (None, 8):
+        if executor is not None or cache is not None:
+            raise ValueError("The executor and the cache are supported only for uint8 images with 8 output bits, "
+                             "not for %s images with output_bits=%s" % (img_array.dtype, output_bits))
+        transforms, ranks = calculate_high_bit_depth_eq_transformations_of_regions(img_array, region_len_h,
+                                                                                   region_len_w, output_bits)
+        return apply_eq_transformations_of_regions(ranks, transforms, region_len_h, region_len_w)
+
+    transforms = calculate_eq_transformations_of_regions_grid(img_array, region_len_h, region_len_w, executor,
+                                                              cache=cache)
+    return apply_eq_transformations_of_regions(img_array, transforms, region_len_h, region_len_w)
+
+
+# This function generates the adaptive equalized image from the transforms of the contextual regions
+# (as returned by calculate_eq_transformations_of_regions_grid, or the dense or sparse transforms of
+# calculate_high_bit_depth_eq_transformations_of_regions, together with its image of ranks).
+# All the transforms are kept in one array and every step is applied to whole blocks of pixels at once,
+# so the cost is linear in the number of pixels and does not depend on the number of contextual regions.
+# The equalized image has the type of the transforms.
+# If out is given (an array with the shape of the input image and the type of the transforms), the equalized image is written in it.
+# If a window (x_start, x_end, y_start, y_end) is also given, only the pixels of out inside the window are calculated
+# (exactly as if the whole image was calculated) and the rest of out is not changed.
+def apply_eq_transformations_of_regions(img_array, transforms, region_len_h, region_len_w, out=None, window=None):
+    img_w = img_array.shape[0]
+    img_h = img_array.shape[1]
+
+    if window is None:
+        window = (0, img_w, 0, img_h)
+    window_x_start, window_x_end, window_y_start, window_y_end = window
+
+    # I initialize the equalized image as a black image with the dimensions of the input image.
+    if out is None:
+        equalized_img = np.zeros(img_array.shape, dtype=transforms.dtype)
+    else:
+        equalized_img = out
+        equalized_img[window_x_start:window_x_end, window_y_start:window_y_end] = 0
+
+    regions_x, regions_y, levels = transforms.shape
+
+    # I calculate the center of every contextual region.
+    # centers_x[x] is the first coordinate of the centers of the regions (x, .),
+    # and centers_y[y] is the second coordinate of the centers of the regions (., y).
+    centers_x = np.arange(regions_x) * region_len_w + (region_len_w - 1) // 2
+    centers_y = np.arange(regions_y) * region_len_h + (region_len_h - 1) // 2
+
+    max_x_region = regions_x - 1
+    max_y_region = regions_y - 1
+
+    """
+    I find which pixels of the input image are in the red area (Figure 7) of each corner of the image
+    and apply the equalization transform of the contextual region representing that specific corner.
+    The corners are processed in this order, so if two corners are the same region, the last one is kept.
+    """
+    corners = [
+        ((0, 0), lambda i, j, c: (i < c[0]) | (j < c[1])),                        # The left down corner.
+        ((0, max_y_region), lambda i, j, c: (i < c[0]) | (j > c[1])),             # The left up corner.
+        ((max_x_region, 0), lambda i, j, c: (i > c[0]) | (j < c[1])),             # The right down corner.
+        ((max_x_region, max_y_region), lambda i, j, c: (i > c[0]) | (j > c[1])),  # The right up corner.
+    ]
+    for region, condition in corners:
+        region_center = (centers_x[region[0]], centers_y[region[1]])
+        map_region_pixels_where(equalized_img, img_array, transforms, region, region_center, region_len_h,
+                                region_len_w, condition, window)
+
+    """
+    For the contextual regions located on the borders of the image (except the corners), I find the outer points.
+    The outer points of all the regions of a border form a single strip of the image,
+    so I apply the equalization transform of the boundary region, to which each pixel is located, to the whole strip.
+    A region that is both on the left and on the right border (only one row of regions) belongs to the left border,
+    and a region that is both on the up and on the down border (only one column of regions) belongs to the up border.
+    """
+    inner_rows = np.arange(region_len_w, max_x_region * region_len_w)  # The rows of the regions that are not on the left or right border.
+    inner_cols = np.arange(region_len_h, max_y_region * region_len_h)  # The columns of the regions that are not on the up or down border.
+
+    border_strips = [
+        (np.arange(0, min(centers_x[0], img_w)), inner_cols),  # The left border, where i < region_center[0].
+        (np.arange(centers_x[-1] + 1, img_w) if max_x_region > 0 else np.arange(0), inner_cols),  # The right border.
+        (inner_rows, np.arange(centers_y[-1] + 1, img_h)),  # The up border, where j > region_center[1].
+        (inner_rows, np.arange(0, min(centers_y[0], img_h)) if max_y_region > 0 else np.arange(0)),  # The down border.
+    ]
+    for rows, cols in border_strips:
+        rows = rows[(rows >= window_x_start) & (rows < window_x_end)]
+        cols = cols[(cols >= window_y_start) & (cols < window_y_end)]
+        equalized_img[np.ix_(rows, cols)] = map_pixels_through_their_regions(img_array, transforms, rows, cols,
+                                                                             region_len_h, region_len_w)
+
+    # If a pixel of the input image corresponds to the center of a contextual region,
+    # then I map it to the equalized image using the equalization transform of the contextual region centered at that specific pixel.
+    center_rows = centers_x[centers_x < img_w]
+    center_cols = centers_y[centers_y < img_h]
+    window_center_rows = center_rows[(center_rows >= window_x_start) & (center_rows < window_x_end)]
+    window_center_cols = center_cols[(center_cols >= window_y_start) & (center_cols < window_y_end)]
+    equalized_img[np.ix_(window_center_rows, window_center_cols)] = map_pixels_through_their_regions(
+        img_array, transforms, window_center_rows, window_center_cols, region_len_h, region_len_w)
+
+    is_center_row = np.zeros(img_w, dtype=bool)
+    is_center_row[center_rows] = True
+    is_center_col = np.zeros(img_h, dtype=bool)
+    is_center_col[center_cols] = True
+
+    """
+    Each center (h-,w-) together with its 3 neighboring centers (h+,w-), (h-,w+), (h+,w+) in figure 4
+    forms the vertices of a new region, in which I apply the bilinear interpolation of equation 4.
+    The neighbors of the center (centers_x[x], centers_y[y]) are the centers of the regions (x, y - 1), (x + 1, y) and (x + 1, y - 1).
+    A center can have neighboring centers only if centers_x[x] + region_len_w < img_w and y > 0.
+    The new regions share their sides. A pixel on a shared side belongs to the last of them (largest x, then largest y),
+    and the pixels that coincide with the center of a contextual region are not interpolated.
+    """
+    interpolated_regions_x = np.count_nonzero(centers_x + region_len_w < img_w)
+    if interpolated_regions_x == 0 or regions_y < 2:
+        return equalized_img  # Ιt returns the equalized image
+
+    # All the pixels of the new regions form the rectangle [x_start, x_end) x [y_start, y_end).
+    # (Only its part inside the window is calculated.)
+    x_start = max(centers_x[0], window_x_start)
+    x_end = min(centers_x[interpolated_regions_x - 1] + region_len_w + 1, img_w, window_x_end)
+    y_start = max(centers_y[0], window_y_start)
+    y_end = min(centers_y[-1] + 1, img_h, window_y_end)
+    if x_start >= x_end or y_start >= y_end:
+        return equalized_img  # Ιt returns the equalized image
+
+    cols = np.arange(y_start, y_end)[np.newaxis, :]
+    # y is the region whose center is the first one that is not on the left of the pixel.
+    y = np.minimum((cols + region_len_h - centers_y[0]) // region_len_h, max_y_region)
+    b = (cols - centers_y[y]) / (-region_len_h)
+
+    # transforms[x, y, k] is at the flat index (x * regions_y + y) * levels + k, so the 4 transforms of a pixel
+    # are found by adding a constant step to the same flat index.
+    take_transforms = get_transform_take(transforms)
+    x_step = regions_y * levels
+
+    for band_start in range(x_start, x_end, INTERPOLATION_ROWS_PER_BAND):
+        band_end = min(band_start + INTERPOLATION_ROWS_PER_BAND, x_end)
+
+        rows = np.arange(band_start, band_end)[:, np.newaxis]
+        # x is the region whose center is the last one that is not below the pixel.
+        x = np.minimum((rows - centers_x[0]) // region_len_w, interpolated_regions_x - 1)
+        a = (rows - centers_x[x]) / region_len_w
+
+        values = img_array[band_start:band_end, y_start:y_end]
+        first_c = (x * regions_y + y) * levels + values  # The flat index of transforms[x, y, values].
+        t1 = (1 - a) * (1 - b) * take_transforms(first_c)
+        t2 = (1 - a) * b * take_transforms(first_c - levels)  # transforms[x, y - 1, values]
+        t3 = a * (1 - b) * take_transforms(first_c + x_step)  # transforms[x + 1, y, values]
+        t4 = a * b * take_transforms(first_c + x_step - levels)  # transforms[x + 1, y - 1, values]
+        interpolated = (t1 + t2 + t3 + t4).astype(equalized_img.dtype)
+
+        not_center = ~(is_center_row[band_start:band_end, np.newaxis] & is_center_col[np.newaxis, y_start:y_end])
+        np.copyto(equalized_img[band_start:band_end, y_start:y_end], interpolated, where=not_center)
+
+    return equalized_img  # Ιt returns the equalized image
+
+
+# These are the first versions of calculate_eq_transformations_of_regions and perform_adaptive_hist_equalization,
+# with loops over the contextual regions and the pixels. I keep them to check and benchmark the new versions.
+# (They work only on uint8 images, like get_equalization_transform_of_img_with_loops, which they use, and they fail
+# on some narrow grids of regions, e.g. a single region that is larger than the image.)
+def calculate_eq_transformations_of_regions_with_loops(img_array: np.ndarray, region_len_h: int, region_len_w: int):
     # In this dictionary, each key is a tuple representing a specific contextual region.
     # The region_to_eq_transform[key] is the equalization transform of the corresponding contextual region.
     region_to_eq_transform = {}
@@ -17,7 +454,7 @@ def calculate_eq_transformations_of_regions(img_array: np.ndarray, region_len_h:
             # I divide the input image into individual regions (contextual regions).
             # Each such region is a sub-image of the input image.
             # For each such sub-image, I calculate its equalization transform.
-            eq_transform = get_equalization_transform_of_img(img_array[i:i + region_len_w, j:j + region_len_h])
+            eq_transform = get_equalization_transform_of_img_with_loops(img_array[i:i + region_len_w, j:j + region_len_h])
 
             # I write (i, j) because in indexing, the first coordinate is the width and the second coordinate is the height.
             # Otherwise, if I wrote (j, i), I would have an error.
@@ -29,7 +466,7 @@ def calculate_eq_transformations_of_regions(img_array: np.ndarray, region_len_h:
 # This function takes as input an image.
 # It also takes as input the height and width of the contextual regions of the input image.
 # It returns the equalized image, which is generated using adaptive equalization transform.
-def perform_adaptive_hist_equalization(img_array, region_len_h, region_len_w):
+def perform_adaptive_hist_equalization_with_loops(img_array, region_len_h, region_len_w):
 
     # I initialize the equalized image as a black image with the dimensions of the input image.
     equalized_img = np.zeros_like(img_array)
@@ -38,7 +475,7 @@ def perform_adaptive_hist_equalization(img_array, region_len_h, region_len_w):
     # and the values are the centers of the corresponding contextual regions.
     centers_dict = {}
 
-    region_to_eq_transform = calculate_eq_transformations_of_regions(img_array, region_len_h, region_len_w)
+    region_to_eq_transform = calculate_eq_transformations_of_regions_with_loops(img_array, region_len_h, region_len_w)
     for key in region_to_eq_transform:
         # I calculate the center of every contextual region.
         centers_dict[key] = [key[0] + (region_len_w - 1)//2, key[1] + (region_len_h - 1)//2]
@@ -0,0 +1,76 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from adaptive_hist_eq import calculate_eq_transformations_of_regions_grid
+from adaptive_hist_eq import perform_adaptive_hist_equalization
+from global_hist_eq import perform_global_hist_equalization
+from video_hist_eq import perform_global_hist_equalization_of_frames
+from video_hist_eq import perform_adaptive_hist_equalization_of_frames
+
+# In the benchmark, I measure the running time of the equalization functions on large random images.
+# Every measurement is the best of a few repetitions, so that it is not affected by the first (cold) call.
+
+
+# This function returns the best running time (in seconds) of function(), out of repeat calls.
+def best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# This function measures how the calculation of the transforms of the contextual regions scales with the number of workers.
+def benchmark_parallel_region_transforms(img_array, region_len_h, region_len_w, workers_list=(1, 4, 16)):
+    print("Transforms of the contextual regions of a %d x %d image (%d x %d regions, %d CPUs)"
+          % (img_array.shape[0], img_array.shape[1], region_len_w, region_len_h, os.cpu_count() or 1))
+
+    serial_time = best_time(lambda: calculate_eq_transformations_of_regions_grid(img_array, region_len_h, region_len_w))
+    print("  serial              : %8.3f s" % serial_time)
+
+    for executor_class in (ThreadPoolExecutor, ProcessPoolExecutor):
+        for workers in workers_list:
+            with executor_class(max_workers=workers) as executor:
+                parallel_time = best_time(lambda: calculate_eq_transformations_of_regions_grid(
+                    img_array, region_len_h, region_len_w, executor))
+            print("  %-18s %2d workers : %8.3f s (speedup %.2f)"
+                  % (executor_class.__name__, workers, parallel_time, serial_time / parallel_time))
+
+
+# This function measures the throughput (frames per second) of the equalization of a stack of frames,
+# frame by frame and with the batch functions of video_hist_eq (which write into a preallocated output stack).
+def benchmark_frame_stack(frames, region_len_h, region_len_w, smoothing=0.9):
+    print("Equalization of %d frames of %d x %d" % frames.shape)
+    out = np.empty_like(frames)
+    frames_count = frames.shape[0]
+
+    def global_frame_by_frame():
+        for t in range(frames_count):
+            perform_global_hist_equalization(frames[t], out=out[t])
+
+    def adaptive_frame_by_frame():
+        for t in range(frames_count):
+            out[t] = perform_adaptive_hist_equalization(frames[t], region_len_h, region_len_w)
+
+    measurements = [
+        ("global, frame by frame", global_frame_by_frame),
+        ("global, batch", lambda: perform_global_hist_equalization_of_frames(frames, smoothing, out=out)),
+        ("adaptive, frame by frame", adaptive_frame_by_frame),
+        ("adaptive, batch", lambda: perform_adaptive_hist_equalization_of_frames(
+            frames, region_len_h, region_len_w, smoothing, out=out)),
+    ]
+    for name, function in measurements:
+        print("  %-25s: %8.1f frames/s" % (name, frames_count / best_time(function)))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    img_24mp = rng.integers(0, 256, size=(4000, 6000), dtype=np.uint8)  # A 24 MP image.
+
+    benchmark_parallel_region_transforms(img_24mp, 64, 48)
+
+    frames_1080p = rng.integers(0, 256, size=(30, 1080, 1920), dtype=np.uint8)  # 30 frames of 1080p video.
+
+    benchmark_frame_stack(frames_1080p, 64, 48)
@@ -1,8 +1,125 @@
 import numpy as np
 
 
+# This function counts the appearances of each pixel value (0 to 255) in the input image.
+# It returns an array of 256 integers, levels_appearances[k] is the number of pixels with value k.
+# For uint16 images the array is longer, it has one count for each value up to the largest value of the image.
+def get_histogram_of_img(img_array):
+    # np.bincount counts all pixels in a single pass, instead of a Python loop over every pixel.
+    # minlength=256 makes sure that the levels which do not appear in the image get a count of 0.
+    return np.bincount(np.ravel(img_array), minlength=256)
+
+
+# This function returns the number of bits of the pixel values of an image type (8 for uint8 and 16 for uint16).
+# It is the default bit depth of the equalized image.
+def get_bit_depth(dtype):
+    return np.iinfo(dtype).bits
+
+
+# This function calculates the cumulative distribution (u_list) of a histogram.
+# levels_appearances[k] is the number of appearances of the pixel value k.
+# levels_appearances can also be a stack of histograms (e.g. one for each contextual region),
+# the levels are always in its last axis and a u_list is calculated for each histogram.
+def get_cumulative_distribution_from_histogram(levels_appearances):
+    # The total number of pixels in the image.
+    total_pixels = np.sum(levels_appearances, axis=-1, keepdims=True)
+
+    # The element u_list[i] corresponds to: p(x_0) + ... + p(x_i).
+    # So, u_list[i] must take values from 0 to 1,
+    # where x_0 is the smallest pixel value and x_i is the i-th in sequence pixel value.
+    # The cumulative sum gives all the partial sums of the appearances at once.
+    return np.cumsum(levels_appearances, axis=-1) / total_pixels
+
+
+# This function calculates and returns the equalization transform that corresponds to a cumulative distribution u_list.
+# Like the histograms, u_list can be a stack of cumulative distributions with the levels in its last axis.
+# output_levels is the number of levels of the equalized image (by default the number of levels of u_list).
+def get_equalization_transform_from_cumulative_distribution(u_list, output_levels=None):
+    if output_levels is None:
+        output_levels = u_list.shape[-1]  # The number of all possible pixel values.
+
+    u_list_min = np.min(u_list, axis=-1, keepdims=True)
+    u_list_max = np.max(u_list, axis=-1, keepdims=True)
+
+    return equalize_cumulative_distribution(u_list, u_list_min, u_list_max, output_levels)
+
+
+# This function applies equation 2 to the elements of u_list, given the smallest and the largest element of u_list.
+# (They are given separately, because u_list may contain only some of the levels, e.g. the levels of a sparse histogram.)
+# The transform has type uint8 if output_levels <= 256, and uint16 otherwise.
+def equalize_cumulative_distribution(u_list, u_list_min, u_list_max, output_levels):
+    # If all the pixels of the image are 0, u_list is constant and the normalization below divides 0 by 0.
+    # In that case every level is mapped to 0 (np.nan_to_num), which is the only value that appears.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Normalize u_list elements to be between 0 and 1.
+        u_list_normalized = (u_list - u_list_min) / (u_list_max - u_list_min)
+
+        # v0 is the normalized u_list of the first level, which is the smallest element of u_list.
+        v0 = (u_list_min - u_list_min) / (u_list_max - u_list_min)
+
+        # I apply equation 2 for all the levels k at once and calculate the equalization transform.
+        d = (u_list_normalized - v0) / (1 - v0)
+        num = np.nan_to_num(d * (output_levels - 1))
+
+    # np.round rounds halves to the nearest even number, exactly like the built-in round(num).
+    # Due to the rounding, some pixel values in the input image are mapped to the same pixel value in the equalized image.
+    equalization_transform = np.round(num).astype(np.uint8 if output_levels <= 256 else np.uint16)
+
+    return equalization_transform  # It returns the equalization transform of the cumulative distribution.
+
+
+# This function calculates and returns the equalization transform that corresponds to a histogram.
+# levels_appearances[k] is the number of appearances of the pixel value k.
+# levels_appearances can also be a stack of histograms (e.g. one for each contextual region),
+# the levels are always in its last axis and a transform is calculated for each histogram.
+# output_levels is the number of levels of the equalized image (by default the number of levels of the histogram).
+def get_equalization_transform_from_histogram(levels_appearances, output_levels=None):
+    u_list = get_cumulative_distribution_from_histogram(levels_appearances)
+    return get_equalization_transform_from_cumulative_distribution(u_list, output_levels)
+
+
 # This function calculates and returns the equalization transform of the input image.
-def get_equalization_transform_of_img(img_array):
+# If a cache (an EqualizationTransformCache of transform_cache) is given, the transform is taken from it when possible.
+# The input image can be uint8 or uint16 (e.g. 12-bit data). The transform has one element for each value
+# up to the largest value of the image, and maps it to a value of output_bits bits (by default the bits of the image type).
+def get_equalization_transform_of_img(img_array, cache=None, output_bits=None):
+    if output_bits is None:
+        output_bits = get_bit_depth(img_array.dtype)
+    output_levels = 2 ** output_bits
+
+    if cache is not None:
+        return cache.get_transform_of_img(img_array, output_levels)
+    levels_appearances = get_histogram_of_img(img_array)
+    return get_equalization_transform_from_histogram(levels_appearances, output_levels)
+
+
+# This function applies an equalization transform (a lookup table) to every pixel of the input image.
+# If out is given, the equalized image is written in it, so no new image is allocated.
+def apply_equalization_transform(img_array, equalization_transform, out=None):
+    # A single fancy-indexed lookup maps every pixel k of the input image to equalization_transform[k].
+    # The pixel values are always valid indices, so mode='clip' only lets np.take write directly into out.
+    return np.take(equalization_transform, img_array, out=out, mode='clip')
+
+
+# This function generates the equalized image using the global equalization transform.
+# If out is given (an uint8 array with the shape of the input image), the equalized image is written in it.
+# If a cache of transforms is given, the equalization transform is taken from it when possible.
+# For uint16 images the equalized image has output_bits bits (by default 16) and type uint16 (or uint8 if output_bits <= 8).
+def perform_global_hist_equalization(img_array, out=None, cache=None, output_bits=None):
+
+    # I calculate the equalization transform of the entire image, i.e., the global equalization transform.
+    equalization_transform = get_equalization_transform_of_img(img_array, cache, output_bits)
+
+    # I apply the global equalization transform to the pixels of the input image to produce the equalized image.
+    equalized_img = apply_equalization_transform(img_array, equalization_transform, out=out)
+
+    return equalized_img  # It returns the equalized image.
+
+
+# These are the first versions of get_equalization_transform_of_img and perform_global_hist_equalization,
+# with loops over the pixels and the levels. I keep them to check and benchmark the new versions.
+# (They work only on uint8 images, and they fail on an image where all the pixels are 0, because u_list is constant.)
+def get_equalization_transform_of_img_with_loops(img_array):
 
     equalization_transform = np.zeros(256, dtype=np.uint8)  # Initialize with size 256
     levels_appearances_list = [0] * 256  # Initialize with size 256
@@ -59,10 +176,10 @@ def get_equalization_transform_of_img(img_array):
 
 
 # This function generates the equalized image using the global equalization transform.
-def perform_global_hist_equalization(img_array):
+def perform_global_hist_equalization_with_loops(img_array):
 
     # I calculate the equalization transform of the entire image, i.e., the global equalization transform.
-    equalization_transform = get_equalization_transform_of_img(img_array)
+    equalization_transform = get_equalization_transform_of_img_with_loops(img_array)
 
     # I initialize the equalized image as a black image with the dimensions of the input image.
     equalized_img = np.zeros_like(img_array)
@@ -72,7 +189,3 @@ def perform_global_hist_equalization(img_array):
             equalized_img[i][j] = equalization_transform[img_array[i][j]]
 
     return equalized_img  # It returns the equalized image.
-
-
-
-
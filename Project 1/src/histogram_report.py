@@ -0,0 +1,112 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from PIL import Image
+from matplotlib.figure import Figure
+from show_image_and_plot_histogram import plot_image_and_histogram
+
+# The functions of this file create reports of the histograms of pairs of images (e.g. an image before and after
+# the equalization) without a GUI. The figures are matplotlib Figure objects that are not registered in pyplot,
+# so no window is opened and each figure is freed as soon as it is saved (as a .png or .svg file).
+# A whole directory of pairs is processed by worker processes, with a bounded number of pairs in progress,
+# so the memory that is used depends on the number of workers and not on the number of images.
+
+# The files with these extensions are considered images.
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# The images are drawn with at most this many pixels in each axis (their histograms are counted from all the pixels).
+MAX_DISPLAYED_SIDE = 1024
+
+
+# This function loads an image file and keeps only its Luminance component, as an uint8 array.
+def load_grayscale_image(filename):
+    with Image.open(fp=filename) as img:
+        return np.array(img.convert("L"), dtype=np.uint8)
+
+
+# This function returns a view of the image with at most MAX_DISPLAYED_SIDE pixels in each axis, to be drawn in a report.
+def get_displayed_image(img_array):
+    step = max(1, -(-max(img_array.shape) // MAX_DISPLAYED_SIDE))
+    return img_array[::step, ::step]
+
+
+# This function saves the report of a pair of images in filename (the format is given by its extension).
+# The images are in the first row of the report and their histograms below them.
+def save_report_of_pair(img_array1, img_array2, filename, name_photo1='Input Image', name_photo2='Equalized Image',
+                        dpi=100):
+    figure = Figure(figsize=(12, 6))
+    axes = figure.subplots(2, 2)
+
+    plot_image_and_histogram(axes[0, 0], axes[1, 0], img_array1, name_photo1 + ' Histogram', name_photo1,
+                             get_displayed_image(img_array1))
+    plot_image_and_histogram(axes[0, 1], axes[1, 1], img_array2, name_photo2 + ' Histogram', name_photo2,
+                             get_displayed_image(img_array2))
+
+    figure.tight_layout()
+    figure.savefig(filename, dpi=dpi)
+
+
+# This function creates the report of the images of two files and returns the filename of the report.
+# It runs in the worker processes, so only the filenames are sent to them and not the images.
+def create_report_of_pair(before_filename, after_filename, output_filename):
+    save_report_of_pair(load_grayscale_image(before_filename), load_grayscale_image(after_filename), output_filename,
+                        'Before: ' + os.path.basename(before_filename), 'After: ' + os.path.basename(after_filename))
+    return output_filename
+
+
+# This function returns the pairs (before_filename, after_filename) of the images that have the same name
+# in before_dir and in after_dir, sorted by name.
+def find_image_pairs(before_dir, after_dir):
+    names = sorted(set(os.listdir(before_dir)) & set(os.listdir(after_dir)))
+    return [(os.path.join(before_dir, name), os.path.join(after_dir, name)) for name in names
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(before_dir, name))]
+
+
+# This function returns the filename of the report (report_format is 'png' or 'svg') of an image in output_dir.
+# The extension of the image is kept in the name (e.g. a.png -> a_png.png and a.tif -> a_tif.png),
+# so that the images with the same name and different formats do not write the same report.
+def get_report_filename(output_dir, image_filename, report_format):
+    name, extension = os.path.splitext(os.path.basename(image_filename))
+    return os.path.join(output_dir, name + extension.replace('.', '_') + '.' + report_format)
+
+
+# This function creates a report (report_format is 'png' or 'svg') in output_dir for every pair of images
+# of before_dir and after_dir, in parallel worker processes (by default one for each CPU).
+# At most max_pending pairs (by default 2 for each worker) are submitted at a time, so the pairs that wait
+# for a worker do not accumulate. It returns the filenames of the reports, in the order of the pairs.
+def create_reports_of_directory(before_dir, after_dir, output_dir, report_format='png', workers=None,
+                                max_pending=None):
+    os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    output_filenames = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for before_filename, after_filename in find_image_pairs(before_dir, after_dir):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                output_filenames.extend(future.result() for future in done)
+
+            output_filename = get_report_filename(output_dir, before_filename, report_format)
+            pending.add(executor.submit(create_report_of_pair, before_filename, after_filename, output_filename))
+
+        output_filenames.extend(future.result() for future in pending)
+
+    return sorted(output_filenames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the histogram reports of a directory of before/after images.")
+    parser.add_argument("before_dir")
+    parser.add_argument("after_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--format", default="png", choices=("png", "svg"))
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    reports = create_reports_of_directory(args.before_dir, args.after_dir, args.output_dir, args.format, args.workers)
+    print("Created %d reports in %s" % (len(reports), args.output_dir))
@@ -0,0 +1,132 @@
+import numpy as np
+from global_hist_eq import get_equalization_transform_from_histogram
+from adaptive_hist_eq import get_region_bin_offsets
+from adaptive_hist_eq import get_histograms_of_regions
+from adaptive_hist_eq import apply_eq_transformations_of_regions
+
+
+# This class performs the adaptive histogram equalization on consecutive frames of a video, where most of each frame
+# does not change. It keeps the histograms and the transforms of the contextual regions (the same ones that
+# calculate_eq_transformations_of_regions_grid calculates) and the equalized image between calls.
+# For every new frame:
+#   1. I find the pixels that changed and count them in each contextual region.
+#      A region is dirty if more than threshold of its pixels changed (with threshold = 0, if any pixel changed).
+#   2. I update the histograms of the dirty regions, by removing the old values and adding the new values
+#      of their changed pixels, and recalculate only their transforms.
+#   3. A pixel of the equalized image depends only on the transforms of its region and of the 8 neighbouring regions,
+#      so I recalculate only the regions that are dirty or neighbours of a dirty region.
+# The pixels that changed in a region that is not dirty are ignored (they stay in the reference frame)
+# until enough pixels of the region change. With threshold = 0 the equalized image is exactly the same as
+# perform_adaptive_hist_equalization of the frame.
+class IncrementalAdaptiveEqualizer:
+
+    def __init__(self, region_len_h, region_len_w, threshold=0):
+        self.region_len_h = region_len_h
+        self.region_len_w = region_len_w
+        self.threshold = threshold
+
+        # The frame from which the histograms were counted, the histograms and the transforms of the regions
+        # and the equalized image. They are initialized by the first frame.
+        self.reference_frame = None
+        self.levels_appearances = None
+        self.transforms = None
+        self.equalized_img = None
+        self.region_bin_offsets = None
+        self.region_index = None  # The index of the region of every pixel.
+
+        # The number of regions whose transform was recalculated and the number of pixels of the equalized image
+        # that were recalculated for the last frame, and their totals over all the frames (only the counters are kept,
+        # so that they do not grow with the length of the video).
+        self.frames = 0
+        self.tiles_recomputed = 0
+        self.pixels_reinterpolated = 0
+        self.total_tiles_recomputed = 0
+        self.total_pixels_reinterpolated = 0
+
+    # This function equalizes the next frame. The returned image is kept by the equalizer and is updated
+    # in place by the next call, so it must be copied if it is needed later.
+    def equalize(self, frame):
+        if self.reference_frame is None or self.reference_frame.shape != frame.shape:
+            return self.equalize_from_scratch(frame)
+
+        offsets, regions_x, regions_y = self.region_bin_offsets
+        region_index = self.region_index
+
+        # 1. The number of changed pixels in each region, and the dirty regions.
+        changed = frame != self.reference_frame
+        changed_in_region = np.bincount(region_index[changed], minlength=regions_x * regions_y)
+        dirty = (changed_in_region > self.threshold).reshape(regions_x, regions_y)
+
+        if not dirty.any():
+            self.count_recalculations(0, 0)
+            return self.equalized_img
+
+        # 2. I update the histograms with the changed pixels of the dirty regions.
+        updated = changed & dirty.reshape(-1)[region_index]
+        old_values = self.reference_frame[updated]
+        new_values = frame[updated]
+        updated_offsets = offsets[updated]
+
+        flat_levels_appearances = self.levels_appearances.reshape(-1)
+        flat_levels_appearances -= np.bincount(updated_offsets + old_values, minlength=flat_levels_appearances.size)
+        flat_levels_appearances += np.bincount(updated_offsets + new_values, minlength=flat_levels_appearances.size)
+        self.reference_frame[updated] = new_values
+
+        self.transforms[dirty] = get_equalization_transform_from_histogram(self.levels_appearances[dirty])
+
+        # 3. I recalculate the equalized image in the dirty regions and in their neighbours.
+        affected = np.zeros((regions_x + 2, regions_y + 2), dtype=bool)
+        for dx in range(3):
+            for dy in range(3):
+                affected[dx:dx + regions_x, dy:dy + regions_y] |= dirty
+        affected = affected[1:-1, 1:-1]
+
+        pixels_reinterpolated = 0
+        for window in self.get_windows_of_regions(affected):
+            apply_eq_transformations_of_regions(self.reference_frame, self.transforms, self.region_len_h,
+                                                self.region_len_w, out=self.equalized_img, window=window)
+            pixels_reinterpolated += int((window[1] - window[0]) * (window[3] - window[2]))
+
+        self.count_recalculations(int(np.count_nonzero(dirty)), pixels_reinterpolated)
+
+        return self.equalized_img
+
+    # This function equalizes a frame without using the previous frames and initializes the state of the equalizer.
+    def equalize_from_scratch(self, frame):
+        self.region_bin_offsets = get_region_bin_offsets(frame.shape, self.region_len_h, self.region_len_w)
+        self.region_index = self.region_bin_offsets[0] // 256
+        self.reference_frame = frame.copy()
+        self.levels_appearances = get_histograms_of_regions(frame, self.region_len_h, self.region_len_w,
+                                                            self.region_bin_offsets)
+        self.transforms = get_equalization_transform_from_histogram(self.levels_appearances)
+        self.equalized_img = apply_eq_transformations_of_regions(frame, self.transforms, self.region_len_h,
+                                                                 self.region_len_w)
+
+        self.count_recalculations(self.transforms.shape[0] * self.transforms.shape[1], frame.size)
+
+        return self.equalized_img
+
+    # This function counts the regions and the pixels that were recalculated for a frame.
+    def count_recalculations(self, tiles_recomputed, pixels_reinterpolated):
+        self.frames += 1
+        self.tiles_recomputed = tiles_recomputed
+        self.pixels_reinterpolated = pixels_reinterpolated
+        self.total_tiles_recomputed += tiles_recomputed
+        self.total_pixels_reinterpolated += pixels_reinterpolated
+
+    # This function returns the windows (x_start, x_end, y_start, y_end) of the image that cover the selected regions.
+    # Consecutive selected regions of the same row of regions are merged into one window.
+    def get_windows_of_regions(self, selected):
+        img_w, img_h = self.reference_frame.shape
+        windows = []
+        for x in range(selected.shape[0]):
+            selected_y = np.flatnonzero(selected[x])
+            if len(selected_y) == 0:
+                continue
+            # The runs of consecutive regions start where the difference from the previous region is not 1.
+            run_starts = np.flatnonzero(np.diff(selected_y, prepend=-2) != 1)
+            run_ends = np.append(run_starts[1:], len(selected_y)) - 1
+            for start, end in zip(selected_y[run_starts], selected_y[run_ends]):
+                windows.append((x * self.region_len_w, min((x + 1) * self.region_len_w, img_w),
+                                start * self.region_len_h, min((end + 1) * self.region_len_h, img_h)))
+        return windows
@@ -1,102 +1,61 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from global_hist_eq import get_histogram_of_img
+
+
+# This function draws an image in image_axes and its histogram in histogram_axes.
+# The histogram is counted with a single np.bincount (get_histogram_of_img) and drawn as a single artist
+# (a filled step curve with one step for each pixel value), instead of one bar and one line for each pixel value.
+# It works with the axes of any figure, so it is used both for the figures that are shown and for the reports.
+# If displayed_img_array is given (e.g. a smaller copy of the image), it is drawn instead of img_array,
+# but the histogram is always counted from all the pixels of img_array.
+def plot_image_and_histogram(image_axes, histogram_axes, img_array, name_histogram, name_photo,
+                             displayed_img_array=None):
+    if displayed_img_array is None:
+        displayed_img_array = img_array
+    image_axes.imshow(displayed_img_array, cmap='gray')  # Assuming img_array is a grayscale image
+    image_axes.set_title(name_photo)
+    image_axes.axis('off')  # Hide axis lines and labels in the subplot
+
+    # image_hist[k] is the number of pixels with value k.
+    image_hist = get_histogram_of_img(img_array)
+
+    # The step of the value k covers [k - 0.5, k + 0.5], like a bar of width 1 centered at k.
+    # The steps are colored red with an alpha (transparency) of 0.5.
+    histogram_axes.stairs(image_hist, np.arange(len(image_hist) + 1) - 0.5, fill=True, color='red', alpha=0.5)
+    histogram_axes.set_title(name_histogram)
+    histogram_axes.set_xlabel('Pixel Value')
+    histogram_axes.set_ylabel('Number of pixels')
 
 
 # With these two functions, I create the histograms of the requested images.
-def show_image_and_plot_histogram(img_array, name_histogram, name_photo):
-    plt.figure(figsize=(12, 6))
+# If a filename is given, the figure is saved in it (e.g. a .png or .svg file) instead of being shown.
+def show_image_and_plot_histogram(img_array, name_histogram, name_photo, filename=None):
+    figure, (image_axes, histogram_axes) = plt.subplots(1, 2, figsize=(12, 6))
 
-    plt.subplot(1, 2, 1)
-    plt.imshow(img_array, cmap='gray')  # Assuming img_array is a grayscale image
-    plt.title(name_photo)
-    plt.axis('off')  # Hide axis lines and labels in the subplot
-    # Initialize an array to store the histogram of pixel intensities
-    image_hist = np.zeros(256)
-    # Iterate over each pixel in the equalized image and update the histogram
-    for i in range(img_array.shape[0]):
-        for j in range(img_array.shape[1]):
-            # Increment the corresponding bin in the histogram based on the pixel intensity
-            # In other words, it counts the occurrences of each pixel intensity in the image and updates the histogram accordingly.
-            image_hist[img_array[i, j]] += 1
-    # Calculate the total number of pixels in the image
-    total_pixels = img_array.shape[0] * img_array.shape[1]
+    plot_image_and_histogram(image_axes, histogram_axes, img_array, name_histogram, name_photo)
 
-    plt.subplot(1, 2, 2)
+    figure.tight_layout()
+    show_or_save_figure(figure, filename)
 
-    # It creates a bar plot with 256 bins (corresponding to the pixel values),
-    # using np.arange(256) as the x-axis values and image_hist as the heights of the bars.
-    # The bars are colored red with an alpha (transparency) of 0.5.
-    plt.bar(np.arange(256), image_hist, color='red', alpha=0.5, width=1)
-    plt.title(name_histogram)
-    plt.xlabel('Pixel Value')
-    plt.ylabel('Number of pixels')
-    # Add vertical lines for bin edges
-    for i in range(len(image_hist)):
-        plt.vlines(i, 0, image_hist[i], colors='red', alpha=0.5)
-    plt.tight_layout()
-    plt.show()
 
+def show_image_and_plot_histogram_for_2_images(img_array1, img_array2,  name_histogram1, name_photo1, name_histogram2,
+                                               name_photo2, filename=None):
+    figure, axes = plt.subplots(2, 2, figsize=(12, 6))
 
-def show_image_and_plot_histogram_for_2_images(img_array1, img_array2,  name_histogram1, name_photo1, name_histogram2, name_photo2):
-    plt.figure(figsize=(12, 6))
+    # The images are in the first row and their histograms below them.
+    plot_image_and_histogram(axes[0, 0], axes[1, 0], img_array1, name_histogram1, name_photo1)
+    plot_image_and_histogram(axes[0, 1], axes[1, 1], img_array2, name_histogram2, name_photo2)
 
-    plt.subplot(2, 2, 1)
-    plt.imshow(img_array1, cmap='gray')  # Assuming img_array1 is a grayscale image
-    plt.title(name_photo1)
-    plt.axis('off')  # Hide axis lines and labels in the subplot
-    # Initialize an array to store the histogram of pixel intensities
-    image_hist = np.zeros(256)
-    # Iterate over each pixel in the equalized image and update the histogram
-    for i in range(img_array1.shape[0]):
-        for j in range(img_array1.shape[1]):
-            # Increment the corresponding bin in the histogram based on the pixel intensity
-            # In other words, it counts the occurrences of each pixel intensity in the image and updates the histogram accordingly.
-            image_hist[img_array1[i, j]] += 1
-    # Calculate the total number of pixels in the image
-    total_pixels = img_array1.shape[0] * img_array1.shape[1]
+    figure.subplots_adjust(wspace=0.4, hspace=0.4)
+    figure.tight_layout()
+    show_or_save_figure(figure, filename)
 
-    plt.subplot(2, 2, 3)
-
-    # It creates a bar plot with 256 bins (corresponding to the pixel values),
-    # using np.arange(256) as the x-axis values and image_hist as the heights of the bars.
-    # The bars are colored red with an alpha (transparency) of 0.5.
-    plt.bar(np.arange(256), image_hist, color='red', alpha=0.5, width=1)
-    plt.title(name_histogram1)
-    plt.xlabel('Pixel Value')
-    plt.ylabel('Number of pixels')
-    # Add vertical lines for bin edges
-    for i in range(len(image_hist)):
-        plt.vlines(i, 0, image_hist[i], colors='red', alpha=0.5)
-
-    plt.subplot(2, 2, 2)
-    plt.imshow(img_array2, cmap='gray')  # Assuming img_array2 is a grayscale image
-    plt.title(name_photo2)
-    plt.axis('off')  # Hide axis lines and labels in the subplot
-    # Initialize an array to store the histogram of pixel intensities
-    image_hist = np.zeros(256)
-    # Iterate over each pixel in the equalized image and update the histogram
-    for i in range(img_array2.shape[0]):
-        for j in range(img_array2.shape[1]):
-            # Increment the corresponding bin in the histogram based on the pixel intensity
-            # In other words, it counts the occurrences of each pixel intensity in the image and updates the histogram accordingly.
-            image_hist[img_array2[i, j]] += 1
-    # Calculate the total number of pixels in the image
-    total_pixels = img_array2.shape[0] * img_array2.shape[1]
-
-    plt.subplot(2, 2, 4)
-
-    # It creates a bar plot with 256 bins (corresponding to the pixel values),
-    # using np.arange(256) as the x-axis values and image_hist as the heights of the bars.
-    # The bars are colored red with an alpha (transparency) of 0.5.
-    plt.bar(np.arange(256), image_hist, color='red', alpha=0.5, width=1)
-    plt.title(name_histogram2)
-    plt.xlabel('Pixel Value')
-    plt.ylabel('Number of pixels')
-    # Add vertical lines for bin edges
-    for i in range(len(image_hist)):
-        plt.vlines(i, 0, image_hist[i], colors='red', alpha=0.5)
-
-    plt.subplots_adjust(wspace=0.4, hspace=0.4)
-    plt.tight_layout()
-    plt.show()
 
+# This function shows a figure of pyplot, or saves it in filename and closes it (so it does not stay in memory).
+def show_or_save_figure(figure, filename=None):
+    if filename is None:
+        plt.show()
+    else:
+        figure.savefig(filename)
+        plt.close(figure)
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+# In the sliding window equalization, every pixel is mapped through the equalization transform of the window centered on it.
+# The window of the pixel (i, j) contains the rows [i - (window_len_w - 1)//2, i - (window_len_w - 1)//2 + window_len_w)
+# and the columns [j - (window_len_h - 1)//2, j - (window_len_h - 1)//2 + window_len_h) of the image.
+# Near the borders of the image the window is cropped, so it only contains pixels of the image.
+# (The center of a window is found exactly like the center of a contextual region in adaptive_hist_eq.)
+
+
+# This function returns the first and the last (excluded) index of the windows of all the pixels of an axis.
+def get_window_limits(axis_len, window_len):
+    window_start = np.arange(axis_len) - (window_len - 1) // 2
+    return np.clip(window_start, 0, axis_len), np.clip(window_start + window_len, 0, axis_len)
+
+
+# This function applies equation 2 to the pixels of an image, without calculating the whole equalization transform.
+# cdf_of_values is the number of pixels of the window of each pixel with value smaller or equal to the value of the pixel,
+# cdf_of_zero is the number of pixels of the window with value 0 and total_pixels is the number of pixels of the window.
+# The result is exactly the value get_equalization_transform_of_img(window)[value] of global_hist_eq.
+def equalize_values_from_cdf(cdf_of_values, cdf_of_zero, total_pixels):
+    u = cdf_of_values / total_pixels
+    u0 = cdf_of_zero / total_pixels  # The smallest element of u_list. The largest element is always 1.
+
+    # If all the pixels of the window are 0, the normalization divides 0 by 0 and the pixel is mapped to 0.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # After the normalization v0 is 0, so d of equation 2 is equal to the normalized u.
+        d = (u - u0) / (1 - u0)
+        num = np.nan_to_num(d * (256 - 1))
+
+    return np.round(num).astype(np.uint8)
+
+
+# This function updates the cumulative column histograms column_cdf (column_cdf[j, k] is the number of pixels
+# of the column j, inside the rows of the window, with value smaller or equal to k) when a pixel with value
+# added_values[j] enters and a pixel with value removed_values[j] leaves every column j.
+# The value 256 means that no pixel enters (or leaves) the column.
+# A pixel with value a adds 1 to the levels k >= a, so only the levels between the two values change:
+# [a, b) gain 1 if a < b, and [b, a) lose 1 if b < a. Only these entries are updated, not all the 256 levels.
+def update_column_cdf(column_cdf, added_values, removed_values):
+    added_values = added_values.astype(np.intp)
+    removed_values = removed_values.astype(np.intp)
+    flat_column_cdf = column_cdf.reshape(-1)
+    column_offsets = np.arange(len(added_values)) * column_cdf.shape[1]
+
+    for low_levels, high_levels, change in ((added_values, removed_values, 1), (removed_values, added_values, -1)):
+        lengths = np.maximum(high_levels - low_levels, 0)
+        total = int(lengths.sum())
+        if total == 0:
+            continue
+        # The flat indices of the entries [low_levels[j], high_levels[j]) of every column j, all together.
+        # Every entry appears once, so the fancy-indexed addition does not lose any update.
+        range_offsets = column_offsets + low_levels - (np.cumsum(lengths) - lengths)
+        flat_column_cdf[np.repeat(range_offsets, lengths) + np.arange(total)] += change
+
+
+# This function takes as input an image and the height and width of the sliding window.
+# It returns the equalized image, where each pixel is mapped through the equalization transform of its own window.
+# I keep one cumulative histogram for each column of the image, which counts the values of the rows of the current
+# window. When the window moves one row down, one row enters and one row leaves, and the cumulative histogram of a
+# column changes only between the levels of its entering and its leaving pixel (see update_column_cdf),
+# so neighboring rows with similar values cost almost nothing. The cumulative histogram of the window of every pixel
+# of the row is then a sum of neighbouring column histograms, which I get from their cumulative sum over the columns.
+# This cumulative sum is the only work for every row that does not depend on the image (256 additions per pixel),
+# and the work per pixel does not depend on the size of the window.
+def perform_sliding_window_hist_equalization(img_array, window_len_h, window_len_w):
+    img_w = img_array.shape[0]
+    img_h = img_array.shape[1]
+
+    # I initialize the equalized image as a black image with the dimensions of the input image.
+    equalized_img = np.zeros_like(img_array)
+
+    window_x_start, window_x_end = get_window_limits(img_w, window_len_w)
+    window_y_start, window_y_end = get_window_limits(img_h, window_len_h)
+    window_cols = (window_y_end - window_y_start)  # The number of columns of the window of each pixel of a row.
+
+    # The counts are at most the number of pixels of the image, so int32 is enough for all but huge images.
+    dtype = np.int32 if img_w * img_h < 2 ** 31 else np.int64
+
+    # column_cdf[j, k] is the number of pixels of the column j, inside the rows of the current window,
+    # with value smaller or equal to k.
+    # cdf_prefix[j, k] is the number of pixels of the columns [0, j) of the window with value smaller or equal to k.
+    column_cdf = np.zeros((img_h, 256), dtype=dtype)
+    cdf_prefix = np.zeros((img_h + 1, 256), dtype=dtype)
+    no_pixels = np.full(img_h, 256)
+
+    for i in range(img_w):
+        # The rows that enter the window and the rows that leave it. Each entering row is paired with a leaving row
+        # (or with no row, at the borders of the image).
+        previous_start = window_x_start[i - 1] if i > 0 else 0
+        previous_end = window_x_end[i - 1] if i > 0 else 0
+        entering_rows = list(range(previous_end, window_x_end[i]))
+        leaving_rows = list(range(previous_start, window_x_start[i]))
+        for pair in range(max(len(entering_rows), len(leaving_rows))):
+            added_values = img_array[entering_rows[pair]] if pair < len(entering_rows) else no_pixels
+            removed_values = img_array[leaving_rows[pair]] if pair < len(leaving_rows) else no_pixels
+            update_column_cdf(column_cdf, added_values, removed_values)
+
+        np.cumsum(column_cdf, axis=0, out=cdf_prefix[1:])
+
+        # The cumulative histogram of the window of each pixel of the row, at the value of the pixel and at 0.
+        values = img_array[i]
+        cdf_of_values = cdf_prefix[window_y_end, values] - cdf_prefix[window_y_start, values]
+        cdf_of_zero = cdf_prefix[window_y_end, 0] - cdf_prefix[window_y_start, 0]
+        total_pixels = (window_x_end[i] - window_x_start[i]) * window_cols
+
+        equalized_img[i] = equalize_values_from_cdf(cdf_of_values, cdf_of_zero, total_pixels)
+
+    return equalized_img  # Ιt returns the equalized image
+
+
+# This function returns the type and the size (in bytes) of the integral histogram of an image with the shape img_shape.
+# It has (rows + 1) * (columns + 1) * 256 uint32 counts, i.e. about 1 GB for each megapixel of the image.
+def get_integral_histogram_size(img_shape):
+    img_w, img_h = img_shape[:2]
+    dtype = np.dtype(np.uint32 if img_w * img_h < 2 ** 32 else np.uint64)
+    return dtype, (img_w + 1) * (img_h + 1) * 256 * dtype.itemsize
+
+
+# This function calculates the integral histogram of the input image.
+# integral_histogram[x, y, k] is the number of pixels of img_array[:x, :y] with value smaller or equal to k.
+# Once it is calculated, the cumulative histogram of any rectangle of the image is found with 4 lookups,
+# so it can be reused for many window sizes. But it needs about 1 GB for each megapixel of the image
+# (see get_integral_histogram_size), so it is only calculated if it needs at most max_bytes bytes
+# (by default 1 GiB). For larger images perform_sliding_window_hist_equalization needs only
+# 2 * (columns + 1) * 256 counts for any window size.
+def calculate_integral_histogram(img_array, max_bytes=2 ** 30):
+    img_w = img_array.shape[0]
+    img_h = img_array.shape[1]
+
+    dtype, nbytes = get_integral_histogram_size(img_array.shape)
+    if max_bytes is not None and nbytes > max_bytes:
+        raise ValueError("The integral histogram of an image with the shape %s needs %.1f MB, more than max_bytes "
+                         "(%.1f MB)" % (img_array.shape, nbytes / 2 ** 20, max_bytes / 2 ** 20))
+    integral_histogram = np.zeros((img_w + 1, img_h + 1, 256), dtype=dtype)
+    levels = np.arange(256)
+
+    for x in range(img_w):
+        # The cumulative histogram of the row x, accumulated over its columns,
+        # is added to the integral histogram of the rows above it.
+        row_cdf = img_array[x][:, np.newaxis] <= levels
+        np.cumsum(row_cdf, axis=0, dtype=dtype, out=integral_histogram[x + 1, 1:])
+        integral_histogram[x + 1, 1:] += integral_histogram[x, 1:]
+
+    return integral_histogram
+
+
+# This function generates the same equalized image as perform_sliding_window_hist_equalization,
+# using an integral histogram of the input image (calculated by calculate_integral_histogram).
+# It is useful when many window sizes are evaluated on the same image, because the integral histogram is calculated only once.
+def perform_sliding_window_hist_equalization_from_integral_histogram(img_array, integral_histogram, window_len_h,
+                                                                     window_len_w):
+    img_w = img_array.shape[0]
+    img_h = img_array.shape[1]
+
+    equalized_img = np.zeros_like(img_array)
+
+    window_x_start, window_x_end = get_window_limits(img_w, window_len_w)
+    window_y_start, window_y_end = get_window_limits(img_h, window_len_h)
+    y0 = window_y_start[np.newaxis, :]
+    y1 = window_y_end[np.newaxis, :]
+
+    # The image is processed in bands of rows, so that the temporary arrays stay small.
+    band_len = max(1, 2 ** 20 // max(img_h, 1))
+    for band_start in range(0, img_w, band_len):
+        band_end = min(band_start + band_len, img_w)
+        x0 = window_x_start[band_start:band_end, np.newaxis]
+        x1 = window_x_end[band_start:band_end, np.newaxis]
+
+        # The number of pixels of the window of each pixel with value smaller or equal to k.
+        def window_cdf(k):
+            return (integral_histogram[x1, y1, k].astype(np.int64) - integral_histogram[x0, y1, k]
+                    - integral_histogram[x1, y0, k] + integral_histogram[x0, y0, k])
+
+        cdf_of_values = window_cdf(img_array[band_start:band_end])
+        cdf_of_zero = window_cdf(0)
+        total_pixels = (x1 - x0) * (y1 - y0)
+
+        equalized_img[band_start:band_end] = equalize_values_from_cdf(cdf_of_values, cdf_of_zero, total_pixels)
+
+    return equalized_img  # Ιt returns the equalized image
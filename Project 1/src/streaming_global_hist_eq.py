@@ -0,0 +1,92 @@
+import numpy as np
+from global_hist_eq import get_histogram_of_img
+from global_hist_eq import get_equalization_transform_from_histogram
+from global_hist_eq import apply_equalization_transform
+from global_hist_eq import get_bit_depth
+
+# The functions of this file perform the global histogram equalization on images that do not fit in memory.
+# The image is read from a memory-mapped file in chunks of rows, in two passes:
+#   1. The histogram of the image is the sum of the histograms of its chunks.
+#   2. The global equalization transform is applied to each chunk and written into a memory-mapped output file.
+# Only one chunk is processed at a time, so the memory that is used depends on the chunk size and not on the image size.
+# (np.bincount works with 8-byte integers, so a chunk of chunk_pixels pixels needs about 9 * chunk_pixels bytes.)
+# The equalized image is exactly the same as the one of perform_global_hist_equalization.
+
+# The default number of pixels of a chunk.
+CHUNK_PIXELS = 2 ** 24
+
+
+# This function returns the ranges [start, end) of the rows of the chunks of an image.
+def get_row_chunks(img_shape, chunk_pixels):
+    row_pixels = max(int(np.prod(img_shape[1:])), 1)
+    rows_per_chunk = max(1, chunk_pixels // row_pixels)
+    return [(start, min(start + rows_per_chunk, img_shape[0])) for start in range(0, img_shape[0], rows_per_chunk)]
+
+
+# This function returns the type of the equalized image of an image of type dtype with output_bits bits
+# (by default the bits of dtype), like perform_global_hist_equalization: uint8 for up to 8 bits and uint16 otherwise.
+def get_equalized_dtype(dtype, output_bits=None):
+    if output_bits is None:
+        output_bits = get_bit_depth(dtype)
+    return np.dtype(np.uint8 if output_bits <= 8 else np.uint16)
+
+
+# This function performs the global histogram equalization of img_array chunk by chunk and writes it into out.
+# img_array and out can be any arrays with the same shape (usually np.memmap arrays, which are read
+# and written from the disk only when a chunk is accessed). img_array can be uint8 or uint16, and out must have
+# the type get_equalized_dtype(img_array.dtype, output_bits), like in perform_global_hist_equalization.
+def perform_global_hist_equalization_in_chunks(img_array, out, chunk_pixels=CHUNK_PIXELS, output_bits=None):
+    row_chunks = get_row_chunks(img_array.shape, chunk_pixels)
+    if output_bits is None:
+        output_bits = get_bit_depth(img_array.dtype)
+
+    # Pass 1: I add the histograms of all the chunks to find the histogram of the entire image.
+    # The histogram of a chunk has one count for each value up to its largest value (at least 256), so the sum has
+    # one count for every value of the type. The counts of the values above the largest value of the image are 0,
+    # and they do not change the transform of the values below it.
+    levels_appearances = np.zeros(np.iinfo(img_array.dtype).max + 1, dtype=np.int64)
+    for start, end in row_chunks:
+        chunk_appearances = get_histogram_of_img(img_array[start:end])
+        levels_appearances[:len(chunk_appearances)] += chunk_appearances
+
+    equalization_transform = get_equalization_transform_from_histogram(levels_appearances, 2 ** output_bits)
+
+    # Pass 2: I apply the global equalization transform to each chunk and write it directly into the output.
+    for start, end in row_chunks:
+        apply_equalization_transform(img_array[start:end], equalization_transform, out=out[start:end])
+
+    return out
+
+
+# This function opens an image file for the streaming equalization, as a read-only memory-mapped array.
+# A .npy file contains its shape and type. A raw file contains only the pixels, so its shape must be given.
+def open_image_file(filename, shape=None, dtype=np.uint8):
+    if str(filename).endswith('.npy'):
+        return np.load(filename, mmap_mode='r')
+    if shape is None:
+        raise ValueError("The shape of the raw image file %s must be given" % filename)
+    return np.memmap(filename, dtype=dtype, mode='r', shape=shape)
+
+
+# This function creates the output image file, as a writable memory-mapped array with the given shape and type.
+# If the filename ends with .npy, it is a .npy file, otherwise it is a raw file.
+def create_image_file(filename, shape, dtype=np.uint8):
+    if str(filename).endswith('.npy'):
+        return np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+    return np.memmap(filename, dtype=dtype, mode='w+', shape=shape)
+
+
+# This function performs the global histogram equalization of the image stored in input_filename (.npy or raw)
+# and writes the equalized image in output_filename (.npy or raw).
+# For raw input files the shape (and type) of the image must be given.
+# The equalized image has output_bits bits (by default the bits of the image type).
+def perform_global_hist_equalization_of_file(input_filename, output_filename, chunk_pixels=CHUNK_PIXELS, shape=None,
+                                             dtype=np.uint8, output_bits=None):
+    img_array = open_image_file(input_filename, shape, dtype)
+    equalized_img = create_image_file(output_filename, img_array.shape, get_equalized_dtype(img_array.dtype,
+                                                                                            output_bits))
+
+    perform_global_hist_equalization_in_chunks(img_array, equalized_img, chunk_pixels, output_bits)
+
+    # Write the last pages of the output to the disk.
+    equalized_img.flush()
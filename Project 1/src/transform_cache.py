@@ -0,0 +1,124 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from global_hist_eq import get_histogram_of_img
+from global_hist_eq import get_equalization_transform_from_histogram
+
+
+# This class keeps the equalization transforms that were already calculated, so that they are not calculated again.
+# The transform of an image depends only on its histogram, so the transforms are stored with the histogram as key
+# (a 16-byte hash of the 256 counts). Identical pages, or contextual regions with the same content
+# (e.g. a uniform background), have the same histogram and find their transform in the cache.
+# Every transform that is requested is one lookup in the statistics, and every transform is stored once.
+# The cache keeps at most max_entries transforms (256 bytes each). When it is full,
+# the least recently used transform is evicted. It can be shared by many threads.
+# The transforms that it returns are shared with the cache, so they must not be modified.
+class EqualizationTransformCache:
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.transforms = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Statistics of the cache.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # This function returns a key that identifies the content of an array (its type, shape and values).
+    @staticmethod
+    def get_key(array, kind):
+        digest = hashlib.blake2b(kind.encode(), digest_size=16)
+        digest.update(str(array.dtype).encode() + str(array.shape).encode())
+        digest.update(np.ascontiguousarray(array).data)
+        return digest.digest()
+
+    # This function returns the key of the transform of a histogram with output_levels levels. output_levels=None means
+    # the number of levels of the histogram (like in get_equalization_transform_from_histogram), so it is replaced
+    # by this number, and the global path (which gives output_levels=256 for uint8 images) and the regions
+    # (which give None) share the transforms of the same histograms.
+    def get_histogram_key(self, histogram, output_levels=None):
+        if output_levels is None:
+            output_levels = histogram.shape[-1]
+        return self.get_key(histogram, 'histogram %d' % output_levels)
+
+    # This function returns the transform of a key (or None) and updates the statistics.
+    def lookup(self, key):
+        with self.lock:
+            transform = self.transforms.get(key)
+            if transform is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.transforms.move_to_end(key)  # It is now the most recently used.
+            return transform
+
+    # This function stores the transform of a key and evicts the least recently used transforms, if the cache is full.
+    def store(self, key, transform):
+        with self.lock:
+            self.transforms[key] = transform
+            self.transforms.move_to_end(key)
+            while len(self.transforms) > self.max_entries:
+                self.transforms.popitem(last=False)
+                self.evictions += 1
+
+    # This function returns the equalization transform of a histogram (levels_appearances of 256 counts).
+    # output_levels is the number of levels of the equalized image (by default the number of levels of the histogram).
+    def get_transform_from_histogram(self, levels_appearances, output_levels=None):
+        key = self.get_histogram_key(levels_appearances, output_levels)
+        transform = self.lookup(key)
+        if transform is None:
+            transform = get_equalization_transform_from_histogram(levels_appearances, output_levels)
+            self.store(key, transform)
+        return transform
+
+    # This function returns the equalization transforms of a stack of histograms (with the levels in the last axis),
+    # e.g. the histograms of the contextual regions of an image. All the transforms that are not in the cache
+    # are calculated together (once for each distinct histogram) and stored.
+    def get_transforms_from_histograms(self, levels_appearances, output_levels=None):
+        flat_levels_appearances = levels_appearances.reshape(-1, levels_appearances.shape[-1])
+        transforms = None
+
+        # missing[key] is the list of the histograms with this key, when the key is not in the cache.
+        missing = OrderedDict()
+        for index, histogram in enumerate(flat_levels_appearances):
+            key = self.get_histogram_key(histogram, output_levels)
+            if key in missing:
+                # The transform will be calculated for the first histogram with this key, so this is a hit.
+                missing[key].append(index)
+                with self.lock:
+                    self.hits += 1
+                continue
+            transform = self.lookup(key)
+            if transform is None:
+                missing[key] = [index]
+            else:
+                if transforms is None:
+                    transforms = np.empty(flat_levels_appearances.shape, dtype=transform.dtype)
+                transforms[index] = transform
+
+        if missing:
+            first_indices = [indices[0] for indices in missing.values()]
+            new_transforms = get_equalization_transform_from_histogram(flat_levels_appearances[first_indices],
+                                                                       output_levels)
+            if transforms is None:
+                transforms = np.empty(flat_levels_appearances.shape, dtype=new_transforms.dtype)
+            for (key, indices), transform in zip(missing.items(), new_transforms):
+                transforms[indices] = transform
+                self.store(key, transform.copy())  # A copy, so that the cache does not keep new_transforms alive.
+
+        return transforms.reshape(levels_appearances.shape)
+
+    # This function returns the equalization transform of an image, which is looked up by its histogram.
+    # (Hashing the pixels is only about twice as fast as counting the histogram with np.bincount, and it would need
+    # a second entry for every image, so the image itself is not hashed.)
+    def get_transform_of_img(self, img_array, output_levels=None):
+        return self.get_transform_from_histogram(get_histogram_of_img(img_array), output_levels)
+
+    # This function returns the statistics of the cache.
+    def get_statistics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.transforms), 'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,107 @@
+import numpy as np
+from global_hist_eq import get_cumulative_distribution_from_histogram
+from global_hist_eq import get_equalization_transform_from_cumulative_distribution
+from global_hist_eq import apply_equalization_transform
+from adaptive_hist_eq import get_region_bin_offsets
+from adaptive_hist_eq import apply_eq_transformations_of_regions
+
+# The functions of this file equalize a stack of frames (e.g. a video) with shape (frames, rows, columns).
+# The histograms of a chunk of frames are counted first, and then the transforms of the whole chunk are calculated together.
+# The cumulative distributions (u_list) of consecutive frames are smoothed exponentially,
+# so that the equalization transform does not change abruptly and the output does not flicker:
+#     smoothed_u_list[t] = smoothing * smoothed_u_list[t - 1] + (1 - smoothing) * u_list[t]
+# With smoothing = 0 every frame is equalized exactly like a single image.
+
+# The frames are processed in chunks of about this many pixels, so the arrays of the histograms stay small.
+PIXELS_PER_CHUNK = 2 ** 24
+
+
+# This function returns the number of frames that are processed together.
+def get_frames_per_chunk(frames):
+    frame_pixels = max(frames.shape[1] * frames.shape[2], 1)
+    return max(1, PIXELS_PER_CHUNK // frame_pixels)
+
+
+# This function counts the histograms of all the frames of a chunk (an array of shape (frames, rows, columns))
+# in a single np.bincount, where the bin frame_index * bins_per_frame + bin counts the pixels of the frame in bin.
+# Without region_bin_offsets the bin of a pixel is its value, and it returns an array of shape (frames, 256).
+# With the region_bin_offsets of get_region_bin_offsets the bin is the bin of the value in the contextual region
+# of the pixel, and it returns an array of shape (frames, regions in the first axis, regions in the second axis, 256).
+def get_histograms_of_frames(frames, region_bin_offsets=None):
+    if region_bin_offsets is None:
+        offsets, histogram_shape = 0, (256,)
+    else:
+        offsets, regions_x, regions_y = region_bin_offsets
+        histogram_shape = (regions_x, regions_y, 256)
+    bins_per_frame = int(np.prod(histogram_shape))
+
+    frame_offsets = (np.arange(frames.shape[0], dtype=np.intp) * bins_per_frame)[:, np.newaxis, np.newaxis]
+    levels_appearances = np.bincount((frame_offsets + offsets + frames).ravel(),
+                                     minlength=frames.shape[0] * bins_per_frame)
+    return levels_appearances.reshape((frames.shape[0],) + histogram_shape)
+
+
+# This function smooths the cumulative distributions of consecutive frames (in the first axis of u_lists), in place.
+# previous_u_list is the smoothed cumulative distribution of the frame before the first one (None for the first frame).
+# It returns the smoothed cumulative distribution of the last frame, to continue with the next chunk.
+def smooth_cumulative_distributions(u_lists, smoothing, previous_u_list=None):
+    for t in range(u_lists.shape[0]):
+        if previous_u_list is not None:
+            u_lists[t] = smoothing * previous_u_list + (1 - smoothing) * u_lists[t]
+        previous_u_list = u_lists[t]
+    return previous_u_list
+
+
+# This function equalizes every frame of the stack with the global equalization transform of the (smoothed) frame.
+# frames is an uint8 array of shape (frames, rows, columns).
+# If out is given (an array with the shape and type of frames), the equalized frames are written in it.
+def perform_global_hist_equalization_of_frames(frames, smoothing=0.0, out=None):
+    if out is None:
+        out = np.empty_like(frames)
+
+    frames_per_chunk = get_frames_per_chunk(frames)
+    previous_u_list = None
+
+    for chunk_start in range(0, frames.shape[0], frames_per_chunk):
+        chunk = frames[chunk_start:chunk_start + frames_per_chunk]
+
+        levels_appearances = get_histograms_of_frames(chunk)
+
+        u_lists = get_cumulative_distribution_from_histogram(levels_appearances)
+        previous_u_list = smooth_cumulative_distributions(u_lists, smoothing, previous_u_list)
+        transforms = get_equalization_transform_from_cumulative_distribution(u_lists)
+
+        for t in range(chunk.shape[0]):
+            apply_equalization_transform(chunk[t], transforms[t], out=out[chunk_start + t])
+
+    return out
+
+
+# This function equalizes every frame of the stack with the adaptive equalization,
+# where the transform of each contextual region is smoothed over the same region of the previous frames.
+# frames is an uint8 array of shape (frames, rows, columns).
+# If out is given (an array with the shape and type of frames), the equalized frames are written in it.
+def perform_adaptive_hist_equalization_of_frames(frames, region_len_h, region_len_w, smoothing=0.0, out=None):
+    if out is None:
+        out = np.empty_like(frames)
+
+    frames_per_chunk = get_frames_per_chunk(frames)
+    previous_u_list = None
+
+    # All the frames have the same contextual regions, so the bins of the pixels are calculated only once.
+    region_bin_offsets = get_region_bin_offsets(frames.shape[1:], region_len_h, region_len_w)
+
+    for chunk_start in range(0, frames.shape[0], frames_per_chunk):
+        chunk = frames[chunk_start:chunk_start + frames_per_chunk]
+
+        levels_appearances = get_histograms_of_frames(chunk, region_bin_offsets)
+
+        u_lists = get_cumulative_distribution_from_histogram(levels_appearances)
+        previous_u_list = smooth_cumulative_distributions(u_lists, smoothing, previous_u_list)
+        transforms = get_equalization_transform_from_cumulative_distribution(u_lists)
+
+        for t in range(chunk.shape[0]):
+            apply_eq_transformations_of_regions(chunk[t], transforms[t], region_len_h, region_len_w,
+                                                out=out[chunk_start + t])
+
+    return out
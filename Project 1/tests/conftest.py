@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the project import each other by name, so the tests import them from src, like the scripts of src.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
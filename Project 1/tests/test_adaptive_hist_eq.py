@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pytest
+from adaptive_hist_eq import calculate_eq_transformations_of_regions_grid
+from adaptive_hist_eq import get_executor_workers
+from adaptive_hist_eq import perform_adaptive_hist_equalization
+from adaptive_hist_eq import perform_adaptive_hist_equalization_with_loops
+from adaptive_hist_eq import calculate_sparse_eq_transformations_of_regions
+from adaptive_hist_eq import calculate_high_bit_depth_eq_transformations_of_regions
+from adaptive_hist_eq import get_histograms_of_regions
+from adaptive_hist_eq import SparseRegionTransforms
+from global_hist_eq import get_equalization_transform_from_histogram
+from global_hist_eq import perform_global_hist_equalization
+from transform_cache import EqualizationTransformCache
+
+
+@pytest.mark.parametrize('executor_class', [ThreadPoolExecutor, ProcessPoolExecutor])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_parallel_region_transforms_match_serial(executor_class, workers):
+    img = np.random.default_rng(0).integers(0, 256, (250, 170), dtype=np.uint8)
+    expected = calculate_eq_transformations_of_regions_grid(img, 32, 24)
+    with executor_class(max_workers=workers) as executor:
+        assert get_executor_workers(executor) == workers
+        transforms = calculate_eq_transformations_of_regions_grid(img, 32, 24, executor)
+    np.testing.assert_array_equal(transforms, expected)
+
+
+@pytest.mark.parametrize('img_dtype, output_bits', [(np.uint16, None), (np.uint8, 12)])
+def test_high_bit_depth_equalization_rejects_executor_and_cache(img_dtype, output_bits):
+    img = np.random.default_rng(0).integers(0, 256, (64, 48)).astype(img_dtype)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(ValueError):
+            perform_adaptive_hist_equalization(img, 16, 16, executor=executor, output_bits=output_bits)
+    with pytest.raises(ValueError):
+        perform_adaptive_hist_equalization(img, 16, 16, cache=EqualizationTransformCache(), output_bits=output_bits)
+
+
+# The image sizes are multiples of the region sizes in the first cases and not in the others.
+@pytest.mark.parametrize('img_shape, region_len_h, region_len_w', [
+    ((40, 48), 8, 8), ((96, 80), 16, 24),
+    ((45, 37), 8, 10), ((33, 50), 12, 16), ((50, 41), 10, 7), ((57, 63), 10, 10), ((70, 20), 4, 13)])
+def test_adaptive_hist_equalization_matches_loops(img_shape, region_len_h, region_len_w):
+    img = np.random.default_rng(0).integers(0, 256, img_shape, dtype=np.uint8)
+    expected = perform_adaptive_hist_equalization_with_loops(img, region_len_h, region_len_w)
+    equalized_img = perform_adaptive_hist_equalization(img, region_len_h, region_len_w)
+    assert equalized_img.dtype == expected.dtype
+    np.testing.assert_array_equal(equalized_img, expected)
+
+
+# A 12-bit image with the values of an uint8 image shifted by 4 bits has the same histograms (at other levels),
+# so its equalization to 8 bits is the same as the equalization of the uint8 image.
+# The regions of 6 x 5 pixels have sparse transforms (the image has more regions * levels than pixels),
+# the regions of 32 x 24 pixels dense ones.
+@pytest.mark.parametrize('region_len_h, region_len_w, sparse', [(6, 5, True), (32, 24, False)])
+def test_12_bit_image_matches_uint8_image(region_len_h, region_len_w, sparse):
+    img = np.random.default_rng(4).integers(0, 256, (47, 61), dtype=np.uint8)
+    img_12_bits = img.astype(np.uint16) << 4
+
+    np.testing.assert_array_equal(perform_global_hist_equalization(img_12_bits, output_bits=8),
+                                  perform_global_hist_equalization(img))
+
+    transforms, _ = calculate_high_bit_depth_eq_transformations_of_regions(img_12_bits, region_len_h, region_len_w, 8)
+    assert isinstance(transforms, SparseRegionTransforms) == sparse
+    equalized_img = perform_adaptive_hist_equalization(img_12_bits, region_len_h, region_len_w, output_bits=8)
+    assert equalized_img.dtype == np.uint8
+    np.testing.assert_array_equal(equalized_img, perform_adaptive_hist_equalization(img, region_len_h, region_len_w))
+
+
+@pytest.mark.parametrize('output_levels', [256, 2 ** 16])
+def test_sparse_transforms_match_dense_transforms(output_levels):
+    levels = 300
+    img = np.random.default_rng(5).integers(0, levels, (23, 31)).astype(np.uint16)
+    img[:8, :8] = 7  # A region with a single level, and regions without the level 0.
+    dense = get_equalization_transform_from_histogram(get_histograms_of_regions(img, 8, 6, levels=levels),
+                                                      output_levels)
+    sparse = calculate_sparse_eq_transformations_of_regions(img, 8, 6, levels, output_levels)
+    assert sparse.shape == dense.shape and sparse.dtype == dense.dtype
+    np.testing.assert_array_equal(sparse.take(np.arange(dense.size)), dense.reshape(-1))
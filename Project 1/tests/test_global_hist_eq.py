@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from global_hist_eq import perform_global_hist_equalization
+from global_hist_eq import perform_global_hist_equalization_with_loops
+
+
+# The images of the tests: random images (with all the levels, and with a few levels only) and constant images.
+def get_test_images():
+    rng = np.random.default_rng(0)
+    images = {
+        'random': rng.integers(0, 256, (37, 53), dtype=np.uint8),
+        'random_dark': rng.integers(0, 40, (64, 48), dtype=np.uint8),
+        'two_levels': rng.choice(np.array([3, 200], dtype=np.uint8), (20, 30)),
+        'single_row': rng.integers(0, 256, (1, 100), dtype=np.uint8),
+    }
+    for level in (1, 128, 255):
+        images['constant_%d' % level] = np.full((16, 16), level, dtype=np.uint8)
+    return images
+
+
+@pytest.mark.parametrize('name', sorted(get_test_images()))
+@pytest.mark.parametrize('use_out', [False, True])
+def test_global_hist_equalization_matches_loops(name, use_out):
+    img = get_test_images()[name]
+    expected = perform_global_hist_equalization_with_loops(img)
+
+    if use_out:
+        out = np.full(img.shape, 77, dtype=np.uint8)
+        equalized_img = perform_global_hist_equalization(img, out=out)
+        assert equalized_img is out
+    else:
+        equalized_img = perform_global_hist_equalization(img)
+
+    assert equalized_img.dtype == expected.dtype
+    np.testing.assert_array_equal(equalized_img, expected)
+
+
+# The loops fail on an image where all the pixels are 0 (0 / 0 in the normalization of u_list),
+# while the new version maps the only level to 0.
+@pytest.mark.parametrize('use_out', [False, True])
+def test_global_hist_equalization_of_black_image(use_out):
+    img = np.zeros((10, 12), dtype=np.uint8)
+    out = np.full(img.shape, 77, dtype=np.uint8) if use_out else None
+    np.testing.assert_array_equal(perform_global_hist_equalization(img, out=out), img)
@@ -0,0 +1,24 @@
+import os
+import numpy as np
+from PIL import Image
+from histogram_report import create_reports_of_directory
+
+
+# The pairs a.png, a.tif and b.png have the same name in both directories.
+# c.png has no pair and notes.txt is not an image.
+def test_one_report_for_every_pair(tmp_path):
+    rng = np.random.default_rng(0)
+    for directory in ('before', 'after'):
+        os.makedirs(tmp_path / directory)
+        for name in ('a.png', 'a.tif', 'b.png'):
+            Image.fromarray(rng.integers(0, 256, (20, 30), dtype=np.uint8)).save(tmp_path / directory / name)
+    Image.fromarray(np.zeros((5, 5), dtype=np.uint8)).save(tmp_path / 'before' / 'c.png')
+    (tmp_path / 'before' / 'notes.txt').write_text('not an image')
+    (tmp_path / 'after' / 'notes.txt').write_text('not an image')
+
+    reports = create_reports_of_directory(tmp_path / 'before', tmp_path / 'after', tmp_path / 'reports', workers=1)
+    expected_names = ['a_png.png', 'a_tif.png', 'b_png.png']
+    assert [os.path.basename(report) for report in reports] == expected_names
+    assert sorted(os.listdir(tmp_path / 'reports')) == expected_names
+    for report in reports:
+        assert os.path.getsize(report) > 0
@@ -0,0 +1,36 @@
+import numpy as np
+from adaptive_hist_eq import perform_adaptive_hist_equalization
+from incremental_adaptive_hist_eq import IncrementalAdaptiveEqualizer
+
+
+# A sequence of frames where a small block moves over a static background, with a few frames that do not change
+# and a frame that changes everywhere.
+def get_test_frames(shape=(50, 67), frames=8):
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 256, shape, dtype=np.uint8)
+    sequence = []
+    for t in range(frames):
+        frame = background.copy()
+        frame[3 * t:3 * t + 6, 5 * t:5 * t + 9] = rng.integers(0, 256, (6, 9))
+        sequence.append(frame)
+    sequence.insert(3, sequence[2].copy())
+    sequence.append(rng.integers(0, 256, shape, dtype=np.uint8))
+    return sequence
+
+
+# With threshold = 0 every frame is equalized exactly like perform_adaptive_hist_equalization.
+def test_incremental_equalization_matches_adaptive_equalization():
+    frames = get_test_frames()
+    equalizer = IncrementalAdaptiveEqualizer(16, 12)
+    tiles_recomputed = []
+    for frame in frames:
+        np.testing.assert_array_equal(equalizer.equalize(frame), perform_adaptive_hist_equalization(frame, 16, 12))
+        tiles_recomputed.append(equalizer.tiles_recomputed)
+
+    regions = 5 * 5  # ceil(50 / 12) * ceil(67 / 16)
+    assert tiles_recomputed[0] == regions and tiles_recomputed[-1] == regions
+    assert tiles_recomputed[3] == 0  # The repeated frame.
+    assert 0 < tiles_recomputed[1] < regions
+    assert equalizer.frames == len(frames)
+    assert equalizer.total_tiles_recomputed == sum(tiles_recomputed)
+    assert equalizer.pixels_reinterpolated == frames[-1].size
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from global_hist_eq import get_equalization_transform_of_img
+from sliding_window_hist_eq import get_window_limits
+from sliding_window_hist_eq import perform_sliding_window_hist_equalization
+from sliding_window_hist_eq import calculate_integral_histogram
+from sliding_window_hist_eq import perform_sliding_window_hist_equalization_from_integral_histogram
+
+
+# The sliding window equalization of every pixel, with the global equalization transform of its window.
+def perform_sliding_window_hist_equalization_per_pixel(img_array, window_len_h, window_len_w):
+    window_x_start, window_x_end = get_window_limits(img_array.shape[0], window_len_w)
+    window_y_start, window_y_end = get_window_limits(img_array.shape[1], window_len_h)
+    equalized_img = np.zeros_like(img_array)
+    for i in range(img_array.shape[0]):
+        for j in range(img_array.shape[1]):
+            window = img_array[window_x_start[i]:window_x_end[i], window_y_start[j]:window_y_end[j]]
+            equalized_img[i, j] = get_equalization_transform_of_img(window)[img_array[i, j]]
+    return equalized_img
+
+
+@pytest.mark.parametrize('img_shape, window_len_h, window_len_w', [((23, 31), 5, 7), ((17, 9), 20, 3),
+                                                                    ((12, 14), 1, 1), ((30, 25), 8, 6)])
+@pytest.mark.parametrize('max_level', [256, 4, 1])
+def test_sliding_window_hist_equalization_matches_per_pixel(img_shape, window_len_h, window_len_w, max_level):
+    img = np.random.default_rng(0).integers(0, max_level, img_shape, dtype=np.uint8)
+    expected = perform_sliding_window_hist_equalization_per_pixel(img, window_len_h, window_len_w)
+
+    np.testing.assert_array_equal(perform_sliding_window_hist_equalization(img, window_len_h, window_len_w), expected)
+    integral_histogram = calculate_integral_histogram(img)
+    np.testing.assert_array_equal(
+        perform_sliding_window_hist_equalization_from_integral_histogram(img, integral_histogram, window_len_h,
+                                                                         window_len_w), expected)
+
+
+def test_integral_histogram_is_limited_by_max_bytes():
+    with pytest.raises(ValueError):
+        calculate_integral_histogram(np.zeros((100, 100), dtype=np.uint8), max_bytes=2 ** 20)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from global_hist_eq import perform_global_hist_equalization
+from streaming_global_hist_eq import perform_global_hist_equalization_in_chunks
+from streaming_global_hist_eq import perform_global_hist_equalization_of_file
+from streaming_global_hist_eq import get_equalized_dtype
+
+
+# uint8 images and uint16 images with 12-bit data. In the chunks of 500 pixels the largest values are different,
+# so the histograms of the chunks have different lengths.
+def get_test_img(dtype, shape=(61, 45)):
+    rng = np.random.default_rng(0)
+    high = 256 if dtype == np.uint8 else 4096
+    img = rng.integers(0, high // 2, shape).astype(dtype)
+    img[-5:] = rng.integers(0, high, (5, shape[1]))
+    return img
+
+
+@pytest.mark.parametrize('dtype, output_bits', [(np.uint8, None), (np.uint16, None), (np.uint16, 8),
+                                                (np.uint16, 12)])
+@pytest.mark.parametrize('chunk_pixels', [500, 2 ** 24])
+def test_chunks_of_memmap_match_perform_global_hist_equalization(tmp_path, dtype, output_bits, chunk_pixels):
+    img = get_test_img(dtype)
+    expected = perform_global_hist_equalization(img, output_bits=output_bits)
+
+    img_file = np.memmap(tmp_path / 'img.raw', dtype=dtype, mode='w+', shape=img.shape)
+    img_file[:] = img
+    out = np.memmap(tmp_path / 'out.raw', dtype=get_equalized_dtype(dtype, output_bits), mode='w+', shape=img.shape)
+    assert perform_global_hist_equalization_in_chunks(img_file, out, chunk_pixels, output_bits) is out
+    assert out.dtype == expected.dtype
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16])
+def test_equalization_of_npy_file(tmp_path, dtype):
+    img = get_test_img(dtype)
+    np.save(tmp_path / 'img.npy', img)
+    perform_global_hist_equalization_of_file(tmp_path / 'img.npy', tmp_path / 'out.npy', chunk_pixels=500)
+    np.testing.assert_array_equal(np.load(tmp_path / 'out.npy'), perform_global_hist_equalization(img))
@@ -0,0 +1,57 @@
+import numpy as np
+from adaptive_hist_eq import perform_adaptive_hist_equalization
+from adaptive_hist_eq import calculate_eq_transformations_of_regions_grid
+from global_hist_eq import get_equalization_transform_of_img
+from global_hist_eq import perform_global_hist_equalization
+from transform_cache import EqualizationTransformCache
+
+
+def test_one_lookup_and_one_entry_per_image():
+    img = np.random.default_rng(0).integers(0, 256, (40, 60), dtype=np.uint8)
+    cache = EqualizationTransformCache()
+
+    equalized_img = perform_global_hist_equalization(img, cache=cache)
+    statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses'], statistics['entries']) == (0, 1, 1)
+
+    np.testing.assert_array_equal(perform_global_hist_equalization(img, cache=cache), equalized_img)
+    statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses'], statistics['entries']) == (1, 1, 1)
+    assert statistics['hit_rate'] == 0.5
+
+    np.testing.assert_array_equal(equalized_img, perform_global_hist_equalization(img))
+
+
+def test_least_recently_used_transforms_are_evicted():
+    rng = np.random.default_rng(1)
+    images = [rng.integers(0, 256, (20, 20), dtype=np.uint8) for _ in range(3)]
+    cache = EqualizationTransformCache(max_entries=2)
+    for img in images + [images[2], images[0]]:
+        perform_global_hist_equalization(img, cache=cache)
+
+    statistics = cache.get_statistics()
+    # images[0] was evicted by images[2], so it is a miss again, and it evicts images[1].
+    assert (statistics['hits'], statistics['misses'], statistics['evictions'], statistics['entries']) == (1, 4, 2, 2)
+
+
+def test_adaptive_equalization_with_cache_of_repeated_regions():
+    tile = np.random.default_rng(2).integers(0, 256, (16, 16), dtype=np.uint8)
+    img = np.tile(tile, (4, 5))  # 20 identical contextual regions.
+    cache = EqualizationTransformCache()
+
+    equalized_img = perform_adaptive_hist_equalization(img, 16, 16, cache=cache)
+    np.testing.assert_array_equal(equalized_img, perform_adaptive_hist_equalization(img, 16, 16))
+    statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses'], statistics['entries']) == (19, 1, 1)
+
+
+# The global path (output_levels=256) and the regions (output_levels=None) share the transforms of uint8 histograms.
+def test_region_finds_transform_of_global_path():
+    tile = np.random.default_rng(3).integers(0, 256, (16, 16), dtype=np.uint8)
+    cache = EqualizationTransformCache()
+    transform = get_equalization_transform_of_img(tile, cache)
+
+    transforms = calculate_eq_transformations_of_regions_grid(np.tile(tile, (2, 3)), 16, 16, cache=cache)
+    statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses'], statistics['entries']) == (6, 1, 1)
+    np.testing.assert_array_equal(transforms, np.broadcast_to(transform, transforms.shape))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import video_hist_eq
+from global_hist_eq import perform_global_hist_equalization
+from global_hist_eq import get_histogram_of_img
+from global_hist_eq import get_cumulative_distribution_from_histogram
+from global_hist_eq import get_equalization_transform_from_cumulative_distribution
+from adaptive_hist_eq import perform_adaptive_hist_equalization
+from adaptive_hist_eq import get_histograms_of_regions
+from video_hist_eq import get_histograms_of_frames
+from video_hist_eq import perform_global_hist_equalization_of_frames
+from video_hist_eq import perform_adaptive_hist_equalization_of_frames
+
+
+# A stack of frames whose brightness changes from frame to frame.
+def get_test_frames(frames=7, shape=(30, 41)):
+    rng = np.random.default_rng(0)
+    return np.stack([rng.integers(10 * t, 100 + 20 * t, shape, dtype=np.uint8) for t in range(frames)])
+
+
+# The chunks of the tests have 3 frames, so the smoothing continues from chunk to chunk.
+@pytest.fixture(params=[False, True], ids=['one_chunk', 'small_chunks'])
+def chunks(request, monkeypatch):
+    if request.param:
+        monkeypatch.setattr(video_hist_eq, 'PIXELS_PER_CHUNK', 3 * 30 * 41)
+
+
+def test_histograms_of_frames():
+    frames = get_test_frames()
+    np.testing.assert_array_equal(get_histograms_of_frames(frames),
+                                  np.stack([get_histogram_of_img(frame) for frame in frames]))
+
+    region_bin_offsets = video_hist_eq.get_region_bin_offsets(frames.shape[1:], 8, 12)
+    np.testing.assert_array_equal(get_histograms_of_frames(frames, region_bin_offsets),
+                                  np.stack([get_histograms_of_regions(frame, 8, 12) for frame in frames]))
+
+
+def test_global_equalization_of_frames_without_smoothing(chunks):
+    frames = get_test_frames()
+    out = np.empty_like(frames)
+    assert perform_global_hist_equalization_of_frames(frames, 0.0, out) is out
+    np.testing.assert_array_equal(out, np.stack([perform_global_hist_equalization(frame) for frame in frames]))
+
+
+def test_adaptive_equalization_of_frames_without_smoothing(chunks):
+    frames = get_test_frames()
+    np.testing.assert_array_equal(perform_adaptive_hist_equalization_of_frames(frames, 8, 12),
+                                  np.stack([perform_adaptive_hist_equalization(frame, 8, 12) for frame in frames]))
+
+
+# smoothed_u_list[t] = smoothing * smoothed_u_list[t - 1] + (1 - smoothing) * u_list[t], from the first frame.
+def test_global_equalization_of_frames_with_smoothing(chunks):
+    frames = get_test_frames()
+    smoothing = 0.8
+    expected = np.empty_like(frames)
+    smoothed_u_list = None
+    for t, frame in enumerate(frames):
+        u_list = get_cumulative_distribution_from_histogram(get_histogram_of_img(frame))
+        if smoothed_u_list is not None:
+            u_list = smoothing * smoothed_u_list + (1 - smoothing) * u_list
+        smoothed_u_list = u_list
+        expected[t] = get_equalization_transform_from_cumulative_distribution(u_list)[frame]
+
+    np.testing.assert_array_equal(perform_global_hist_equalization_of_frames(frames, smoothing), expected)
+    # The first frame is not smoothed, and the smoothing changes the other frames.
+    np.testing.assert_array_equal(expected[0], perform_global_hist_equalization(frames[0]))
+    assert not np.array_equal(expected[-1], perform_global_hist_equalization(frames[-1]))
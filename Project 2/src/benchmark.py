@@ -0,0 +1,337 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from skimage import feature
+from my_hough_transform import vote_hough_accumulator
+from my_hough_transform import vote_hough_accumulator_near_gradients
+from my_hough_transform import get_gradient_angles
+from my_hough_transform import my_hough_transform
+from my_hough_transform import my_progressive_probabilistic_hough_transform
+from my_hough_transform import my_coarse_to_fine_hough_transform
+from harris_corner_detector import my_corner_harris
+from harris_corner_detector import my_corner_harris_fast
+from harris_corner_detector import HarrisWorkspace
+from harris_corner_detector import my_corner_peaks
+from harris_corner_detector import get_suppression_radii
+from harris_corner_detector import select_corners_anms
+from harris_corner_detector import select_corners_by_grid
+from multiscale_harris_corner_detector import my_corner_harris_multiscale
+from my_img_rotation import my_img_rotation
+from my_img_rotation import my_img_rotation_with_loops
+from my_img_rotation import get_rotated_shape
+from my_img_rotation import INTERPOLATIONS
+from my_img_rotation import my_img_rotation_by_shears
+from rotation_plan import RotationPlanCache
+
+# In the benchmark, I measure the running time of the functions of the project on large random images.
+# Every measurement is the best of a few repetitions, so that it is not affected by the first (cold) call.
+
+
+# This function returns the best running time (in seconds) of function(), out of repeat calls.
+def best_time(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# This function measures the voting of the Hough transform on random edge maps with different densities of edge pixels.
+def benchmark_hough_voting(img_shape, densities=(0.01, 0.05, 0.2), d_rho=1, d_theta=np.pi / 180):
+    N2, N1 = img_shape
+    rho_max = round(np.sqrt(N1**2 + N2**2))
+    t_rad = np.deg2rad(np.arange(-90, 90 + 1, d_theta * 180 / np.pi))
+    rhos = np.arange(-rho_max, rho_max + 1, d_rho)
+
+    print("Hough voting on a %d x %d edge map (%d rhos x %d thetas)" % (N2, N1, len(rhos), len(t_rad)))
+    rng = np.random.default_rng(0)
+    for density in densities:
+        img_binary = rng.random(img_shape) < density
+        votes = np.count_nonzero(img_binary) * len(t_rad)
+        voting_time = best_time(lambda: vote_hough_accumulator(img_binary, rhos, t_rad, rho_max, d_rho))
+        print("  %5.1f%% edges : %8.3f s (%6.1f M votes/s)" % (100 * density, voting_time, votes / voting_time / 1e6))
+
+
+# This function returns a smoothed image made of half-planes, whose borders are the given lines (rho, theta),
+# and its edges (found with the Canny detector, like in deliverable_1).
+def get_image_of_lines(img_shape, lines, sigma=2):
+    n2, n1 = np.indices(img_shape)
+    img = np.zeros(img_shape)
+    for k, (rho, theta) in enumerate(lines):
+        img += (k + 1) * (n1 * np.cos(theta) + n2 * np.sin(theta) > rho)
+    img = gaussian_filter(img / len(lines), sigma=sigma)
+    return img, feature.canny(img, sigma=1)
+
+
+# This function returns the fraction of the lines that were detected, i.e. that have a line of L
+# with rho at most max_rho_error pixels and theta at most max_theta_error radians away.
+def get_detected_fraction(lines, L, max_rho_error=3, max_theta_error=np.deg2rad(2)):
+    detected = 0
+    for rho, theta in lines:
+        # (rho, theta) and (-rho, theta - pi) (or theta + pi) are the same line.
+        detected += any(abs(sign * detected_rho - rho) <= max_rho_error
+                        and abs(detected_theta + turn - theta) <= max_theta_error
+                        for detected_rho, detected_theta in L for sign, turn in ((1, 0), (-1, np.pi), (-1, -np.pi)))
+    return detected / len(lines)
+
+
+# This function compares the voting for all the thetas with the voting near the gradient directions
+# (for a few windows delta_theta), in running time of the voting and in the fraction of known lines that are detected.
+def benchmark_hough_gradient_voting(img_shape, lines, delta_thetas_degrees=(2, 5, 10), d_rho=1, d_theta=np.pi / 180):
+    N2, N1 = img_shape
+    rho_max = round(np.sqrt(N1**2 + N2**2))
+    t_rad = np.deg2rad(np.arange(-90, 90 + 1, d_theta * 180 / np.pi))
+    rhos = np.arange(-rho_max, rho_max + 1, d_rho)
+
+    img, img_binary = get_image_of_lines(img_shape, lines)
+    gradient_angles = get_gradient_angles(img)
+    print("Hough voting near the gradients on a %d x %d image with %d lines (%d edge pixels)"
+          % (N2, N1, len(lines), np.count_nonzero(img_binary)))
+
+    full_time = best_time(lambda: vote_hough_accumulator(img_binary, rhos, t_rad, rho_max, d_rho))
+    L = my_hough_transform(img_binary, d_rho, d_theta, len(lines))[1]
+    print("  all thetas        : %8.3f s, %3.0f%% of the lines detected"
+          % (full_time, 100 * get_detected_fraction(lines, L)))
+
+    for delta_theta_degrees in delta_thetas_degrees:
+        delta_theta = np.deg2rad(delta_theta_degrees)
+        window_time = best_time(lambda: vote_hough_accumulator_near_gradients(img_binary, rhos, t_rad, rho_max, d_rho,
+                                                                              gradient_angles, delta_theta))
+        L = my_hough_transform(img_binary, d_rho, d_theta, len(lines), gradient_angles, delta_theta=delta_theta)[1]
+        print("  +-%4.1f degrees    : %8.3f s, %3.0f%% of the lines detected (speedup %.1f)"
+              % (delta_theta_degrees, window_time, 100 * get_detected_fraction(lines, L), full_time / window_time))
+
+
+# This function compares my_hough_transform with its progressive probabilistic version on an image of known lines,
+# in running time and in the fraction of the lines that are detected (for a few random orders of the pixels).
+def benchmark_probabilistic_hough(img_shape, lines, d_rho=1, d_theta=np.pi / 180, seeds=range(5)):
+    img_binary = get_image_of_lines(img_shape, lines)[1]
+    edge_pixels = np.count_nonzero(img_binary)
+    print("Progressive probabilistic Hough transform on a %d x %d image with %d lines (%d edge pixels)"
+          % (img_shape[0], img_shape[1], len(lines), edge_pixels))
+
+    full_time = best_time(lambda: my_hough_transform(img_binary, d_rho, d_theta, len(lines)), repeat=1)
+    L = my_hough_transform(img_binary, d_rho, d_theta, len(lines))[1]
+    print("  full              : %8.3f s, %3.0f%% of the lines detected"
+          % (full_time, 100 * get_detected_fraction(lines, L)))
+
+    for seed in seeds:
+        probabilistic_time = best_time(lambda: my_progressive_probabilistic_hough_transform(
+            img_binary, d_rho, d_theta, len(lines), seed=seed))
+        H, L, res = my_progressive_probabilistic_hough_transform(img_binary, d_rho, d_theta, len(lines), seed=seed)
+        print("  probabilistic (%d): %8.3f s, %3.0f%% of the lines detected, %d segments"
+              % (seed, probabilistic_time, 100 * get_detected_fraction(lines, L[:, :2]) if len(L) else 0, len(L)))
+
+
+# This function compares my_hough_transform with its coarse-to-fine version on a fine grid of rhos and thetas,
+# in running time, in the memory of the accumulators and in the lines that are found.
+def benchmark_coarse_to_fine_hough(img_shape, lines, d_rho=0.5, d_theta=np.pi / 720, coarse_factors=(4, 8)):
+    img_binary = get_image_of_lines(img_shape, lines)[1]
+    print("Coarse-to-fine Hough transform on a %d x %d image with d_rho = %g and d_theta = %g degrees"
+          % (img_shape[0], img_shape[1], d_rho, np.rad2deg(d_theta)))
+
+    full_time = best_time(lambda: my_hough_transform(img_binary, d_rho, d_theta, len(lines)), repeat=1)
+    H, L, res = my_hough_transform(img_binary, d_rho, d_theta, len(lines))
+    print("  full              : %8.3f s, accumulator %6.1f MB (%6.1f MB as float64)"
+          % (full_time, H.nbytes / 2**20, H.size * 8 / 2**20))
+
+    for coarse_factor in coarse_factors:
+        coarse_time = best_time(lambda: my_coarse_to_fine_hough_transform(img_binary, d_rho, d_theta, len(lines),
+                                                                          coarse_factor), repeat=1)
+        coarse_H, coarse_L, coarse_res = my_coarse_to_fine_hough_transform(img_binary, d_rho, d_theta, len(lines),
+                                                                           coarse_factor)
+        print("  coarse factor %2d  : %8.3f s, accumulator %6.1f MB, same lines: %s"
+              % (coarse_factor, coarse_time, coarse_H.nbytes / 2**20, np.array_equal(L, coarse_L)))
+
+
+# This function returns the shape (rows, columns) of an image with about megapixels megapixels and a 4:3 aspect ratio.
+def get_shape_of_megapixels(megapixels):
+    rows = round(np.sqrt(megapixels * 1e6 * 3 / 4))
+    return rows, round(megapixels * 1e6 / rows)
+
+
+# This function compares my_corner_harris with my_corner_harris_fast on random images of a few sizes (in megapixels),
+# in running time and in the largest difference of their responses (relative to the largest response).
+# my_corner_harris needs several float64 copies of the image, so it is measured only on images with at most
+# max_reference_megapixels megapixels.
+def benchmark_harris(megapixels=(1, 10, 50), k=0.05, sigma=2.5, max_reference_megapixels=10):
+    print("Harris response (k = %g, sigma = %g)" % (k, sigma))
+    rng = np.random.default_rng(0)
+    workspace = HarrisWorkspace()
+    for size in megapixels:
+        img_shape = get_shape_of_megapixels(size)
+        img = rng.random(img_shape, dtype=np.float32)
+
+        fast_time = best_time(lambda: my_corner_harris_fast(img, k, sigma, workspace))
+        workspace_megabytes = (workspace.planes.nbytes + workspace.scratch.nbytes) / 2**20
+        if size > max_reference_megapixels:
+            print("  %3d MP (%5d x %5d): fast %8.3f s, workspace %6.0f MB"
+                  % (size, img_shape[0], img_shape[1], fast_time, workspace_megabytes))
+            continue
+
+        reference_time = best_time(lambda: my_corner_harris(img, k, sigma), repeat=1)
+        R = my_corner_harris(img, k, sigma)
+        error = np.max(np.abs(my_corner_harris_fast(img, k, sigma, workspace) - R)) / np.max(np.abs(R))
+        del R
+        print("  %3d MP (%5d x %5d): fast %8.3f s, workspace %6.0f MB, original %8.3f s (speedup %.1f), "
+              "relative difference %.1e" % (size, img_shape[0], img_shape[1], fast_time, workspace_megabytes,
+                                            reference_time, reference_time / fast_time, error))
+
+
+# This function returns the suppression radii of the corners like get_suppression_radii, by comparing all the pairs
+# of corners (a few rows of corners at a time, so that the distances of all the pairs are not kept at once).
+def get_suppression_radii_of_all_pairs(corner_locations, scores, robustness=0.9, rows_per_step=256):
+    radii = np.empty(len(corner_locations))
+    for start in range(0, len(corner_locations), rows_per_step):
+        differences = corner_locations[start:start + rows_per_step, np.newaxis, :] - corner_locations[np.newaxis, :, :]
+        distances = np.hypot(differences[..., 0], differences[..., 1])
+        distances[scores[start:start + rows_per_step, np.newaxis] >= robustness * scores[np.newaxis, :]] = np.inf
+        radii[start:start + rows_per_step] = np.min(distances, axis=1)
+    return radii
+
+
+# This function compares the ways of choosing n well-distributed corners out of all the corners of a random image:
+# the suppression radii of all the pairs of corners, the radii with the KD-tree (select_corners_anms),
+# and the grid (select_corners_by_grid).
+def benchmark_corner_selection(img_shape=(800, 1000), n=500, k=0.05, sigma=1.5):
+    img = np.random.default_rng(0).random(img_shape)
+    corner_locations, scores = my_corner_peaks(my_corner_harris_fast(img, k, sigma), 0, return_scores=True)
+    print("Selection of %d out of %d corners on a %d x %d image"
+          % (n, len(corner_locations), img_shape[0], img_shape[1]))
+
+    pairs_time = best_time(lambda: get_suppression_radii_of_all_pairs(corner_locations, scores), repeat=1)
+    same_radii = np.allclose(get_suppression_radii_of_all_pairs(corner_locations, scores),
+                             get_suppression_radii(corner_locations, scores))
+    print("  all the pairs     : %8.3f s" % pairs_time)
+    anms_time = best_time(lambda: select_corners_anms(corner_locations, scores, n))
+    print("  KD-tree           : %8.3f s (speedup %.1f), same radii: %s"
+          % (anms_time, pairs_time / anms_time, same_radii))
+    grid_time = best_time(lambda: select_corners_by_grid(corner_locations, scores, img_shape, n))
+    print("  grid              : %8.3f s (speedup %.1f)" % (grid_time, pairs_time / grid_time))
+
+
+# This function compares the multiscale detector (on the Gaussian pyramid) with a single-scale detection (at sigma)
+# and with a detection on the whole image for each of the sigmas, in running time.
+def benchmark_multiscale_harris(img_shape=(2000, 3000), sigmas=tuple(2 ** (i / 2) for i in range(8)), sigma=2.5,
+                                k=0.05, rel_threshold=0.01):
+    img = np.random.default_rng(0).random(img_shape, dtype=np.float32)
+    workspace = HarrisWorkspace()
+    print("Multiscale Harris on a %d x %d image with %d sigmas from %g to %g"
+          % (img_shape[0], img_shape[1], len(sigmas), min(sigmas), max(sigmas)))
+
+    single_time = best_time(lambda: my_corner_peaks(my_corner_harris_fast(img, k, sigma, workspace), rel_threshold),
+                            repeat=1)
+    print("  single sigma      : %8.3f s" % single_time)
+    each_time = best_time(lambda: [my_corner_peaks(my_corner_harris_fast(img, k, each_sigma, workspace), rel_threshold)
+                                   for each_sigma in sigmas], repeat=1)
+    print("  each sigma        : %8.3f s (%.1f times the single sigma)" % (each_time, each_time / single_time))
+    multiscale_time = best_time(lambda: my_corner_harris_multiscale(img, k, sigmas, rel_threshold), repeat=1)
+    print("  pyramid           : %8.3f s (%.1f times the single sigma)"
+          % (multiscale_time, multiscale_time / single_time))
+
+
+# This function compares my_img_rotation with the first version (with loops over the pixels) on random RGB images
+# of a few sizes (in megapixels). The first version is measured only on images with at most max_loops_megapixels
+# megapixels, because it takes minutes on large images.
+def benchmark_rotation(megapixels=(0.1, 1, 12), angle=np.deg2rad(54), max_loops_megapixels=0.1):
+    print("Rotation of RGB images by %g degrees" % np.rad2deg(angle))
+    rng = np.random.default_rng(0)
+    for size in megapixels:
+        img_shape = get_shape_of_megapixels(size)
+        img = rng.integers(0, 256, img_shape + (3,), dtype=np.uint8)
+
+        vectorized_time = best_time(lambda: my_img_rotation(img, angle))
+        if size > max_loops_megapixels:
+            print("  %5.1f MP (%5d x %5d): vectorized %8.3f s" % (size, img_shape[0], img_shape[1], vectorized_time))
+            continue
+
+        loops_time = best_time(lambda: my_img_rotation_with_loops(img, angle), repeat=1)
+        same_pixels = np.array_equal(my_img_rotation(img, angle), my_img_rotation_with_loops(img, angle))
+        print("  %5.1f MP (%5d x %5d): vectorized %8.3f s, loops %8.3f s (speedup %.0f), same pixels: %s"
+              % (size, img_shape[0], img_shape[1], vectorized_time, loops_time, loops_time / vectorized_time,
+                 same_pixels))
+
+
+# This function measures my_img_rotation with each interpolation on a random RGB image (uint8 and uint16),
+# writing the rotated images in the same output array.
+def benchmark_rotation_interpolations(megapixels=12, angle=np.deg2rad(54), dtypes=(np.uint8, np.uint16)):
+    img_shape = get_shape_of_megapixels(megapixels)
+    print("Interpolations of the rotation of a %d x %d RGB image" % img_shape)
+    rng = np.random.default_rng(0)
+    for dtype in dtypes:
+        img = rng.integers(0, np.iinfo(dtype).max, img_shape + (3,), dtype=dtype, endpoint=True)
+        for interpolation in INTERPOLATIONS:
+            rot_dtype = np.uint8 if interpolation == 'average' else dtype
+            out = np.empty(get_rotated_shape(img_shape, angle) + (3,), dtype=rot_dtype)
+            rotation_time = best_time(lambda: my_img_rotation(img, angle, interpolation, out))
+            output_pixels = out.shape[0] * out.shape[1]
+            print("  %-6s %-8s: %8.3f s (%5.1f M output pixels/s)"
+                  % (np.dtype(dtype).name, interpolation, rotation_time, output_pixels / rotation_time / 1e6))
+
+
+# This function compares the rotation by gathering the pixels (my_img_rotation) with the rotation by three shears
+# (my_img_rotation_by_shears) on large random RGB images, with the same interpolation, in running time and in the
+# mean difference of their pixels (far from the sides of the image). The shears run in one thread for each CPU,
+# with the same pool for all the images.
+def benchmark_rotation_backends(megapixels=(10, 30, 100), angle=np.deg2rad(54), interpolation='bilinear'):
+    print("Rotation by %g degrees (%s) by gathering and by three shears (%d CPUs)"
+          % (np.rad2deg(angle), interpolation, os.cpu_count()))
+    rng = np.random.default_rng(0)
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for size in megapixels:
+            img_shape = get_shape_of_megapixels(size)
+            img = rng.integers(0, 256, img_shape + (3,), dtype=np.uint8)
+            out = np.empty(get_rotated_shape(img_shape, angle) + (3,), dtype=np.uint8)
+
+            gather_time = best_time(lambda: my_img_rotation(img, angle, interpolation, out), repeat=1)
+            gathered = out.copy()
+            shears_time = best_time(lambda: my_img_rotation_by_shears(img, angle, interpolation, out, executor),
+                                    repeat=1)
+            center = tuple(slice(side // 4, 3 * side // 4) for side in out.shape[:2])
+            difference = np.mean(np.abs(gathered[center].astype(np.int16) - out[center]))
+            del gathered
+            print("  %5.1f MP (%5d x %5d): gather %8.3f s, shears %8.3f s (speedup %.2f), mean difference %.2f"
+                  % (size, img_shape[0], img_shape[1], gather_time, shears_time, gather_time / shears_time, difference))
+
+
+# The time of rotating many images of the same shape by the same angle without plans, with a new plan (a miss
+# of the cache) and with a plan of the cache (a hit).
+def benchmark_rotation_plans(img_shapes=((256, 256), (1000, 1000)), angle=np.deg2rad(54), interpolation='bilinear'):
+    print("Rotation by %g degrees (%s) with cached plans" % (np.rad2deg(angle), interpolation))
+    rng = np.random.default_rng(0)
+    for img_shape in img_shapes:
+        img = rng.integers(0, 256, img_shape + (3,), dtype=np.uint8)
+        out = np.empty(get_rotated_shape(img_shape, angle) + (3,), dtype=np.uint8)
+
+        no_cache_time = best_time(lambda: my_img_rotation(img, angle, interpolation, out))
+        plan_cache = RotationPlanCache()
+        start = time.perf_counter()
+        my_img_rotation(img, angle, interpolation, out, plan_cache=plan_cache)
+        miss_time = time.perf_counter() - start
+        hit_time = best_time(lambda: my_img_rotation(img, angle, interpolation, out, plan_cache=plan_cache), repeat=10)
+        print("  %5d x %5d: no cache %8.4f s, miss %8.4f s, hit %8.4f s (speedup %.2f), plan %.1f MB"
+              % (img_shape[0], img_shape[1], no_cache_time, miss_time, hit_time, no_cache_time / hit_time,
+                 plan_cache.get_statistics()['bytes'] / 2**20))
+
+
+if __name__ == "__main__":
+    benchmark_hough_voting((1000, 1500))
+
+    # 5 known lines (rho, theta) on a 300 x 400 image.
+    known_lines = [(100, np.deg2rad(30)), (-80, np.deg2rad(-60)), (200, np.deg2rad(5)), (150, np.deg2rad(80)),
+                   (250, np.deg2rad(45))]
+    benchmark_hough_gradient_voting((300, 400), known_lines)
+    benchmark_probabilistic_hough((300, 400), known_lines)
+    benchmark_coarse_to_fine_hough((300, 400), known_lines)
+
+    benchmark_harris()
+    benchmark_corner_selection()
+    benchmark_multiscale_harris()
+
+    benchmark_rotation()
+    benchmark_rotation_interpolations()
+    benchmark_rotation_backends()
+    benchmark_rotation_plans()
@@ -1,6 +1,9 @@
 import numpy as np
 from scipy.signal import convolve2d
 from scipy.ndimage import convolve
+from scipy.ndimage import convolve1d
+from scipy.ndimage import maximum_filter
+from scipy.spatial import cKDTree
 
 # The equations referred to in the code are found in Section 2.2
 
@@ -45,39 +48,268 @@ def my_corner_harris(img, k, sigma):
     return harris_response
 
 
-def my_corner_peaks(harris_response, rel_threshold):
+# This function returns the 1-D Gaussian window of my_corner_harris (normalized so that its sum equals 1).
+# The 2-D window g of my_corner_harris is the outer product of this window with itself,
+# because exp(-(x^2 + y^2) / (2 * sigma^2)) = exp(-x^2 / (2 * sigma^2)) * exp(-y^2 / (2 * sigma^2)).
+def get_gaussian_window_1d(sigma):
+    filter_size = round(4 * sigma)
+    half_size = (filter_size - 1) / 2
+    x = np.arange(-half_size, half_size + 1)
+    g = np.exp(-x ** 2 / (2 * sigma ** 2))
+    return g / np.sum(g)
+
+
+# This class keeps the float32 arrays that my_corner_harris_fast needs, so that they are allocated only once
+# for a sequence of images with the same shape (e.g. the frames of a video) and not in every call.
+# There are only 4 arrays with the shape of the image (16 bytes for each pixel), because every step overwrites
+# the arrays of the previous steps that are no longer needed:
+#   planes  : The image (in planes[2]) and Ix, Iy (in planes[0] and planes[1]), then the products
+#             Ix * Ix, Iy * Iy and Ix * Iy, then the smoothed products Ix2, Iy2 and Ixy, and finally the response
+#             (in planes[0]).
+#   scratch : The results of the first 1-D filter of every separable filter, and the temporary array of equation 7.
+class HarrisWorkspace:
+
+    def __init__(self):
+        self.shape = None
+
+    # This function (re)allocates the arrays for images with the shape img_shape, if they have another shape.
+    def get_buffers(self, img_shape):
+        if self.shape != img_shape:
+            self.shape = img_shape
+            self.planes = np.empty((3,) + img_shape, dtype=np.float32)
+            self.scratch = np.empty(img_shape, dtype=np.float32)
+        return self
+
+
+# This function returns the same response as my_corner_harris, calculated faster and with less memory:
+#   1. Both the Sobel masks and the Gaussian window are separable (outer products of two 1-D filters),
+#      so each 2-D convolution is replaced by two 1-D convolutions (along the rows and along the columns).
+#      A window of side s costs 2 * s instead of s^2 multiplications per pixel.
+#      (The image is zero-padded, like in convolve2d and in convolve with mode='constant', so the result is the same.)
+#   2. All the arrays are float32 and are kept in a HarrisWorkspace, which is reused between calls if it is given.
+#      The workspace needs 16 bytes for each pixel of the image (e.g. 800 MB for a 50 MP image), while my_corner_harris
+#      keeps about 7 float64 arrays at once (56 bytes for each pixel, and more for the padded convolutions).
+#   3. The three products Ix * Ix, Iy * Iy and Ix * Iy are calculated in place, over Ix, Iy and the image.
+# The difference from the float64 response of my_corner_harris is at most about 1e-6 * max(|R|)
+# (float32 has 24 bits of precision), so only corners with a response at the threshold of my_corner_peaks may change.
+# The returned response is kept by the workspace and is overwritten by the next call with the same workspace,
+# so it must be copied if it is needed later.
+def my_corner_harris_fast(img, k, sigma, workspace=None):
+    if workspace is None:
+        workspace = HarrisWorkspace()
+    buffers = workspace.get_buffers(np.shape(img))
+    products = get_gradient_products(img, buffers)
+    return get_response_of_gradient_products(products, k, sigma, buffers)
+
+
+# This function calculates the products Ix * Ix, Iy * Iy and Ix * Iy of the partial derivatives of the image
+# (found with the Sobel masks) into buffers.planes (of a HarrisWorkspace) and returns it.
+# They do not depend on sigma, so they can be used for the responses of many Gaussian windows.
+def get_gradient_products(img, buffers):
+    planes, scratch = buffers.planes, buffers.scratch
+    Ix, Iy, img_float = planes
+    np.copyto(img_float, img, casting='unsafe')
+
+    # The horizontal Sobel mask is [1, 2, 1]^T * [-1, 0, 1] and the vertical one is [1, 0, -1]^T * [1, 2, 1].
+    convolve1d(img_float, [1, 2, 1], axis=0, output=scratch, mode='constant', cval=0.0)
+    convolve1d(scratch, [-1, 0, 1], axis=1, output=Ix, mode='constant', cval=0.0)
+    convolve1d(img_float, [1, 0, -1], axis=0, output=scratch, mode='constant', cval=0.0)
+    convolve1d(scratch, [1, 2, 1], axis=1, output=Iy, mode='constant', cval=0.0)
+
+    # The image is no longer needed, so Ix * Iy is written over it, and Ix * Ix and Iy * Iy over Ix and Iy.
+    np.multiply(Ix, Iy, out=img_float)
+    np.multiply(Ix, Ix, out=Ix)
+    np.multiply(Iy, Iy, out=Iy)
+    return planes
+
+
+# This function returns the response (equation 7) for the Gaussian window of sigma, from the stacked products
+# [Ix * Ix, Iy * Iy, Ix * Iy] of get_gradient_products. The response is calculated into buffers.planes[0],
+# and buffers.planes and buffers.scratch are overwritten (products may be buffers.planes itself, or a copy of it
+# that is not changed).
+def get_response_of_gradient_products(products, k, sigma, buffers):
+    # The elements of matrix M in equation 5 (Ix2, Iy2 and Ixy), smoothed by the Gaussian window.
+    g = get_gaussian_window_1d(sigma)
+    planes, temp = buffers.planes, buffers.scratch
+    for product, plane in zip(products, planes):
+        convolve1d(product, g, axis=0, output=temp, mode='constant', cval=0.0)
+        convolve1d(temp, g, axis=1, output=plane, mode='constant', cval=0.0)
+    Ix2, Iy2, Ixy = planes
+
+    # Equation 7, in place: R = (Ix2 * Iy2 - Ixy^2) - k * (Ix2 + Iy2)^2.
+    np.add(Ix2, Iy2, out=temp)
+    harris_response = np.multiply(Ix2, Iy2, out=Ix2)
+    np.multiply(Ixy, Ixy, out=Ixy)
+    harris_response -= Ixy
+    np.multiply(temp, temp, out=temp)
+    temp *= k
+    harris_response -= temp
+
+    return harris_response
+
+
+# This function returns the corners of harris_response: the local maxima whose response is greater than
+# rel_threshold * max(harris_response) (like before, the maximum of the whole array).
+# The local maxima are found with a single maximum filter instead of a loop over the pixels:
+# a pixel is a local maximum if it is equal to the maximum of its neighborhood.
+# neighborhood_size : The side of the (square) neighborhood of the local maxima (3, i.e. 3x3, like before).
+# border : The pixels that are less than border pixels away from the sides of the image are never corners
+#          (1 like before, where the pixels of the sides were not examined).
+# min_distance : A corner that is less than min_distance pixels away from a stronger corner is skipped.
+#                (With the default distance of 0, no corner is skipped.)
+# max_corners : If it is given, at most the max_corners strongest corners are returned.
+# return_scores : If it is True, the response of each corner is also returned.
+# The corners are sorted from the strongest to the weakest (corners with equal responses in the order of the image).
+def my_corner_peaks(harris_response, rel_threshold, neighborhood_size=3, min_distance=0, max_corners=None, border=1,
+                    return_scores=False):
     rows, cols = harris_response.shape
 
     # Local maxima of harris_response are the points of interest in this specific case where we are looking for corners.
+    local_max = get_local_maxima(harris_response, neighborhood_size)
 
-    # This array will be used to store the local maxima of harris_response array.
-    # All values in the array are initially set to False,
-    # indicating that no local maxima have been detected at any position.
-    # As the code processes each pixel, it will update this array to True where local maxima are found.
-    local_max = np.zeros_like(harris_response, dtype=bool)
-
-    # Find the positions of the harris_response array at which there are local maxima.
-    for i in range(1, rows - 1):
-        for j in range(1, cols - 1):
-            # Extract the 3x3 neighborhood
-            neighborhood = harris_response[i - 1:i + 2, j - 1:j + 2]
-            if harris_response[i, j] == np.max(neighborhood):
-                local_max[i, j] = True
+    # Exclude the border of the image.
+    if border > 0:
+        local_max[:border, :] = False
+        local_max[rows - border:, :] = False
+        local_max[:, :border] = False
+        local_max[:, cols - border:] = False
 
     # Determine the threshold based on the relative threshold.
     threshold = harris_response.max() * rel_threshold
 
-    # Keep only the corners that match the local maxima.
-    harris_response = harris_response * local_max
-
-    # Find corners that exceed the threshold.
-    corners = (harris_response > threshold)
+    # Find the local maxima that exceed the threshold, and get the row and column indices of the corners.
+    corner_rows, corner_cols = np.nonzero(local_max & (harris_response > threshold))
+    scores = harris_response[corner_rows, corner_cols]
 
-    # Get the row and column indices of the corners.
-    rows, cols = np.nonzero(corners)
+    # Sort the corners from the strongest to the weakest (the sort is stable, so equal responses keep their order).
+    order = np.argsort(-scores, kind='stable')
+    corner_locations = np.column_stack((corner_rows[order], corner_cols[order]))
+    scores = scores[order]
 
-    corner_locations = np.column_stack((rows, cols))
+    corner_locations, scores = select_corners(corner_locations, scores, min_distance, max_corners)
 
     # Return the coordinates of the detected corners.
+    if return_scores:
+        return corner_locations, scores
     return corner_locations
 
+
+# This function returns a boolean array that is True at the local maxima of harris_response, i.e. at the pixels that
+# are equal to the maximum of their (square) neighborhood of side neighborhood_size.
+# At the sides of the image, the neighborhood is completed with copies of the nearest pixels,
+# which are already in the neighborhood, so it does not change the maximum.
+def get_local_maxima(harris_response, neighborhood_size=3):
+    return harris_response == maximum_filter(harris_response, size=neighborhood_size, mode='nearest')
+
+
+# This function chooses corners from corner_locations (sorted from the strongest to the weakest, with their scores).
+# A corner that is less than min_distance pixels away from a stronger chosen corner is skipped, and at most
+# max_corners corners are chosen (if it is given). It returns the chosen corners and their scores.
+def select_corners(corner_locations, scores, min_distance=0, max_corners=None):
+    if min_distance > 0 and len(corner_locations) > 1:
+        # I keep the corners greedily, from the strongest one. The neighbors of each corner (the corners that are
+        # closer than min_distance) are found with a KD-tree, and they are skipped when the corner is kept.
+        tree = cKDTree(corner_locations)
+        neighbors = tree.query_ball_point(corner_locations, r=np.nextafter(min_distance, 0))
+        skipped = np.zeros(len(corner_locations), dtype=bool)
+        kept = []
+        for index in range(len(corner_locations)):
+            if skipped[index]:
+                continue
+            kept.append(index)
+            if max_corners is not None and len(kept) == max_corners:
+                break
+            skipped[neighbors[index]] = True
+        corner_locations = corner_locations[kept]
+        scores = scores[kept]
+
+    if max_corners is not None:
+        corner_locations = corner_locations[:max_corners]
+        scores = scores[:max_corners]
+
+    return corner_locations, scores
+
+
+# This function returns the suppression radius of each corner of corner_locations (with their scores), which is
+# the distance to the nearest corner that is sufficiently stronger (score < robustness * stronger_score).
+# The strongest corners, which have no such corner, have an infinite radius.
+# Comparing all the pairs of corners costs O(n^2), so I find the nearest corners in rounds, with k = 16, 64, 256, ...:
+#   - A corner with at most k sufficiently stronger corners (one of the strongest) is compared with all of them.
+#   - The other corners are compared with their k nearest neighbors, which are found with a KD-tree.
+#     The corners without a sufficiently stronger corner among them are left for the next round.
+# A weak corner usually has a stronger corner very close, so on real images almost all the corners are found
+# in the first round, and only a few corners remain for the rounds with the larger k, so the cost is about O(n log n).
+def get_suppression_radii(corner_locations, scores, robustness=0.9, k=16):
+    radii = np.full(len(corner_locations), np.inf)
+    if len(corner_locations) < 2:
+        return radii
+    tree = cKDTree(corner_locations)
+
+    # The corners from the strongest to the weakest, and the number of sufficiently stronger corners of each corner.
+    order = np.argsort(-scores, kind='stable')
+    strongest_locations = corner_locations[order]
+    stronger_counts = np.searchsorted(-robustness * scores[order], -scores, side='left')
+
+    pending = np.arange(len(corner_locations))
+    while len(pending) > 0:
+        few_stronger = stronger_counts[pending] <= k
+
+        # The corners that are compared with all their sufficiently stronger corners.
+        compared = pending[few_stronger]
+        count = np.max(stronger_counts[compared], initial=0)
+        if count > 0:
+            differences = corner_locations[compared, np.newaxis, :] - strongest_locations[np.newaxis, :count, :]
+            distances = np.hypot(differences[..., 0], differences[..., 1])
+            distances[np.arange(count) >= stronger_counts[compared, np.newaxis]] = np.inf
+            radii[compared] = np.min(distances, axis=1)
+
+        # The other corners are compared with their k nearest neighbors (they have more than k corners, so k < n).
+        # The neighbors are sorted by distance, so the first sufficiently stronger neighbor is the nearest one.
+        pending = pending[~few_stronger]
+        if len(pending) == 0:
+            break
+        distances, neighbors = tree.query(corner_locations[pending], k=k)
+        stronger = scores[pending, np.newaxis] < robustness * scores[neighbors]
+        found = np.any(stronger, axis=1)
+        nearest = np.argmax(stronger[found], axis=1)
+        radii[pending[found]] = distances[found, nearest]
+
+        pending = pending[~found]
+        k *= 4
+
+    return radii
+
+
+# This function chooses the n corners of corner_locations (with their scores) with the largest suppression radii
+# (adaptive non-maximal suppression), which are strong and spread over the whole image.
+# It returns the chosen corners and their scores, from the largest radius to the smallest
+# (corners with equal radii in the order of corner_locations).
+def select_corners_anms(corner_locations, scores, n, robustness=0.9):
+    radii = get_suppression_radii(corner_locations, scores, robustness)
+    order = np.argsort(-radii, kind='stable')[:n]
+    return corner_locations[order], scores[order]
+
+
+# This function is a faster (approximate) alternative of select_corners_anms. It divides the image (with the shape
+# img_shape) into a grid of about n cells (or grid_shape cells) and chooses the strongest corner of each cell,
+# then the second strongest corner of each cell, and so on, until n corners are chosen.
+# corner_locations must be sorted from the strongest to the weakest, like the corners of my_corner_peaks.
+# It returns the chosen corners and their scores, from the strongest to the weakest.
+def select_corners_by_grid(corner_locations, scores, img_shape, n, grid_shape=None):
+    rows, cols = img_shape
+    if grid_shape is None:
+        grid_rows = max(1, round(np.sqrt(n * rows / cols)))
+        grid_shape = (grid_rows, -(-n // grid_rows))
+    grid_rows, grid_cols = grid_shape
+
+    # The cell of each corner, and the rank of each corner in its cell (0 for the strongest).
+    cells = (corner_locations[:, 0] * grid_rows // rows) * grid_cols + corner_locations[:, 1] * grid_cols // cols
+    order = np.argsort(cells, kind='stable')
+    sorted_cells = cells[order]
+    first_of_cell = np.searchsorted(sorted_cells, sorted_cells)
+    ranks = np.empty(len(cells), dtype=np.intp)
+    ranks[order] = np.arange(len(cells)) - first_of_cell
+
+    # The corners by rank (and corners of the same rank from the strongest to the weakest).
+    chosen = np.sort(np.argsort(ranks, kind='stable')[:n])
+    return corner_locations[chosen], scores[chosen]
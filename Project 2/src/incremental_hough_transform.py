@@ -0,0 +1,77 @@
+import numpy as np
+from my_hough_transform import get_accumulator_dtype
+from my_hough_transform import vote_edge_pixels
+from my_hough_transform import find_hough_peaks
+
+
+# This class performs the Hough transform (like my_hough_transform) on consecutive edge maps of a video,
+# where most of the edge pixels of each frame are also edges in the previous frame.
+# It keeps the accumulator and the previous edge map between calls. For every new edge map:
+#   1. I find the pixels that are edges only in the new map (added) and only in the previous map (removed).
+#   2. I add the votes of the added pixels to the accumulator and remove the votes of the removed pixels.
+#   3. I find the n strongest lines in the accumulator, like my_hough_transform.
+# The accumulator is always the same as the accumulator of the new edge map calculated from scratch,
+# so H, L and res are the same as the ones of my_hough_transform. (H has the type that can hold the votes
+# of all the pixels of the image, because the number of edge pixels changes from frame to frame.)
+class IncrementalHoughTransform:
+
+    def __init__(self, d_rho, d_theta, n, min_rho_distance=0, min_theta_distance=0):
+        self.d_rho = d_rho
+        self.d_theta = d_theta
+        self.n = n
+        self.min_rho_distance = min_rho_distance
+        self.min_theta_distance = min_theta_distance
+
+        # The previous edge map and the accumulator (with the thetas in the first axis, see vote_edge_pixels),
+        # and the rhos and the thetas of the accumulator. They are initialized by the first edge map.
+        self.previous_img_binary = None
+        self.votes = None
+        self.rho_max = None
+        self.rhos = None
+        self.t_rad = None
+
+        # The votes of the lines that were found in the last edge map.
+        self.strengths = None
+
+        # The number of edge pixels that were added and removed, for every edge map.
+        self.pixels_added_per_frame = []
+        self.pixels_removed_per_frame = []
+
+    # This function calculates the Hough transform of the next edge map and returns H, L and res
+    # like my_hough_transform. The returned H is kept by the object and is updated in place by the next call,
+    # so it must be copied if it is needed later.
+    def transform(self, img_binary):
+        img_binary = img_binary != 0
+        if self.previous_img_binary is None or self.previous_img_binary.shape != img_binary.shape:
+            self.initialize(img_binary.shape)
+            self.previous_img_binary = np.zeros(img_binary.shape, dtype=bool)
+
+        # 1. The pixels that were added and removed.
+        added_n2, added_n1 = np.nonzero(img_binary & ~self.previous_img_binary)
+        removed_n2, removed_n1 = np.nonzero(self.previous_img_binary & ~img_binary)
+
+        # 2. I update the accumulator with their votes.
+        vote_edge_pixels(self.votes, added_n1, added_n2, self.rhos, self.t_rad, self.rho_max, self.d_rho)
+        vote_edge_pixels(self.votes, removed_n1, removed_n2, self.rhos, self.t_rad, self.rho_max, self.d_rho,
+                         subtract=True)
+        self.previous_img_binary = img_binary
+
+        self.pixels_added_per_frame.append(len(added_n1))
+        self.pixels_removed_per_frame.append(len(removed_n1))
+
+        # 3. The n strongest lines.
+        H = self.votes.T
+        max_cells, self.strengths = find_hough_peaks(H, self.rhos, self.t_rad, self.n, self.min_rho_distance,
+                                                     self.min_theta_distance)
+        L = np.array([[self.rhos[row], self.t_rad[col]] for row, col in max_cells])
+        res = img_binary.size - int(np.sum(self.strengths, dtype=np.int64))
+
+        return H, L, res
+
+    # This function creates the empty accumulator for edge maps with the shape img_shape.
+    def initialize(self, img_shape):
+        N2, N1 = img_shape
+        self.rho_max = round(np.sqrt(N1**2 + N2**2))  # Max possible distance from origin
+        self.t_rad = np.deg2rad(np.arange(-90, 90 + 1, self.d_theta * 180 / np.pi))
+        self.rhos = np.arange(-self.rho_max, self.rho_max + 1, self.d_rho)
+        self.votes = np.zeros((len(self.t_rad), len(self.rhos)), dtype=get_accumulator_dtype(N1 * N2))
@@ -0,0 +1,135 @@
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from harris_corner_detector import HarrisWorkspace
+from harris_corner_detector import get_gradient_products
+from harris_corner_detector import get_response_of_gradient_products
+from harris_corner_detector import get_local_maxima
+
+# The functions of this file find corners at several scales (sigmas of the Gaussian window) together.
+# Calling my_corner_harris for each sigma on the whole image recalculates the partial derivatives every time,
+# and the large sigmas need large windows. Instead, I build a Gaussian pyramid of the image once:
+# the first level is the image smoothed by a Gaussian of PYRAMID_SIGMA, and every other level is the previous level
+# smoothed (by a Gaussian of PYRAMID_SIGMA level pixels) and subsampled by 2.
+# A sigma is handled at the level where it is between min_level_sigma and 2 * min_level_sigma level pixels,
+# so every window has a small size, and the products of the partial derivatives of each level are calculated once
+# and are used for all the sigmas of the level.
+#
+# The partial derivatives of a level are measured at its derivative scale sigma_D: the blur of the level
+# (all the Gaussians of the pyramid up to it) together with the blur of the Sobel masks ([1, 2, 1] / 4 has
+# a variance of 1/2 pixel^2). sigma_D is not the same for all the levels (in level pixels), so the responses are
+# scale-normalized:
+#   1. The products of the partial derivatives of each level are multiplied by sigma_D^2 (Lindeberg's normalization,
+#      with sigma_D in level pixels, which is the same as sigma_D * dI/dx with sigma_D and the derivative in pixels
+#      of the image) and divided by 8^2 (the Sobel masks give 8 times the derivative).
+#   2. All the sigmas of a level share its sigma_D, so the ratio sigma / sigma_D grows from min_level_sigma / sigma_D
+#      to twice that within a level and drops at the next level. The elements of M of an edge are proportional to
+#      sigma_D / sigma (the part of the Gaussian window that the edge covers), so the elements of M are also
+#      multiplied by sigma / sigma_D, i.e. the response by (sigma / sigma_D)^2. (With a fixed ratio sigma / sigma_D,
+#      this is only a constant factor, and the normalization is the usual one of sigma_D^2.)
+# So the responses of all the scales are comparable, and a corner has about the same response in an image and in
+# the image zoomed by 2 (at twice the sigma).
+# A corner is a local maximum of the response of its scale, greater than the threshold (rel_threshold times the
+# maximum response of all the scales), and at least as strong as the responses of the same point at the previous
+# and the next scale.
+
+# The sigma of the Gaussians that smooth the image (the first level) and each level of the pyramid before it is
+# subsampled.
+PYRAMID_SIGMA = 1.0
+
+# The variance (in pixels^2) of the smoothing of the Sobel masks across the direction of the derivative.
+SOBEL_VARIANCE = 0.5
+
+
+# This function returns the level of the pyramid of each sigma (in pixels of the whole image).
+def get_pyramid_levels(sigmas, min_level_sigma=1.0):
+    return [max(0, int(np.floor(np.log2(sigma / min_level_sigma)))) for sigma in sigmas]
+
+
+# This function returns the first levels of the Gaussian pyramid of img (as float32 arrays).
+def get_gaussian_pyramid(img, levels):
+    pyramid = [gaussian_filter(np.asarray(img, dtype=np.float32), PYRAMID_SIGMA, mode='nearest')]
+    for _ in range(1, levels):
+        smoothed = gaussian_filter(pyramid[-1], PYRAMID_SIGMA, mode='nearest')
+        pyramid.append(np.ascontiguousarray(smoothed[::2, ::2]))
+    return pyramid
+
+
+# This function returns the derivative scale sigma_D (in level pixels) of the first levels of the pyramid.
+# The variance of the blur of a level (in pixels of the image) is the variance of the previous level plus the variance
+# of the Gaussian that smooths the previous level (PYRAMID_SIGMA pixels of the previous level), and the Sobel masks
+# add SOBEL_VARIANCE level pixels^2.
+def get_derivative_scales(levels):
+    derivative_scales = []
+    blur_variance = PYRAMID_SIGMA ** 2  # The first level is the image smoothed by PYRAMID_SIGMA.
+    for level in range(levels):
+        if level > 0:
+            blur_variance += (PYRAMID_SIGMA * 2 ** (level - 1)) ** 2
+        derivative_scales.append(np.sqrt(blur_variance / 4 ** level + SOBEL_VARIANCE))
+    return derivative_scales
+
+
+# This function returns the corners of img at the scales sigmas (the sigmas of the Gaussian window of
+# my_corner_harris, in pixels of the image) as an array with a row (row, col, sigma, response) for each corner.
+# The rows and the columns are in pixels of the image, and the corners are sorted from the strongest to the weakest.
+# The responses are scale-normalized (see above).
+# rel_threshold, neighborhood_size and border are like in my_corner_peaks (border and neighborhood_size
+# in pixels of the level of each scale), and at most max_corners corners are returned (if it is given).
+def my_corner_harris_multiscale(img, k, sigmas, rel_threshold, min_level_sigma=1.0, neighborhood_size=3, border=1,
+                                max_corners=None):
+    sigmas = sorted(sigmas)
+    if not sigmas:
+        raise ValueError("At least one sigma must be given")
+    levels = get_pyramid_levels(sigmas, min_level_sigma)
+    pyramid = get_gaussian_pyramid(img, max(levels) + 1)
+    derivative_scales = get_derivative_scales(len(pyramid))
+
+    # The response of each scale (in pixels of its level).
+    responses = []
+    workspace = HarrisWorkspace()
+    for level, level_img in enumerate(pyramid):
+        level_sigmas = [sigma for sigma, sigma_level in zip(sigmas, levels) if sigma_level == level]
+        if not level_sigmas:
+            continue
+        buffers = workspace.get_buffers(level_img.shape)
+        products = get_gradient_products(level_img, buffers)
+        products *= (derivative_scales[level] / 8) ** 2  # The scale normalization.
+        if len(level_sigmas) > 1:
+            products = products.copy()  # The products are kept for the next sigmas of the level.
+        for sigma in level_sigmas:
+            level_sigma = sigma / 2**level
+            response = get_response_of_gradient_products(products, k, level_sigma, buffers)
+            responses.append(response * (level_sigma / derivative_scales[level]) ** 2)  # A new array (a copy).
+
+    threshold = max(response.max() for response in responses) * rel_threshold
+
+    corners = []
+    for scale, (sigma, level, response) in enumerate(zip(sigmas, levels, responses)):
+        rows, cols = response.shape
+        local_max = get_local_maxima(response, neighborhood_size)
+        if border > 0:
+            local_max[:border, :] = False
+            local_max[rows - border:, :] = False
+            local_max[:, :border] = False
+            local_max[:, cols - border:] = False
+        corner_rows, corner_cols = np.nonzero(local_max & (response > threshold))
+        scores = response[corner_rows, corner_cols]
+
+        # The positions of the corners in pixels of the image.
+        corner_rows, corner_cols = corner_rows * 2**level, corner_cols * 2**level
+
+        # The corners must be at least as strong as the same points at the previous and the next scale.
+        stronger = np.ones(len(scores), dtype=bool)
+        for other_scale in (scale - 1, scale + 1):
+            if 0 <= other_scale < len(sigmas):
+                other_level, other_response = levels[other_scale], responses[other_scale]
+                other_rows = np.minimum(corner_rows // 2**other_level, other_response.shape[0] - 1)
+                other_cols = np.minimum(corner_cols // 2**other_level, other_response.shape[1] - 1)
+                stronger &= scores >= other_response[other_rows, other_cols]
+
+        corners.append(np.column_stack((corner_rows[stronger], corner_cols[stronger],
+                                        np.full(np.count_nonzero(stronger), sigma), scores[stronger])))
+
+    corners = np.concatenate(corners)
+    # Sort the corners from the strongest to the weakest (equal responses by scale, row and column).
+    order = np.lexsort((corners[:, 1], corners[:, 0], corners[:, 2], -corners[:, 3]))
+    return corners[order][:max_corners]
@@ -1,11 +1,516 @@
 import numpy as np
 from scipy.ndimage import maximum_filter
+from scipy.ndimage import sobel
+from scipy.special import gammaincinv
+from scipy.stats import poisson
 
 
 # img_binary : img_binary is the binary image. All its pixels are black except for those that correspond to edges,
 # which are white.
 
-def my_hough_transform(img_binary, d_rho, d_theta, n):
+# The votes of the edge pixels are calculated in chunks of about this many votes (pixels * thetas),
+# so that the temporary arrays stay small even for dense edge maps.
+VOTES_PER_CHUNK = 2 ** 22
+
+# The votes of a chunk are counted for blocks of thetas of about this many cells (rhos * thetas) of the accumulator.
+CELLS_PER_BLOCK = 2 ** 20
+
+
+# This function returns the smallest unsigned integer type that can hold max_votes votes in a cell of the accumulator.
+# (A cell gets at most one vote from each edge pixel, so max_votes is the number of edge pixels.)
+def get_accumulator_dtype(max_votes):
+    for dtype in (np.uint16, np.uint32):
+        if max_votes <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+# This function adds the votes of the cells flat_cells (flat indices, with repetitions) to the flat accumulator votes
+# (or removes them, if subtract is True).
+# The votes are counted with np.bincount only over the range of the cells that appear, so the temporary array of
+# the counts is small when the cells are close to each other (e.g. the cells of a block of thetas).
+def add_votes(votes, flat_cells, subtract=False):
+    if flat_cells.size == 0:
+        return
+    first_cell = flat_cells.min()
+    counts = np.bincount(flat_cells - first_cell)
+    votes_of_cells = votes[first_cell:first_cell + len(counts)]
+    if subtract:
+        np.subtract(votes_of_cells, counts, out=votes_of_cells, casting='unsafe')
+    else:
+        np.add(votes_of_cells, counts, out=votes_of_cells, casting='unsafe')
+
+
+# This function returns, for every value r, the index of the value of rhos that is closest to r,
+# exactly like np.argmin(np.abs(rhos - r)) (so if r is in the middle of two values, the first one is chosen).
+# rhos is the array np.arange(-rho_max, rho_max + 1, d_rho), so r is between the values lower and lower + 1,
+# where lower = floor((r + rho_max) / d_rho), and only these two values are compared instead of all the values of rhos.
+# (If the division is rounded to the next integer, lower is one less or one more, but it is still one of the two
+# values that are closest to r.)
+def quantize_rhos(r, rhos, rho_max, d_rho):
+    lower = np.floor((r + rho_max) / d_rho).astype(np.intp)
+    np.clip(lower, 0, len(rhos) - 1, out=lower)
+    upper = np.minimum(lower + 1, len(rhos) - 1)
+
+    # Only a strictly closer value replaces the lower one, so the first of two equal distances is kept.
+    closer = np.abs(np.take(rhos, upper) - r) < np.abs(np.take(rhos, lower) - r)
+    return np.where(closer, upper, lower)
+
+
+# This function calculates the votes of all the edge pixels of img_binary for the lines (rhos[i], t_rad[j]).
+# It returns an array of shape (len(rhos), len(t_rad)) with the number of votes of each line,
+# whose type is the smallest unsigned integer type that can hold the votes (get_accumulator_dtype).
+# The votes are kept with the thetas in the first axis (see vote_edge_pixels),
+# and the returned array is its transpose (a view, it is not copied).
+def vote_hough_accumulator(img_binary, rhos, t_rad, rho_max, d_rho):
+    n2, n1 = np.nonzero(img_binary)  # The coordinates of the edge pixels.
+
+    votes = np.zeros((len(t_rad), len(rhos)), dtype=get_accumulator_dtype(len(n1)))
+    vote_edge_pixels(votes, n1, n2, rhos, t_rad, rho_max, d_rho)
+
+    return votes.T
+
+
+# This function adds the votes of the edge pixels (n1, n2) for all the thetas to the accumulator votes
+# (or removes them, if subtract is True). votes has the thetas in the first axis,
+# i.e. the shape (len(t_rad), len(rhos)), so the votes of a block of thetas are counted in a contiguous part of it.
+# The values r of all the pixels for all the thetas of a block are calculated together with the tables of cos and sin
+# of the thetas, and all their votes are counted with np.bincount.
+def vote_edge_pixels(votes, n1, n2, rhos, t_rad, rho_max, d_rho, subtract=False):
+    cos_t = np.cos(t_rad)
+    sin_t = np.sin(t_rad)
+
+    n1 = n1[:, np.newaxis]
+    n2 = n2[:, np.newaxis]
+
+    thetas_per_block = max(1, CELLS_PER_BLOCK // len(rhos))
+    pixels_per_chunk = max(1, VOTES_PER_CHUNK // min(thetas_per_block, max(len(t_rad), 1)))
+
+    for block_start in range(0, len(t_rad), thetas_per_block):
+        theta_index = np.arange(block_start, min(block_start + thetas_per_block, len(t_rad)))
+        for start in range(0, len(n1), pixels_per_chunk):
+            chunk_n1 = n1[start:start + pixels_per_chunk]
+            chunk_n2 = n2[start:start + pixels_per_chunk]
+            r = chunk_n1 * cos_t[theta_index] + chunk_n2 * sin_t[theta_index]
+            i = quantize_rhos(r, rhos, rho_max, d_rho)
+            # The vote of the line (i, j) is counted in the flat index j * len(rhos) + i of the accumulator.
+            add_votes(votes.reshape(-1), (theta_index * len(rhos) + i).ravel(), subtract)
+
+
+# This function returns the direction of the gradient of an image at every pixel (in radians),
+# calculated with the Sobel masks. Like theta, it is measured from the n1 axis (columns) towards the n2 axis (rows),
+# so at an edge pixel it is the direction of the normal of the line that the pixel is on.
+def get_gradient_angles(img):
+    img = np.asarray(img, dtype=np.float64)
+    gradient_n1 = sobel(img, axis=1)  # The partial derivative along the columns.
+    gradient_n2 = sobel(img, axis=0)  # The partial derivative along the rows.
+    return np.arctan2(gradient_n2, gradient_n1)
+
+
+# This function calculates the votes of the edge pixels of img_binary like vote_hough_accumulator,
+# but every pixel votes only for the thetas that are at most delta_theta (in radians) away from the normal
+# of its line, i.e. the direction of its gradient gradient_angles[n2, n1] (or the opposite direction,
+# since theta and theta + pi describe the same line). The votes that are counted are exactly the same as
+# the votes of vote_hough_accumulator for these thetas, but there are about 2 * delta_theta / d_theta of them
+# for every pixel instead of len(t_rad).
+def vote_hough_accumulator_near_gradients(img_binary, rhos, t_rad, rho_max, d_rho, gradient_angles, delta_theta):
+    cos_t = np.cos(t_rad)
+    sin_t = np.sin(t_rad)
+
+    n2, n1 = np.nonzero(img_binary)  # The coordinates of the edge pixels.
+    # The direction of the normal, in [-pi / 2, pi / 2) (the opposite direction describes the same line).
+    normal_angles = np.mod(gradient_angles[n2, n1] + np.pi / 2, np.pi) - np.pi / 2
+
+    # The pixels are sorted by the direction of their normal, so the votes of a chunk of pixels are in a few
+    # neighbouring thetas (and in a small part of the accumulator, which has the thetas in the first axis).
+    order = np.argsort(normal_angles, kind='stable')
+    n1, n2, normal_angles = n1[order], n2[order], normal_angles[order]
+
+    votes = np.zeros((len(t_rad), len(rhos)), dtype=get_accumulator_dtype(len(n1)))
+
+    # The thetas are (almost) equally spaced, so the thetas near an angle are found around its index in t_rad
+    # and the ones that are not close enough are removed. The normal, the normal - pi and the normal + pi
+    # are all checked, so that the windows that continue beyond -90 or 90 degrees are found at the other end.
+    theta_step = (t_rad[-1] - t_rad[0]) / max(len(t_rad) - 1, 1) if len(t_rad) > 1 else np.pi
+    offsets = np.arange(-int(np.ceil(delta_theta / theta_step)) - 1, int(np.ceil(delta_theta / theta_step)) + 2)
+    turns = np.array([-np.pi, 0, np.pi])
+    pixels_per_chunk = max(1, VOTES_PER_CHUNK // (len(turns) * len(offsets)))
+
+    for start in range(0, len(n1), pixels_per_chunk):
+        centers = normal_angles[start:start + pixels_per_chunk, np.newaxis] + turns
+        j = np.round((centers - t_rad[0]) / theta_step).astype(np.intp)[:, :, np.newaxis] + offsets
+        in_window = (j >= 0) & (j < len(t_rad))
+        np.clip(j, 0, len(t_rad) - 1, out=j)
+        in_window &= np.abs(t_rad[j] - centers[:, :, np.newaxis]) <= delta_theta
+
+        pixel = np.nonzero(in_window)[0] + start  # The edge pixel of each vote.
+        j = j[in_window]
+        r = n1[pixel] * cos_t[j] + n2[pixel] * sin_t[j]
+        i = quantize_rhos(r, rhos, rho_max, d_rho)
+        add_votes(votes.reshape(-1), j * len(rhos) + i)
+
+    return votes.T
+
+
+# This function finds the n strongest local maxima of H (the cells that are equal to the maximum of their 3x3
+# neighbourhood and have at least one vote), from the strongest to the weakest (equal cells in the order of H).
+# A cell is skipped if it is less than min_rho_distance (in the units of rhos) and less than min_theta_distance
+# (in radians) away from a cell that was already chosen (see are_near_lines, which also compares the lines
+# near theta = -90 and +90 degrees). With the default distances of 0, no cell is skipped.
+# It returns the list of the cells (i, j) of the peaks and an array with their votes (their strengths).
+def find_hough_peaks(H, rhos, t_rad, n, min_rho_distance=0, min_theta_distance=0):
+    local_max_binary = (H == maximum_filter(H, size=(3, 3)))
+    rows, cols = np.nonzero(local_max_binary & (H > 0))  # The cells of the local maxima, in the order of H.
+    return select_hough_peaks(rows, cols, H[rows, cols], rhos, t_rad, n, min_rho_distance, min_theta_distance)
+
+
+# This function chooses the n strongest of the candidate cells (rows[k], cols[k]) with candidate_votes[k] votes,
+# like find_hough_peaks (equal cells are chosen in the order of the accumulator, i.e. by row and then by column).
+# The candidates are not sorted all together. Only the strongest of them are sorted (after a partial sort
+# with np.partition), and more of them are sorted only if too many are skipped because of the minimum distances.
+def select_hough_peaks(rows, cols, candidate_votes, rhos, t_rad, n, min_rho_distance=0, min_theta_distance=0):
+    # The position of each candidate in the order of the accumulator.
+    candidate_order = rows.astype(np.int64) * len(t_rad) + cols
+    # The votes as signed integers, so that they can be negated for the sorting.
+    signed_votes = candidate_votes.astype(np.int64)
+
+    max_cells = []
+    strengths = []
+    checked = 0  # The number of the strongest candidates that were already checked.
+    sorted_count = n
+
+    while len(max_cells) < n and checked < len(candidate_votes):
+        # I sort the sorted_count strongest candidates (and the ones that are equal to the weakest of them).
+        # The order of all the candidates is (votes from the largest, order in the accumulator),
+        # so the ones that were already checked are again in the beginning.
+        sorted_count = min(max(sorted_count, 1), len(candidate_votes))
+        min_votes = -np.partition(-signed_votes, sorted_count - 1)[sorted_count - 1]
+        strongest = np.flatnonzero(signed_votes >= min_votes)
+        strongest = strongest[np.lexsort((candidate_order[strongest], -signed_votes[strongest]))]
+
+        for candidate in strongest[checked:]:
+            checked += 1
+            i, j = int(rows[candidate]), int(cols[candidate])
+            if any(are_near_lines(rhos[i], t_rad[j], rhos[row], t_rad[col], min_rho_distance, min_theta_distance)
+                   for row, col in max_cells):
+                continue  # It is too close to a stronger peak.
+            max_cells.append((i, j))
+            strengths.append(candidate_votes[candidate])
+            if len(max_cells) == n:
+                break
+
+        # If too many candidates were skipped, I sort more of them.
+        sorted_count *= 4
+
+    return max_cells, np.array(strengths, dtype=candidate_votes.dtype)
+
+
+# This function returns True if the lines (rho_a, theta_a) and (rho_b, theta_b) are less than min_rho_distance
+# and less than min_theta_distance apart. The line (rho, theta) is also the line (-rho, theta + pi) (or theta - pi),
+# so a line at theta near -90 degrees is also compared with the lines at theta near +90 degrees, with negated rho.
+def are_near_lines(rho_a, theta_a, rho_b, theta_b, min_rho_distance, min_theta_distance):
+    theta_distance = abs(theta_a - theta_b)
+    if abs(rho_a - rho_b) < min_rho_distance and theta_distance < min_theta_distance:
+        return True
+    return abs(rho_a + rho_b) < min_rho_distance and abs(theta_distance - np.pi) < min_theta_distance
+
+
+# gradient_angles, gradient_img, delta_theta : If delta_theta (in radians) is given, every edge pixel votes only
+# for the thetas within delta_theta of the direction of its gradient (vote_hough_accumulator_near_gradients).
+# The directions are given in gradient_angles (an array with the shape of img_binary), or they are calculated
+# with the Sobel masks from gradient_img (e.g. the smoothed image from which the edges were found).
+# If delta_theta is None, every edge pixel votes for all the thetas.
+# min_rho_distance, min_theta_distance : The minimum distance between two of the n lines, in rho (in pixels)
+# or in theta (in radians). A weaker local maximum that is closer than both distances to a stronger one is skipped
+# (also across theta = +-90 degrees, where (rho, theta) and (-rho, theta -+ pi) are the same line).
+# return_strengths : If it is True, the number of votes of each line of L is also returned (after res).
+def my_hough_transform(img_binary, d_rho, d_theta, n, gradient_angles=None, gradient_img=None, delta_theta=None,
+                       min_rho_distance=0, min_theta_distance=0, return_strengths=False):
+    N2, N1 = img_binary.shape  # Get the dimensions of the binary image
+
+    # The variable res represents the number of points in the input image that do not belong to the n detected lines.
+    # I initialize the variable res to be equal to the total number of pixels in the image.
+    # Then, I will find the n lines in the image and count the number of pixels that lie on these lines.
+    # Finally, I will subtract the number of pixels on the detected lines from the total pixels in the image,
+    # and thus find the final value of res.
+    res = N1 * N2
+
+    rho_max = round(np.sqrt(N1**2 + N2**2))  # Max possible distance from origin
+
+    thetas = np.arange(-90, 90 + 1, d_theta * 180 / np.pi)  # Range of theta (in degrees)
+
+    t_rad = np.deg2rad(thetas)  # I convert the values of thetas array from degrees to radians
+
+    rhos = np.arange(-rho_max, rho_max + 1, d_rho)  # Range of rhos values
+
+    # I initialize the RxT matrix H , where R is the length of the rhos array and T is the length of the thetas array.
+    # Each cell of the matrix H, initially contains 0 votes.
+    # The votes are small integers, so H has the smallest unsigned integer type that can hold them (uint16 or uint32).
+    # Each pair (rhos[i],thetas[i]) represents a line. Each cell of the matrix H represents a line.
+    #  Each pixel of the image will vote the cells of the H array representing the lines it is on.
+    # Apply the Hough Transform. Every white pixel (edge) votes for the cell (i, j) of each theta,
+    # where rhos[i] is the value closest to r = n1 * cos(t_rad[j]) + n2 * sin(t_rad[j]).
+    if delta_theta is None or delta_theta >= np.pi / 2:
+        # (A window of pi / 2 or more around the normal contains all the thetas.)
+        H = vote_hough_accumulator(img_binary, rhos, t_rad, rho_max, d_rho)
+    else:
+        if gradient_angles is None:
+            if gradient_img is None:
+                raise ValueError("gradient_angles or gradient_img must be given together with delta_theta")
+            gradient_angles = get_gradient_angles(gradient_img)
+        H = vote_hough_accumulator_near_gradients(img_binary, rhos, t_rad, rho_max, d_rho, gradient_angles,
+                                                  delta_theta)
+
+    # Local Maxima : The cells of the H array that will gather the most votes represent the local maxima.
+    # A cell is a local maximum if it is equal to the maximum value in its 3x3 neighborhood.
+    # Find the n highest local maxima and their indices. In other words, I want to find the n strongest lines.
+    max_cells, strengths = find_hough_peaks(H, rhos, t_rad, n, min_rho_distance, min_theta_distance)
+
+    # count is the number of pixels that lie on the lines corresponding to the most voted cells.
+    count = int(np.sum(strengths, dtype=np.int64))
+
+    # Construct the L matrix with the parameters rho and theta of the n strongest lines.
+    L = []
+    for row, col in max_cells:
+        rho = rhos[row]
+        theta = t_rad[col]
+        L.append([rho, theta])
+
+    L = np.array(L)
+
+    # Calculate the remaining pixels not belonging to edges.
+    res -= count
+
+    if return_strengths:
+        return H, L, res, strengths
+    return H, L, res
+
+
+# This function returns the limits of the significance test of my_progressive_probabilistic_hough_transform:
+# v votes of a cell are significant (poisson.sf(v - 1, mu) * cells < significance) when mu, the expected votes
+# of the cell, is less than mu_limits[v - 1]. poisson.sf(v - 1, mu) is the regularized incomplete gamma function
+# P(v, mu), which increases with mu, so the limit of v votes is its inverse at significance / cells.
+# The limits are calculated for all the numbers of votes that are needed for the expected votes up to max_mu.
+# They are raised by a relative tolerance, so that they are never smaller than the exact limits.
+def get_significance_limits(max_mu, cells, significance, tolerance=1e-9):
+    votes = int(max_mu + 10 * np.sqrt(max_mu)) + 16
+    while True:
+        mu_limits = gammaincinv(np.arange(1, votes + 1), significance / cells) * (1 + tolerance)
+        if mu_limits[-1] > max_mu:
+            return mu_limits
+        votes *= 2
+
+
+# This function is a progressive probabilistic version of my_hough_transform, for dense edge maps
+# where only the n strongest lines are needed. The edge pixels vote one by one, in random order:
+#   1. After every vote, I check the cells that the pixel voted for. If the votes of a cell are too many to be
+#      explained by random pixels (their probability under a Poisson distribution, multiplied by the number of
+#      cells, is less than significance), the cell is accepted as a line (the cell with the smallest probability).
+#      The smallest significant number of votes of every theta is found in the limits of get_significance_limits,
+#      which are calculated once, and the probabilities are calculated only when a cell reaches it.
+#   2. The pixels of the line (the pixels of the pool that vote for the same cell) are sorted along the line,
+#      and the segment is the run of pixels around the last pixel with gaps of at most line_gap pixels.
+#      The pixels of the segment are removed from the pool, and their votes are removed from H.
+#      The segment is kept as a line if it is at least min_line_length pixels long.
+# It stops when n lines are found, when max_votes pixels have voted (by default all of them) or when the pool is empty.
+# It returns H, L and res like my_hough_transform. H contains the votes of the pixels that voted and were not removed.
+# Each row of L is [rho, theta, n1_start, n2_start, n1_end, n2_end], where (n1, n2) are the coordinates
+# of the end pixels of the segment (so L[:, :2] are the parameters of the lines, like in my_hough_transform).
+# res is the number of pixels of the image that are not on the segments of the lines.
+def my_progressive_probabilistic_hough_transform(img_binary, d_rho, d_theta, n, significance=1e-3, max_votes=None,
+                                                 line_gap=3, min_line_length=0, seed=None):
+    N2, N1 = img_binary.shape  # Get the dimensions of the binary image
+    res = N1 * N2
+
+    rho_max = round(np.sqrt(N1**2 + N2**2))  # Max possible distance from origin
+    thetas = np.arange(-90, 90 + 1, d_theta * 180 / np.pi)  # Range of theta (in degrees)
+    t_rad = np.deg2rad(thetas)
+    rhos = np.arange(-rho_max, rho_max + 1, d_rho)  # Range of rhos values
+
+    cos_t = np.cos(t_rad)
+    sin_t = np.sin(t_rad)
+    theta_index = np.arange(len(t_rad))
+
+    n2, n1 = np.nonzero(img_binary)  # The coordinates of the edge pixels.
+    H = np.zeros((len(rhos), len(t_rad)), dtype=get_accumulator_dtype(len(n1)))
+    in_pool = np.ones(len(n1), dtype=bool)
+    voted = np.zeros(len(n1), dtype=bool)
+
+    # A random pixel of the image votes, for theta, for one of the rho cells that the image covers
+    # (its projection on the normal of theta has length N1 * |cos(theta)| + N2 * |sin(theta)|).
+    cell_probability = d_rho / (N1 * np.abs(cos_t) + N2 * np.abs(sin_t) + d_rho)
+
+    if max_votes is None:
+        max_votes = len(n1)
+    votes_cast = 0
+    pixels_in_H = 0
+    mu_limits = get_significance_limits(min(max_votes, len(n1)) * np.max(cell_probability, initial=0), H.size,
+                                        significance)
+
+    lines = []
+    count = 0  # count is the number of pixels that lie on the segments of the lines.
+
+    for pixel in np.random.default_rng(seed).permutation(len(n1)):
+        if len(lines) >= n or votes_cast >= max_votes:
+            break
+        if not in_pool[pixel]:
+            continue
+
+        # 1. The pixel votes for all the thetas.
+        i = quantize_rhos(n1[pixel] * cos_t + n2[pixel] * sin_t, rhos, rho_max, d_rho)
+        H[i, theta_index] += 1
+        voted[pixel] = True
+        votes_cast += 1
+        pixels_in_H += 1
+
+        cell_votes = H[i, theta_index]
+        expected_votes = pixels_in_H * cell_probability
+        if not np.any(cell_votes > np.searchsorted(mu_limits, expected_votes, side='right')):
+            continue
+        p_values = poisson.sf(cell_votes - 1, expected_votes) * H.size
+        j = np.argmin(p_values)
+        if p_values[j] >= significance:
+            continue
+
+        # 2. The pixels of the pool on the line (rhos[i[j]], t_rad[j]), sorted along the line.
+        pool = np.flatnonzero(in_pool)
+        on_line = pool[quantize_rhos(n1[pool] * cos_t[j] + n2[pool] * sin_t[j], rhos, rho_max, d_rho) == i[j]]
+        position = n2[on_line] * cos_t[j] - n1[on_line] * sin_t[j]
+        order = np.argsort(position, kind='stable')
+        on_line = on_line[order]
+        position = position[order]
+
+        # The segment ends where the distance between two consecutive pixels is more than line_gap missing pixels.
+        k = np.flatnonzero(on_line == pixel)[0]
+        gaps = np.flatnonzero(np.diff(position) > line_gap + 1)
+        start = gaps[gaps < k][-1] + 1 if np.any(gaps < k) else 0
+        end = gaps[gaps >= k][0] if np.any(gaps >= k) else len(on_line) - 1
+        segment = on_line[start:end + 1]
+
+        in_pool[segment] = False
+        removed_votes = segment[voted[segment]]
+        if len(removed_votes) > 0:
+            r = n1[removed_votes, np.newaxis] * cos_t + n2[removed_votes, np.newaxis] * sin_t
+            flat_cells = (quantize_rhos(r, rhos, rho_max, d_rho) * len(t_rad) + theta_index).ravel()
+            # Only the cells of the removed votes are changed (a dense np.bincount would cost H.size for every line).
+            np.subtract.at(H.reshape(-1), flat_cells, 1)
+            pixels_in_H -= len(removed_votes)
+
+        if position[end] - position[start] + 1 >= min_line_length:
+            first, last = segment[0], segment[-1]
+            lines.append([rhos[i[j]], t_rad[j], n1[first], n2[first], n1[last], n2[last]])
+            count += len(segment)
+
+    L = np.array(lines)
+
+    # Calculate the remaining pixels, which are not on the segments of the lines.
+    res -= count
+
+    return H, L, res
+
+
+# This function calculates the votes of the edge pixels (n1, n2) only for the cells rho_range[0] <= i < rho_range[1]
+# and theta_range[0] <= j < theta_range[1] of the accumulator of rhos and t_rad.
+# The votes are exactly the same as the votes of these cells in vote_hough_accumulator.
+def vote_hough_window(n1, n2, rhos, t_rad, rho_max, d_rho, rho_range, theta_range):
+    theta_index = np.arange(theta_range[0], theta_range[1])
+    cos_t = np.cos(t_rad)[theta_index]
+    sin_t = np.sin(t_rad)[theta_index]
+
+    window_shape = (rho_range[1] - rho_range[0], len(theta_index))
+    votes = np.zeros(window_shape, dtype=get_accumulator_dtype(len(n1)))
+    pixels_per_chunk = max(1, VOTES_PER_CHUNK // max(len(theta_index), 1))
+
+    for start in range(0, len(n1), pixels_per_chunk):
+        chunk_n1 = n1[start:start + pixels_per_chunk, np.newaxis]
+        chunk_n2 = n2[start:start + pixels_per_chunk, np.newaxis]
+        r = chunk_n1 * cos_t + chunk_n2 * sin_t
+        i = quantize_rhos(r, rhos, rho_max, d_rho)
+        in_window = (i >= rho_range[0]) & (i < rho_range[1])
+        cells = (i - rho_range[0]) * len(theta_index) + np.arange(len(theta_index))
+        add_votes(votes.reshape(-1), cells[in_window])
+
+    return votes
+
+
+# This function is a coarse-to-fine version of my_hough_transform, which never allocates the accumulator
+# of d_rho and d_theta (only the accumulator of a coarse_factor times coarser grid and a few small windows of it):
+#   1. The edge pixels vote in the coarse accumulator H (with coarse_factor * d_rho and coarse_factor * d_theta),
+#      and its candidates strongest local maxima (by default 2 * n) are found.
+#   2. Around each coarse peak, the pixels vote again in the fine cells that are at most one coarse cell away
+#      (and one more fine cell around them, so that their 3x3 local maxima are the same as in the fine accumulator).
+#      A change of theta by coarse_d_theta moves the rho of a pixel by up to coarse_d_theta * rho_max,
+#      so the window is wider by this much in rho.
+#   3. The n strongest fine local maxima of all the windows are the lines.
+# The lines are the same as the lines of my_hough_transform, as long as each of them is near one of the coarse peaks.
+# It returns H (the coarse accumulator), L and res like my_hough_transform (L and res from the fine votes).
+def my_coarse_to_fine_hough_transform(img_binary, d_rho, d_theta, n, coarse_factor=4, candidates=None,
+                                      min_rho_distance=0, min_theta_distance=0, return_strengths=False):
+    N2, N1 = img_binary.shape  # Get the dimensions of the binary image
+    res = N1 * N2
+
+    rho_max = round(np.sqrt(N1**2 + N2**2))  # Max possible distance from origin
+    t_rad = np.deg2rad(np.arange(-90, 90 + 1, d_theta * 180 / np.pi))  # The fine thetas (in radians)
+    rhos = np.arange(-rho_max, rho_max + 1, d_rho)  # The fine rhos
+
+    # 1. The coarse accumulator and its peaks.
+    coarse_d_rho = coarse_factor * d_rho
+    coarse_d_theta = coarse_factor * d_theta
+    coarse_t_rad = np.deg2rad(np.arange(-90, 90 + 1, coarse_d_theta * 180 / np.pi))
+    coarse_rhos = np.arange(-rho_max, rho_max + 1, coarse_d_rho)
+    H = vote_hough_accumulator(img_binary, coarse_rhos, coarse_t_rad, rho_max, coarse_d_rho)
+
+    if candidates is None:
+        candidates = 2 * n
+    coarse_cells = find_hough_peaks(H, coarse_rhos, coarse_t_rad, candidates)[0]
+
+    # 2. The fine local maxima in the windows around the coarse peaks.
+    n2, n1 = np.nonzero(img_binary)  # The coordinates of the edge pixels.
+    rows, cols, votes = [], [], []
+    rho_margin = coarse_d_rho + coarse_d_theta * rho_max
+    for i, j in coarse_cells:
+        rho_start = np.searchsorted(rhos, coarse_rhos[i] - rho_margin, side='left')
+        rho_end = np.searchsorted(rhos, coarse_rhos[i] + rho_margin, side='right')
+        theta_start = np.searchsorted(t_rad, coarse_t_rad[j] - coarse_d_theta, side='left')
+        theta_end = np.searchsorted(t_rad, coarse_t_rad[j] + coarse_d_theta, side='right')
+
+        # The window with one more fine cell on each side (except at the borders of the accumulator).
+        rho_range = (max(rho_start - 1, 0), min(rho_end + 1, len(rhos)))
+        theta_range = (max(theta_start - 1, 0), min(theta_end + 1, len(t_rad)))
+        window = vote_hough_window(n1, n2, rhos, t_rad, rho_max, d_rho, rho_range, theta_range)
+
+        local_max_binary = (window == maximum_filter(window, size=(3, 3))) & (window > 0)
+        inner = (slice(rho_start - rho_range[0], rho_end - rho_range[0]),
+                 slice(theta_start - theta_range[0], theta_end - theta_range[0]))
+        window_rows, window_cols = np.nonzero(local_max_binary[inner])
+        rows.append(window_rows + rho_start)
+        cols.append(window_cols + theta_start)
+        votes.append(window[inner][window_rows, window_cols])
+
+    # The windows may overlap, so every fine cell is kept once.
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+    votes = np.concatenate(votes) if votes else np.zeros(0, dtype=H.dtype)
+    first = np.unique(rows.astype(np.int64) * len(t_rad) + cols, return_index=True)[1]
+
+    # 3. The n strongest fine local maxima.
+    max_cells, strengths = select_hough_peaks(rows[first], cols[first], votes[first], rhos, t_rad, n,
+                                              min_rho_distance, min_theta_distance)
+    count = int(np.sum(strengths, dtype=np.int64))
+
+    L = np.array([[rhos[row], t_rad[col]] for row, col in max_cells])
+
+    # Calculate the remaining pixels not belonging to edges.
+    res -= count
+
+    if return_strengths:
+        return H, L, res, strengths
+    return H, L, res
+
+
+# This is the first version of my_hough_transform, with loops over the pixels, the thetas and the cells of H.
+# I keep it to check and benchmark the new version (its H has the type float64, with the same votes).
+def my_hough_transform_with_loops(img_binary, d_rho, d_theta, n):
     N2, N1 = img_binary.shape  # Get the dimensions of the binary image
 
     # The variable res represents the number of points in the input image that do not belong to the n detected lines.
@@ -83,4 +588,3 @@ def my_hough_transform(img_binary, d_rho, d_theta, n):
     res -= count
 
     return H, L, res
-
@@ -1,7 +1,384 @@
 import numpy as np
 
+# The output rows are calculated in blocks of about this many pixels, so that the coordinates, the weights and the
+# interpolated values of the whole output image are not kept at once.
+PIXELS_PER_BLOCK = 2**18
 
-def my_img_rotation(img, angle):
+# The interpolations of my_img_rotation:
+#   'average'  : The average of the 4 neighbors (up, down, left, right) of the nearest pixel, like the first version.
+#   'nearest'  : The nearest pixel.
+#   'bilinear' : The bilinear interpolation of the 4 nearest pixels (2 x 2).
+#   'bicubic'  : The bicubic (Keys, a = -0.5) interpolation of the 16 nearest pixels (4 x 4).
+INTERPOLATIONS = ('average', 'nearest', 'bilinear', 'bicubic')
+
+
+# This function rotates img by angle (in radians) around its center and returns the rotated image,
+# which is large enough for the whole rotated input image (a 3-D array, also for a grayscale image).
+# With interpolation='average' it returns the same pixels as my_img_rotation_with_loops (as uint8).
+# The other interpolations return an image with the same type as img.
+# The image is not converted to float64: the values are gathered in the type of img, and they are interpolated
+# in float32 (for images of 8 or 16 bits) with float32 weights, so e.g. a block of uint8 RGB pixels needs
+# 12 bytes for each output pixel instead of 24. The nearest pixel is copied without any conversion.
+# If out is given (an array with the shape get_rotated_shape(img.shape, angle) + (channels,) and the type of
+# the output), the rotated image is written in it, so that the same array can be used for many rotations.
+# It works without loops over the pixels:
+#   1. The rotation is affine, so the coordinates of the rotated pixels have their minimum and maximum at the
+#      4 corners of the image. Only the corners are rotated to find the size of the output image.
+#   2. The coordinates (in the input image) of all the pixels of a block of output rows are calculated together,
+#      with broadcasting, and all the channels of the neighbors of these pixels are gathered together.
+# If plan_cache (a RotationPlanCache of rotation_plan) is given, the coordinates and the weights are taken
+# from the plan of the shape of img, angle and interpolation in the cache (and the plan is stored in it, if it is new),
+# so a repeated rotation only gathers and interpolates the pixels. If the plan is too large for the cache,
+# the image is rotated without a plan.
+def my_img_rotation(img, angle, interpolation='average', out=None, plan_cache=None):
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError("interpolation must be one of %s, not %r" % (', '.join(INTERPOLATIONS), interpolation))
+    if plan_cache is not None:
+        plan = plan_cache.get_plan(img.shape, angle, interpolation)
+        if plan is not None:
+            return plan.rotate(img, out)
+    dims = img.shape  # Take the dimensions of the input image.
+
+    # The function should work independently of the number of channels in the input image.
+    if len(dims) == 2:
+        img = img[:, :, np.newaxis]  # So its shape will be (img.shape[0], img.shape[1], 1).
+    channels = img.shape[2]
+
+    rot_shape = get_rotated_shape(dims, angle) + (channels,)
+    rot_dtype = np.dtype(np.uint8) if interpolation == 'average' else img.dtype
+    rot_img = get_rotated_img_array(rot_shape, rot_dtype, out)
+
+    # The pixels of the input image, one row for each pixel (with the channels in the columns).
+    img_pixels = img.reshape(-1, channels)
+    working_dtype = np.result_type(img.dtype, np.float32)
+
+    rows_per_block = max(1, PIXELS_PER_BLOCK // rot_shape[1])
+    for row_start in range(0, rot_shape[0], rows_per_block):
+        row_end = min(row_start + rows_per_block, rot_shape[0])
+        x, y = get_source_coordinates(row_start, row_end, rot_shape, dims, angle)
+        inside, taps = get_interpolation_taps(x, y, dims, interpolation)
+
+        # Only the pixels with source coordinates in the input image get a value (the others are 0).
+        rot_block = rot_img[row_start:row_end]
+        rot_block[~inside] = 0
+        rot_block[inside] = interpolate_pixels(img_pixels, taps, working_dtype, rot_dtype, interpolation)
+
+    return rot_img
+
+
+# This function returns the array for the rotated image, with the shape rot_shape and the type rot_dtype:
+# a new array, or out, if it is given (and it has this shape and type).
+def get_rotated_img_array(rot_shape, rot_dtype, out=None):
+    if out is None:
+        return np.empty(rot_shape, dtype=rot_dtype)
+    if out.shape != rot_shape or out.dtype != rot_dtype:
+        raise ValueError("out must have the shape %s and the type %s" % (rot_shape, rot_dtype))
+    return out
+
+
+# This function returns the shape (rows, columns) of the rotated image of an image with dimensions dims.
+# It is calculated like in my_img_rotation_with_loops, but only from the 4 corners of the image.
+def get_rotated_shape(dims, angle):
+    t_rot = np.array([[np.cos(angle), -np.sin(angle), 0],
+                      [np.sin(angle), np.cos(angle), 0],
+                      [0, 0, 1]])
+    center = np.array([dims[0] / 2, dims[1] / 2])
+    t_center = np.array([[1, 0, -center[0]],
+                         [0, 1, -center[1]],
+                         [0, 0, 1]])
+
+    # The corners are rotated with the same operations as the pixels in my_img_rotation_with_loops,
+    # so the minimum and the maximum coordinates are exactly the same.
+    corners = [np.dot(t_rot, np.dot(t_center, np.array([i, j, 1]).T))
+               for i in (0, dims[0] - 1) for j in (0, dims[1] - 1)]
+    center_rot_x = [corner[0] for corner in corners]
+    center_rot_y = [corner[1] for corner in corners]
+    return int(max(center_rot_x) - min(center_rot_x)) + 1, int(max(center_rot_y) - min(center_rot_y)) + 1
+
+
+# This function returns the coordinates (x, y) of the pixels of the rows row_start to row_end of the rotated image
+# (with the shape rot_shape), rotated back and relative to the center of the input image (with dimensions dims).
+def get_source_coordinates(row_start, row_end, rot_shape, dims, angle):
+    # Transform (i, j) from the center of the output image.
+    di = np.arange(row_start, row_end)[:, np.newaxis] - (rot_shape[0] // 2)
+    dj = np.arange(rot_shape[1])[np.newaxis, :] - (rot_shape[1] // 2)
+    x = di * np.cos(angle) + dj * np.sin(angle)
+    y = -di * np.sin(angle) + dj * np.cos(angle)
+    return x, y
+
+
+# This function returns the pixels of the input image (with dimensions dims) that are needed for the interpolation
+# of the pixels with the coordinates x, y (of get_source_coordinates). It returns a boolean array, which is True
+# for the pixels that get a value, and a list of taps (flat_indices, weights), one for each neighbor:
+# the value of the k-th of these pixels is the sum of weights[k] * img_pixels[flat_indices[k]] over the taps
+# (weights is a scalar or an array, and it is None for the nearest pixel, which is copied).
+def get_interpolation_taps(x, y, dims, interpolation):
+    center = np.array([dims[0] / 2, dims[1] / 2])
+
+    if interpolation == 'average':
+        # Translate the coordinates back to the original image's coordinate system, like the first version
+        # (np.round rounds halves to even, like round, and astype truncates, like int).
+        x = (np.round(x) + center[0]).astype(np.intp)
+        y = (np.round(y) + center[1]).astype(np.intp)
+
+        # Only the pixels whose 4 neighbors are in the input image get a value.
+        # The average of the 4 neighbors is the sum of their quarters (which is exact, because 1/4 is a power of 2).
+        inside = (1 <= x) & (x < dims[0] - 1) & (1 <= y) & (y < dims[1] - 1)
+        flat_indices = x[inside] * dims[1] + y[inside]
+        return inside, [(flat_indices - dims[1], 0.25), (flat_indices + dims[1], 0.25), (flat_indices - 1, 0.25),
+                        (flat_indices + 1, 0.25)]
+
+    if interpolation == 'nearest':
+        # The nearest pixel of the (continuous) coordinates in the input image.
+        x, y = np.round(x + center[0]), np.round(y + center[1])
+        inside = (0 <= x) & (x <= dims[0] - 1) & (0 <= y) & (y <= dims[1] - 1)
+        return inside, [(x[inside].astype(np.intp) * dims[1] + y[inside].astype(np.intp), None)]
+
+    # The 2-D weights are the products of the 1-D weights of the rows and of the columns.
+    inside, row_taps, col_taps = get_separable_interpolation_taps(x, y, dims, interpolation)
+    return inside, [(rows * dims[1] + cols, row_weights * col_weights)
+                    for rows, row_weights in row_taps for cols, col_weights in col_taps]
+
+
+# This function returns the pixels that get a value (like get_interpolation_taps) for the 'bilinear' or 'bicubic'
+# interpolation, and the 1-D taps of their rows and of their columns (the taps of get_interpolation_taps are their
+# products). The pixels inside the input image get a value, and the neighbors outside it are replaced by the nearest
+# pixels of its sides.
+def get_separable_interpolation_taps(x, y, dims, interpolation):
+    # The (continuous) coordinates in the input image.
+    x = x + dims[0] / 2
+    y = y + dims[1] / 2
+    inside = (0 <= x) & (x <= dims[0] - 1) & (0 <= y) & (y <= dims[1] - 1)
+    row_taps = get_interpolation_taps_1d(x[inside], dims[0], interpolation)
+    col_taps = get_interpolation_taps_1d(y[inside], dims[1], interpolation)
+    return inside, row_taps, col_taps
+
+
+# This function returns the 1-D taps (indices, weights) of the interpolation of the coordinates p in an axis
+# of length size, with float32 weights.
+def get_interpolation_taps_1d(p, size, interpolation):
+    p0 = np.floor(p)
+    t = (p - p0).astype(np.float32)  # The distance from the previous pixel.
+    p0 = p0.astype(np.intp)
+    offsets, weights = get_interpolation_weights_1d(t, interpolation)
+    return [(np.clip(p0 + offset, 0, size - 1), weight) for offset, weight in zip(offsets, weights)]
+
+
+# This function returns the offsets of the neighbors (from the previous pixel) and their weights for the
+# 'bilinear' or 'bicubic' interpolation at the distances t (between 0 and 1) from the previous pixel.
+def get_interpolation_weights_1d(t, interpolation):
+    if interpolation == 'bilinear':
+        return (0, 1), (1 - t, t)
+
+    # The Keys cubic kernel with a = -0.5 at the distances 1 + t, t, 1 - t and 2 - t.
+    t2, t3 = t * t, t * t * t
+    return (-1, 0, 1, 2), ((-t3 + 2 * t2 - t) / 2, (3 * t3 - 5 * t2 + 2) / 2, (-3 * t3 + 4 * t2 + t) / 2,
+                           (t3 - t2) / 2)
+
+
+# This function returns the interpolated values (with the channels in the columns) of the pixels of the taps
+# of get_interpolation_taps, in the type rot_dtype. The values are summed in working_dtype, and they are converted
+# by convert_interpolated_values, except for 'average', which is truncated like in the first version.
+def interpolate_pixels(img_pixels, taps, working_dtype, rot_dtype, interpolation):
+    if interpolation == 'nearest':
+        return np.take(img_pixels, taps[0][0], axis=0)
+
+    values = None
+    for flat_indices, weights in taps:
+        neighbor_values = np.take(img_pixels, flat_indices, axis=0).astype(working_dtype)
+        neighbor_values *= weights if np.isscalar(weights) else weights[:, np.newaxis]
+        if values is None:
+            values = neighbor_values
+        else:
+            values += neighbor_values
+
+    if interpolation == 'average':
+        return values.astype(rot_dtype)
+    return convert_interpolated_values(values, rot_dtype)
+
+
+# This function converts interpolated values to the type rot_dtype. For an integer type, they are rounded
+# and clipped to its range (e.g. the overshoot of the bicubic interpolation).
+def convert_interpolated_values(values, rot_dtype):
+    if np.issubdtype(rot_dtype, np.integer):
+        info = np.iinfo(rot_dtype)
+        np.rint(values, out=values)
+        np.clip(values, info.min, info.max, out=values)
+    return values.astype(rot_dtype)
+
+
+# This function rotates img like my_img_rotation (the same output shape and the same position of every pixel),
+# but as three shears (Paeth): the rotation by theta is a shear of the columns, a shear of the rows and
+# a shear of the columns again. Each shear moves every line (column or row) of its input by a constant
+# (fractional) shift, so it is a 1-D interpolation with the same weights along each line, and it reads its input
+# in a narrow band of rows, instead of the scattered reads of my_img_rotation, which follow the rotated rows.
+#   1. The shears are exact only for angles between -45 and 45 degrees. The image is first rotated by the nearest
+#      multiple of 90 degrees (exactly, without copying: the pixels are read from img in the rotated order)
+#      and then by the remaining angle.
+#   2. The inverse mapping of the rotation, from the output pixel o (relative to the center of the output) to the
+#      pixel s of the input, is s = M o + t, with M = [[cos, sin], [-sin, cos]] = A B A, where A = [[1, a], [0, 1]]
+#      is a shear of the columns with a = tan(theta / 2) and B = [[1, 0], [b, 1]] a shear of the rows with
+#      b = -sin(theta). So the output is calculated in three passes: I1(v) = img(A v + t), I2(u) = I1(B u) and
+#      rot_img(o) = I2(A o).
+#   3. Each pass processes its output in blocks of rows, which are independent. If an executor (from
+#      concurrent.futures, e.g. a ThreadPoolExecutor) is given, the blocks of the three passes are calculated with it.
+# Every pass handles the sides of its input like my_img_rotation: a sample outside the input (at a distance of more
+# than 0 from it) is 0, and the neighbors of a sample inside it are replaced by the nearest pixels of its sides.
+# interpolation is 'nearest', 'bilinear' or 'bicubic' (for each shear). The intermediate images I1 and I2 have
+# the type of the output, which is the type of img, so the interpolated values are rounded after every pass.
+# At multiples of 90 degrees the shears are only shifts. If the dimensions of img are even, the shifts are integer,
+# and the result is the same as my_img_rotation. If a dimension is odd, the output pixels are halfway between
+# two input pixels: 'nearest' may take the other one of them (np.round rounds halves to even, also in the noise of
+# e.g. cos(pi / 2)), 'bilinear' and 'bicubic' round the result of each pass, so a value may differ by 1, and
+# a side of the image may be 0 in one of the functions and not in the other. At other angles the results are
+# close inside the image, but not the same.
+def my_img_rotation_by_shears(img, angle, interpolation='bilinear', out=None, executor=None):
+    if interpolation not in INTERPOLATIONS or interpolation == 'average':
+        raise ValueError("interpolation must be 'nearest', 'bilinear' or 'bicubic', not %r" % (interpolation,))
+    dims = img.shape
+    if len(dims) == 2:
+        img = img[:, :, np.newaxis]
+    channels = img.shape[2]
+
+    rot_shape = get_rotated_shape(dims, angle) + (channels,)
+    rot_img = get_rotated_img_array(rot_shape, img.dtype, out)
+
+    # 1. The rotation by quarters (k quarters, counterclockwise like np.rot90) and the remaining angle.
+    # A pixel s_v of the rotated view is the pixel s = P s_v + p of img, where P is the rotation matrix of the quarters
+    # (like M) and p is the pixel of img at the first pixel of the view. The view is not created: its pixels are
+    # read from img with the strides of P (in pixels of img).
+    img = np.ascontiguousarray(img)
+    quarters = int(np.round(angle / (np.pi / 2)))
+    theta = angle - quarters * np.pi / 2
+    quarters %= 4
+    c, s = (1, 0, -1, 0)[quarters], (0, 1, 0, -1)[quarters]
+    P = np.array([[c, s], [-s, c]])
+    p = np.array([(0, 0), (0, dims[1] - 1), (dims[0] - 1, dims[1] - 1), (dims[0] - 1, 0)][quarters])
+    view_shape = (dims[0], dims[1]) if quarters % 2 == 0 else (dims[1], dims[0])
+    view_strides = (P[0, 0] * dims[1] + P[1, 0], P[0, 1] * dims[1] + P[1, 1])
+    view_offset = p[0] * dims[1] + p[1]
+
+    # 2. s = M o + center, so s_v = P^T M o + P^T (center - p), where P^T M is the rotation by theta.
+    t_rows, t_cols = P.T @ (np.array([dims[0] / 2, dims[1] / 2]) - p)
+    a = np.tan(theta / 2)
+    b = -np.sin(theta)
+
+    # The output pixels relative to the center of the output image (like in get_source_coordinates).
+    out_rows = np.arange(rot_shape[0]) - (rot_shape[0] // 2)
+    out_cols = np.arange(rot_shape[1]) - (rot_shape[1] // 2)
+
+    # The rows of I1 and I2 are the rows u_r = o_r + a * o_c that the last pass needs (with 2 more rows on each
+    # side for the neighbors of the interpolation). The columns of I1 are the columns of the view
+    # (v_c = column - t_cols) and the columns of I2 are the columns of the output.
+    row_shifts = a * out_cols[[0, -1]]
+    first_row = int(np.floor(out_rows[0] + np.min(row_shifts))) - 2
+    last_row = int(np.ceil(out_rows[-1] + np.max(row_shifts))) + 2
+    inner_rows = np.arange(first_row, last_row + 1)
+    view_cols = np.arange(view_shape[1]) - t_cols
+
+    # Pass 1: I1[i, j] = view[u_r[i] + a * v_c[j] + t_rows, j], a shear of the columns of the view.
+    I1 = np.empty((len(inner_rows), view_shape[1], channels), dtype=img.dtype)
+    shear_lines(img.reshape(-1, channels), view_shape, view_strides, view_offset, first_row + a * view_cols + t_rows,
+                I1, 0, interpolation, executor)
+
+    # Pass 2: I2[i, j] = I1[i, o_c[j] + b * u_r[i] + t_cols], a shear of the rows of I1.
+    I2 = np.empty((len(inner_rows), rot_shape[1], channels), dtype=img.dtype)
+    shear_lines(I1.reshape(-1, channels), I1.shape, (I1.shape[1], 1), 0, out_cols[0] + b * inner_rows + t_cols,
+                I2, 1, interpolation, executor)
+    del I1
+
+    # Pass 3: rot_img[i, j] = I2[o_r[i] + a * o_c[j] - first_row, j], a shear of the columns of I2.
+    shear_lines(I2.reshape(-1, channels), I2.shape, (I2.shape[1], 1), 0, out_rows[0] + a * out_cols - first_row,
+                rot_img, 0, interpolation, executor)
+    return rot_img
+
+
+# This function shears the lines of an image src into out: with axis=0 every column j of out is the column j of src,
+# sampled at the (fractional) rows i + shifts[j], and with axis=1 every row i of out is the row i of src, sampled
+# at the columns j + shifts[i]. Like in get_interpolation_taps, the samples outside src (between 0 and the last
+# pixel of the line) are 0, and the neighbors outside src are replaced by the nearest pixels of its sides.
+# src is given as an array of pixels (one row for each pixel, with the channels in the columns), where the pixel
+# (i, j) of src is src_pixels[offset + i * strides[0] + j * strides[1]] (so src can be e.g. a rotated view of
+# an image), and src_shape (rows, columns). The rows of out are calculated in blocks, with the executor, if it is given.
+def shear_lines(src_pixels, src_shape, strides, offset, shifts, out, axis, interpolation, executor=None):
+    working_dtype = np.result_type(src_pixels.dtype, np.float32)
+    size = src_shape[axis]
+
+    # The previous (or the nearest) sample of each line, and the weights of its neighbors.
+    if interpolation == 'nearest':
+        first_samples = np.round(shifts).astype(np.intp)
+        offsets, weights = (0,), (None,)
+        on_pixel = np.ones(len(shifts), dtype=bool)
+    else:
+        first_samples = np.floor(shifts)
+        on_pixel = shifts == first_samples  # The lines whose samples are pixels of src (the distance t is 0).
+        offsets, weights = get_interpolation_weights_1d((shifts - first_samples).astype(np.float32), interpolation)
+        first_samples = first_samples.astype(np.intp)
+
+    def shear_block(row_start, row_end):
+        # Only the columns col_start to col_end of the block can have samples inside src (the others are 0).
+        # (The shifts change linearly from line to line, so these columns are consecutive.)
+        if axis == 0:
+            has_samples = (first_samples >= -(row_end - 1)) & (first_samples <= size - 1 - row_start)
+            col_start = np.argmax(has_samples) if np.any(has_samples) else 0
+            col_end = out.shape[1] - np.argmax(has_samples[::-1]) if np.any(has_samples) else 0
+        else:
+            block_first_samples = first_samples[row_start:row_end]
+            col_start = max(0, -np.max(block_first_samples))
+            col_end = min(out.shape[1], size - np.min(block_first_samples))
+        col_end = max(col_start, col_end)
+        out[row_start:row_end, :col_start] = 0
+        out[row_start:row_end, col_end:] = 0
+        if col_start == col_end:
+            return
+
+        rows = np.arange(row_start, row_end)[:, np.newaxis]
+        cols = np.arange(col_start, col_end)[np.newaxis, :]
+        if axis == 0:
+            samples = rows + first_samples[np.newaxis, col_start:col_end]  # The rows of the samples.
+            line_indices = offset + cols * strides[1]
+            line_on_pixel = on_pixel[np.newaxis, col_start:col_end]
+            line_weights = [weight if weight is None else weight[np.newaxis, col_start:col_end] for weight in weights]
+        else:
+            samples = cols + first_samples[row_start:row_end, np.newaxis]  # The columns of the samples.
+            line_indices = offset + rows * strides[0]
+            line_on_pixel = on_pixel[row_start:row_end, np.newaxis]
+            line_weights = [weight if weight is None else weight[row_start:row_end, np.newaxis] for weight in weights]
+
+        # A sample is inside src if it is between its first and its last pixel (the last pixel itself only
+        # if the sample is on it).
+        inside = (samples >= 0) & ((samples < size - 1) | ((samples == size - 1) & line_on_pixel))
+
+        values = None
+        for sample_offset, weight in zip(offsets, line_weights):
+            neighbor_indices = np.clip(samples + sample_offset, 0, size - 1) * strides[axis] + line_indices
+            neighbor_values = np.take(src_pixels, neighbor_indices, axis=0)
+
+            if weight is None:
+                values = neighbor_values
+            elif values is None:
+                values = np.multiply(neighbor_values, weight[:, :, np.newaxis], dtype=working_dtype)
+            else:
+                values += np.multiply(neighbor_values, weight[:, :, np.newaxis], dtype=working_dtype)
+
+        if interpolation != 'nearest':
+            values = convert_interpolated_values(values, out.dtype)
+        values[~inside] = 0
+        out[row_start:row_end, col_start:col_end] = values
+
+    rows_per_block = max(1, PIXELS_PER_BLOCK // out.shape[1])
+    blocks = [(row_start, min(row_start + rows_per_block, out.shape[0]))
+              for row_start in range(0, out.shape[0], rows_per_block)]
+    if executor is None:
+        for block in blocks:
+            shear_block(*block)
+    else:
+        list(executor.map(lambda block: shear_block(*block), blocks))
+
+
+# This is the first version of my_img_rotation, with a loop over the pixels of the input image (to find the size of
+# the output image) and a loop over the pixels of the output image. I keep it to check and benchmark the new version.
+def my_img_rotation_with_loops(img, angle):
     dims = img.shape  # Take the dimensions of the input image.
 
     # The function should work independently of the number of channels in the input image.
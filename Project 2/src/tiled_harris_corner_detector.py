@@ -0,0 +1,167 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from harris_corner_detector import my_corner_harris
+from harris_corner_detector import my_corner_harris_fast
+from harris_corner_detector import HarrisWorkspace
+from harris_corner_detector import get_local_maxima
+from harris_corner_detector import select_corners
+
+# The functions of this file find the corners of images that are too large for my_corner_harris and my_corner_peaks,
+# which need several full-size float64 arrays at once (the image, Ix, Iy, Ix2, Iy2, Ixy and the response).
+# The image is split into tiles, and each tile is processed by a worker process together with a halo
+# (a frame of pixels around the tile), which is wide enough so that the response and the local maxima
+# of the pixels of the tile are exactly the same as in the whole image:
+#   - The response of a pixel depends on the pixels up to 1 (Sobel) + filter_size // 2 (Gaussian) pixels away.
+#   - A pixel is a local maximum depending on the responses up to neighborhood_size // 2 pixels away.
+# The workers read their tiles from the same copy of the image (a .npy file that is memory-mapped,
+# or shared memory), so the memory that is used depends on the number of workers and on the size of the tiles.
+# Each worker returns the local maxima of its tile only (not of its halo), so no corner is found twice at the seams.
+#
+# The threshold of my_corner_peaks depends on the maximum response of the whole image, which is known only after all
+# the tiles are processed. So the corners are found in two passes:
+#   1. Each worker returns the maximum response of its tile and the local maxima that may exceed the threshold.
+#      The threshold max(R) * rel_threshold is at least tile_max * rel_threshold (if rel_threshold >= 0),
+#      so these are the local maxima with a response greater than tile_max * rel_threshold.
+#   2. The maximum of the tile maxima gives the global threshold, which is applied to the returned local maxima.
+# The result is the same as the one of my_corner_peaks on the response of the whole image.
+
+# The image and the workspace of the worker process (set by initialize_worker).
+worker_img = None
+worker_shared_memory = None
+worker_workspace = None
+
+
+# This function opens the image in a worker process. source is ('file', filename) for a .npy file,
+# which is memory-mapped, or ('shared', name, shape, dtype) for an image in shared memory.
+def initialize_worker(source):
+    global worker_img, worker_shared_memory, worker_workspace
+    if source[0] == 'file':
+        worker_img = np.load(source[1], mmap_mode='r')
+    else:
+        name, shape, dtype = source[1:]
+        worker_shared_memory = shared_memory.SharedMemory(name=name)
+        worker_img = np.ndarray(shape, dtype=dtype, buffer=worker_shared_memory.buf)
+    worker_workspace = HarrisWorkspace()
+
+
+# This function returns the halo (in pixels) that is needed around a tile for a Gaussian window of sigma
+# and local maxima in neighborhoods of side neighborhood_size.
+def get_tile_halo(sigma, neighborhood_size=3):
+    return 1 + round(4 * sigma) // 2 + neighborhood_size // 2
+
+
+# This function returns the tiles (row_start, row_end, col_start, col_end) of an image with the shape img_shape.
+def get_tiles(img_shape, tile_size):
+    rows, cols = img_shape
+    return [(row_start, min(row_start + tile_size, rows), col_start, min(col_start + tile_size, cols))
+            for row_start in range(0, rows, tile_size) for col_start in range(0, cols, tile_size)]
+
+
+# This function finds the local maxima of a tile of img (pass 1). It returns the maximum response of the tile,
+# and the positions (in the whole image) and the responses of the local maxima of the tile with a response
+# greater than tile_max * rel_threshold (all the local maxima, if rel_threshold is negative).
+# The border of the whole image (border pixels) is excluded, like in my_corner_peaks.
+def find_local_maxima_of_tile(img, tile, k, sigma, rel_threshold, neighborhood_size=3, border=1, fast=False,
+                              workspace=None):
+    row_start, row_end, col_start, col_end = tile
+    rows, cols = img.shape
+
+    # The tile with its halo (which is cut at the sides of the image, where the image is zero-padded like before).
+    halo = get_tile_halo(sigma, neighborhood_size)
+    halo_row_start, halo_col_start = max(row_start - halo, 0), max(col_start - halo, 0)
+    halo_row_end, halo_col_end = min(row_end + halo, rows), min(col_end + halo, cols)
+    img_tile = np.asarray(img[halo_row_start:halo_row_end, halo_col_start:halo_col_end])
+
+    if fast:
+        harris_response = my_corner_harris_fast(img_tile, k, sigma, workspace)
+    else:
+        harris_response = my_corner_harris(img_tile, k, sigma)
+    local_max = get_local_maxima(harris_response, neighborhood_size)
+
+    # Only the pixels of the tile (without the halo), which are also not in the border of the whole image.
+    tile_rows = slice(row_start - halo_row_start, row_end - halo_row_start)
+    tile_cols = slice(col_start - halo_col_start, col_end - halo_col_start)
+    tile_response = harris_response[tile_rows, tile_cols]
+    tile_local_max = local_max[tile_rows, tile_cols]
+    tile_local_max[:max(border - row_start, 0), :] = False
+    tile_local_max[max(rows - border - row_start, 0):, :] = False
+    tile_local_max[:, :max(border - col_start, 0)] = False
+    tile_local_max[:, max(cols - border - col_start, 0):] = False
+
+    tile_max = tile_response.max()
+    lower_threshold = tile_max * rel_threshold if rel_threshold >= 0 else -np.inf
+    corner_rows, corner_cols = np.nonzero(tile_local_max & (tile_response > lower_threshold))
+    scores = tile_response[corner_rows, corner_cols].copy()  # A copy, because the response is kept by the workspace.
+
+    return tile_max, corner_rows + row_start, corner_cols + col_start, scores
+
+
+# This function runs find_local_maxima_of_tile in a worker process, on the image that was opened by initialize_worker.
+def find_local_maxima_of_worker_tile(tile, arguments):
+    return find_local_maxima_of_tile(worker_img, tile, *arguments, workspace=worker_workspace)
+
+
+# This function returns the corners of img like my_corner_peaks(my_corner_harris(img, k, sigma), rel_threshold, ...)
+# (with the same options), but it processes the image in tiles of tile_size x tile_size pixels,
+# in parallel worker processes (by default one for each CPU). The corners and their scores are exactly the same.
+# img is a 2-D array or the filename of a .npy file, which is memory-mapped by the workers and is never loaded whole.
+# With fast=True, the response is calculated by my_corner_harris_fast (float32) instead of my_corner_harris,
+# which is about 4 times faster, and the corners are exactly the same as the ones of
+# my_corner_peaks(my_corner_harris_fast(img, k, sigma), ...) instead (see my_corner_harris_fast for the difference).
+def my_corner_harris_tiled(img, k, sigma, rel_threshold, tile_size=1024, neighborhood_size=3, min_distance=0,
+                           max_corners=None, border=1, return_scores=False, workers=None, fast=False):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    arguments = (k, sigma, rel_threshold, neighborhood_size, border, fast)
+
+    shared_img = None
+    try:
+        if isinstance(img, (str, os.PathLike)):
+            source = ('file', os.fspath(img))
+            img_shape = np.load(img, mmap_mode='r').shape
+        elif workers > 1:
+            # A single copy of the image in shared memory, for all the workers.
+            img = np.asarray(img)
+            img_shape = img.shape
+            shared_img = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+            np.ndarray(img.shape, dtype=img.dtype, buffer=shared_img.buf)[...] = img
+            source = ('shared', shared_img.name, img.shape, img.dtype.str)
+        else:
+            img = np.asarray(img)
+            img_shape = img.shape
+
+        tiles = get_tiles(img_shape, tile_size)
+        if workers > 1:
+            # Pass 1 in the worker processes.
+            with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker,
+                                     initargs=(source,)) as executor:
+                results = list(executor.map(find_local_maxima_of_worker_tile, tiles, [arguments] * len(tiles),
+                                            chunksize=max(1, len(tiles) // (4 * workers))))
+        else:
+            # Pass 1 in this process.
+            if isinstance(img, (str, os.PathLike)):
+                img = np.load(img, mmap_mode='r')
+            workspace = HarrisWorkspace()
+            results = [find_local_maxima_of_tile(img, tile, *arguments, workspace=workspace) for tile in tiles]
+    finally:
+        if shared_img is not None:
+            shared_img.close()
+            shared_img.unlink()
+
+    # Pass 2: the global threshold.
+    tile_maxima, corner_rows, corner_cols, scores = zip(*results)
+    threshold = max(tile_maxima) * rel_threshold
+    corner_rows, corner_cols, scores = np.concatenate(corner_rows), np.concatenate(corner_cols), np.concatenate(scores)
+    exceeds = scores > threshold
+    corner_rows, corner_cols, scores = corner_rows[exceeds], corner_cols[exceeds], scores[exceeds]
+
+    # Sort the corners from the strongest to the weakest (equal responses in the order of the image).
+    order = np.lexsort((corner_cols, corner_rows, -scores))
+    corner_locations = np.column_stack((corner_rows[order], corner_cols[order]))
+    corner_locations, scores = select_corners(corner_locations, scores[order], min_distance, max_corners)
+
+    if return_scores:
+        return corner_locations, scores
+    return corner_locations
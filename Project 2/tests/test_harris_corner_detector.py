@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+from harris_corner_detector import my_corner_harris
+from harris_corner_detector import my_corner_harris_fast
+from harris_corner_detector import HarrisWorkspace
+from harris_corner_detector import my_corner_peaks
+from harris_corner_detector import get_suppression_radii
+from harris_corner_detector import select_corners_anms
+from harris_corner_detector import select_corners_by_grid
+
+
+@pytest.mark.parametrize('sigma', [0.8, 1.5, 2.5, 4.0])
+def test_fast_response_matches_my_corner_harris(sigma):
+    img = np.random.default_rng(0).integers(0, 256, (61, 87)).astype(np.float64)
+    R = my_corner_harris(img, 0.05, sigma)
+    R_fast = my_corner_harris_fast(img, 0.05, sigma)
+    assert R_fast.dtype == np.float32
+    assert np.max(np.abs(R_fast - R)) <= 1e-6 * np.max(np.abs(R))
+
+
+def test_workspace_is_reused_and_small():
+    rng = np.random.default_rng(1)
+    workspace = HarrisWorkspace()
+    img_shape = (40, 50)
+    for _ in range(3):
+        img = rng.random(img_shape)
+        expected = my_corner_harris_fast(img, 0.05, 2.0)
+        np.testing.assert_array_equal(my_corner_harris_fast(img, 0.05, 2.0, workspace), expected)
+
+    # 4 float32 arrays with the shape of the image (16 bytes for each pixel).
+    assert workspace.planes.nbytes + workspace.scratch.nbytes == 16 * img_shape[0] * img_shape[1]
+
+
+# This function returns n random corners of an image with the shape img_shape (at different pixels), sorted from the
+# strongest to the weakest, and their scores.
+def get_random_corners(img_shape, n, seed):
+    rng = np.random.default_rng(seed)
+    pixels = rng.choice(img_shape[0] * img_shape[1], n, replace=False)
+    corner_locations = np.column_stack(np.unravel_index(pixels, img_shape))
+    # The scores of real corners spread over several orders of magnitude.
+    scores = np.sort(10 ** rng.uniform(-4, 0, n))[::-1]
+    return corner_locations, scores
+
+
+# This function returns the suppression radii of the definition, comparing all the pairs of corners.
+def get_suppression_radii_with_loops(corner_locations, scores, robustness=0.9):
+    radii = np.full(len(corner_locations), np.inf)
+    for i in range(len(corner_locations)):
+        for j in range(len(corner_locations)):
+            if scores[i] < robustness * scores[j]:
+                radii[i] = min(radii[i], np.hypot(*(corner_locations[i] - corner_locations[j])))
+    return radii
+
+
+@pytest.mark.parametrize('n, robustness, seed', [(1, 0.9, 0), (2, 0.9, 0), (40, 0.9, 1), (300, 0.9, 2),
+                                                 (300, 0.5, 3), (300, 1.0, 4)])
+def test_suppression_radii_match_loops(n, robustness, seed):
+    corner_locations, scores = get_random_corners((120, 160), n, seed)
+    # The corners in a random order, and some equal scores.
+    order = np.random.default_rng(seed).permutation(n)
+    corner_locations, scores = corner_locations[order], np.round(scores[order], 3)
+    expected = get_suppression_radii_with_loops(corner_locations, scores, robustness)
+    np.testing.assert_array_equal(get_suppression_radii(corner_locations, scores, robustness), expected)
+
+
+def test_anms_chooses_the_largest_radii():
+    corner_locations, scores = get_random_corners((120, 160), 200, 5)
+    chosen_locations, chosen_scores = select_corners_anms(corner_locations, scores, 30)
+    radii = get_suppression_radii_with_loops(corner_locations, scores)
+    chosen = [np.flatnonzero(np.all(corner_locations == location, axis=1))[0] for location in chosen_locations]
+    np.testing.assert_array_equal(chosen_scores, scores[chosen])
+    # The strongest corner comes first, and the radii decrease and are the 30 largest radii.
+    assert chosen[0] == 0
+    assert np.all(radii[chosen][:-1] >= radii[chosen][1:])
+    assert radii[chosen[-1]] >= np.max(np.delete(radii, chosen))
+
+
+@pytest.mark.parametrize('n, grid_shape, seed', [(50, (4, 5), 6), (61, (3, 7), 7), (50, None, 8), (500, (4, 5), 9)])
+def test_grid_chooses_the_strongest_corners_of_each_cell(n, grid_shape, seed):
+    img_shape = (90, 130)
+    corner_locations, scores = get_random_corners(img_shape, 400, seed)
+    chosen_locations, chosen_scores = select_corners_by_grid(corner_locations, scores, img_shape, n, grid_shape)
+    assert len(chosen_locations) == min(n, len(corner_locations))
+    assert np.all(np.diff(chosen_scores) <= 0)
+
+    if grid_shape is None:
+        grid_rows = max(1, round(np.sqrt(n * img_shape[0] / img_shape[1])))
+        grid_shape = (grid_rows, -(-n // grid_rows))
+    grid_rows, grid_cols = grid_shape
+    cell_size = (img_shape[0] / grid_rows, img_shape[1] / grid_cols)
+
+    def get_cells(locations):
+        return (locations[:, 0] // cell_size[0]).astype(int) * grid_cols + (locations[:, 1] // cell_size[1]).astype(int)
+
+    cells = get_cells(corner_locations)
+    chosen_cells = get_cells(chosen_locations)
+    corner_counts = np.bincount(cells, minlength=grid_rows * grid_cols)
+    chosen_counts = np.bincount(chosen_cells, minlength=grid_rows * grid_cols)
+    # Each cell is capped: its count is at most one more than the count of any cell that has corners left.
+    cap = -(-min(n, len(corner_locations)) // np.count_nonzero(corner_counts))
+    assert np.all(chosen_counts <= np.maximum(cap, np.minimum(corner_counts, chosen_counts.max())))
+    assert np.all(chosen_counts.max() - 1 <= chosen_counts[chosen_counts < corner_counts])
+    # And the chosen corners of each cell are its strongest corners.
+    for cell in range(grid_rows * grid_cols):
+        np.testing.assert_array_equal(chosen_scores[chosen_cells == cell],
+                                      scores[cells == cell][:chosen_counts[cell]])
+
+
+# This function returns the Harris response of a random image with some corners.
+def get_harris_response(seed):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((80, 100))
+    for _ in range(12):
+        row, col = rng.integers(0, 70), rng.integers(0, 90)
+        img[row:row + rng.integers(5, 30), col:col + rng.integers(5, 30)] += rng.uniform(50, 200)
+    return my_corner_harris(img, 0.05, 1.5)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_corner_peaks_are_sorted_with_their_scores(seed):
+    R = get_harris_response(seed)
+    corners, scores = my_corner_peaks(R, 0.01, return_scores=True)
+    assert len(corners) > 10
+    np.testing.assert_array_equal(scores, R[corners[:, 0], corners[:, 1]])
+    assert np.all(np.diff(scores) <= 0)
+    # Without scores, the same corners are returned, and they are the thresholded local maxima.
+    np.testing.assert_array_equal(my_corner_peaks(R, 0.01), corners)
+    assert np.all(scores > 0.01 * R.max())
+    for row, col in corners:
+        assert R[row, col] == R[row - 1:row + 2, col - 1:col + 2].max()
+
+
+@pytest.mark.parametrize('border', [0, 1, 5, 12])
+def test_corner_peaks_respect_the_border(border):
+    R = get_harris_response(3)
+    corners = my_corner_peaks(R, 0.001, border=border)
+    assert np.all(corners >= border)
+    assert np.all(corners < np.array(R.shape) - border)
+    # The corners far from the sides are the same for every border.
+    all_corners = my_corner_peaks(R, 0.001, border=0)
+    inside = np.all((all_corners >= border) & (all_corners < np.array(R.shape) - border), axis=1)
+    np.testing.assert_array_equal(corners, all_corners[inside])
+
+
+@pytest.mark.parametrize('min_distance', [1, 3, 7.5, 20])
+def test_corner_peaks_respect_min_distance(min_distance):
+    R = get_harris_response(4)
+    all_corners = my_corner_peaks(R, 0.001)
+    corners = my_corner_peaks(R, 0.001, min_distance=min_distance)
+    distances = np.hypot(*(corners[:, np.newaxis, :] - corners[np.newaxis, :, :]).transpose(2, 0, 1))
+    assert np.all(distances[~np.eye(len(corners), dtype=bool)] >= min_distance)
+    # A corner is skipped only if it is too close to a stronger chosen corner.
+    chosen = [np.flatnonzero(np.all(all_corners == corner, axis=1))[0] for corner in corners]
+    assert np.all(np.diff(chosen) > 0)
+    for index in np.setdiff1d(np.arange(len(all_corners)), chosen):
+        stronger = corners[np.array(chosen) < index]
+        assert np.min(np.hypot(*(stronger - all_corners[index]).T)) < min_distance
+
+
+@pytest.mark.parametrize('min_distance', [0, 5])
+def test_corner_peaks_are_truncated_to_max_corners(min_distance):
+    R = get_harris_response(5)
+    corners, scores = my_corner_peaks(R, 0.001, min_distance=min_distance, return_scores=True)
+    for max_corners in [0, 1, 7, len(corners), len(corners) + 10]:
+        truncated, truncated_scores = my_corner_peaks(R, 0.001, min_distance=min_distance, max_corners=max_corners,
+                                                      return_scores=True)
+        np.testing.assert_array_equal(truncated, corners[:max_corners])
+        np.testing.assert_array_equal(truncated_scores, scores[:max_corners])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from incremental_hough_transform import IncrementalHoughTransform
+from my_hough_transform import my_hough_transform
+
+
+# A sequence of edge maps where every frame adds and removes some edge pixels of the previous one:
+# a few lines that move slowly, and random noise pixels that change in every frame.
+def get_edge_maps(img_shape=(48, 64), frames=6):
+    rng = np.random.default_rng(0)
+    edge_maps = []
+    for t in range(frames):
+        img_binary = np.zeros(img_shape, dtype=np.uint8)
+        img_binary[10 + t, :] = 1
+        img_binary[:, 20 + 2 * t] = 1
+        rows = np.arange(img_shape[0])
+        img_binary[rows, np.clip(rows + 3 * t, 0, img_shape[1] - 1)] = 1
+        img_binary[rng.random(img_shape) < 0.02] = 1
+        edge_maps.append(img_binary)
+    return edge_maps
+
+
+@pytest.mark.parametrize('min_rho_distance, min_theta_distance', [(0, 0), (3, np.deg2rad(3))])
+def test_incremental_hough_transform_matches_from_scratch(min_rho_distance, min_theta_distance):
+    d_rho, d_theta, n = 1, np.pi / 180, 4
+    transform = IncrementalHoughTransform(d_rho, d_theta, n, min_rho_distance, min_theta_distance)
+
+    for img_binary in get_edge_maps():
+        H, L, res = transform.transform(img_binary)
+        H_expected, L_expected, res_expected = my_hough_transform(img_binary, d_rho, d_theta, n, None, None, None,
+                                                                  min_rho_distance, min_theta_distance)
+        np.testing.assert_array_equal(H, H_expected)
+        np.testing.assert_array_equal(L, L_expected)
+        assert res == res_expected
+
+    # Every frame after the first added and removed pixels.
+    assert all(transform.pixels_added_per_frame[1:]) and all(transform.pixels_removed_per_frame[1:])
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+from scipy.ndimage import zoom
+from multiscale_harris_corner_detector import my_corner_harris_multiscale
+
+SIGMAS = [2 ** (i / 4) for i in range(4, 14)]
+
+
+# An image of two rectangles (with 8 corners) and a little noise.
+def get_image_of_rectangles(img_shape=(256, 256)):
+    img = np.zeros(img_shape)
+    img[60:120, 60:100] = 1
+    img[150:200, 140:230] = 0.7
+    return gaussian_filter(img, 1.5) + np.random.default_rng(0).normal(0, 0.01, img_shape)
+
+
+# The response of the corner of img nearest to (row, col) at each of the sigmas.
+def get_responses_of_corner(img, sigmas, row, col):
+    responses = []
+    for sigma in sigmas:
+        corners = my_corner_harris_multiscale(img, 0.05, [sigma], -1, border=0)
+        nearest = np.argmin(np.hypot(corners[:, 0] - row, corners[:, 1] - col))
+        responses.append(corners[nearest, 3])
+    return np.array(responses)
+
+
+def test_responses_are_comparable_across_scales_and_zoom():
+    img = get_image_of_rectangles()
+    zoomed_img = zoom(img, 2, order=3)
+
+    responses = get_responses_of_corner(img, SIGMAS, 60, 60)
+    zoomed_responses = get_responses_of_corner(zoomed_img, [2 * sigma for sigma in SIGMAS], 120, 120)
+    # The same corner at twice the sigma in the image zoomed by 2 has about the same response.
+    np.testing.assert_allclose(zoomed_responses, responses, rtol=0.1)
+    # The response does not jump between the levels of the pyramid (the sigmas of one level share their
+    # derivative scale, so without the normalization of the ratio it jumps about 4 times at every level).
+    ratios = responses[1:] / responses[:-1]
+    assert np.all((ratios > 0.6) & (ratios < 1.7))
+
+
+def test_corners_of_zoomed_image_are_at_twice_the_scale():
+    img = get_image_of_rectangles()
+    # The 4 strongest corners are the corners of the brighter rectangle.
+    corners = my_corner_harris_multiscale(img, 0.05, SIGMAS, 0.05, max_corners=4)
+    zoomed_corners = my_corner_harris_multiscale(zoom(img, 2, order=3), 0.05, [2 * sigma for sigma in SIGMAS], 0.05,
+                                                 max_corners=4)
+    np.testing.assert_allclose(zoomed_corners[:, :2], 2 * corners[:, :2], atol=4)
+    np.testing.assert_allclose(zoomed_corners[:, 2], 2 * corners[:, 2])
+    np.testing.assert_allclose(zoomed_corners[:, 3], corners[:, 3], rtol=0.1)
+
+
+def test_empty_sigmas_raise_value_error():
+    with pytest.raises(ValueError):
+        my_corner_harris_multiscale(np.zeros((32, 32)), 0.05, [], 0.01)
@@ -0,0 +1,169 @@
+import numpy as np
+import pytest
+from scipy.ndimage import binary_erosion
+from scipy.ndimage import gaussian_filter
+from my_hough_transform import are_near_lines
+from my_hough_transform import my_hough_transform
+from my_hough_transform import my_hough_transform_with_loops
+from my_hough_transform import vote_hough_accumulator
+from my_hough_transform import vote_hough_accumulator_near_gradients
+from my_hough_transform import my_progressive_probabilistic_hough_transform
+from my_hough_transform import my_coarse_to_fine_hough_transform
+
+
+def test_near_lines_across_plus_minus_90_degrees():
+    min_rho_distance, min_theta_distance = 3, np.deg2rad(3)
+    assert are_near_lines(10, np.deg2rad(20), 11, np.deg2rad(21), min_rho_distance, min_theta_distance)
+    # (rho, theta) and (-rho, theta + pi) are the same line.
+    assert are_near_lines(-20, np.deg2rad(-90), 20, np.deg2rad(90), min_rho_distance, min_theta_distance)
+    assert are_near_lines(-20, np.deg2rad(-89), 21, np.deg2rad(89), min_rho_distance, min_theta_distance)
+    assert not are_near_lines(-20, np.deg2rad(-90), -20, np.deg2rad(90), min_rho_distance, min_theta_distance)
+    assert not are_near_lines(20, np.deg2rad(-89), 20, np.deg2rad(89), min_rho_distance, min_theta_distance)
+    # With the default distances of 0 no lines are near.
+    assert not are_near_lines(-20, np.deg2rad(-90), 20, np.deg2rad(90), 0, 0)
+
+
+def test_horizontal_line_is_found_once_with_minimum_distances():
+    img_binary = np.zeros((60, 80), dtype=np.uint8)
+    img_binary[20, :] = 1  # A horizontal line (theta = -90 or +90 degrees).
+    img_binary[:, 30] = 1  # A vertical line (theta = 0).
+
+    # Without minimum distances the horizontal line is found at both ends of the range of theta.
+    _, L, _ = my_hough_transform(img_binary, 1, np.pi / 180, 2)
+    np.testing.assert_allclose(L, [[-20, -np.pi / 2], [20, np.pi / 2]])
+
+    _, L, _ = my_hough_transform(img_binary, 1, np.pi / 180, 2, min_rho_distance=3,
+                                 min_theta_distance=np.deg2rad(3))
+    np.testing.assert_allclose(L, [[-20, -np.pi / 2], [30, 0]], atol=1e-12)
+
+
+# Random edge pixels and 3 lines, with the steps of the first version and with coarser and finer ones.
+@pytest.mark.parametrize('d_rho, d_theta', [(1, np.pi / 180), (2, np.pi / 90), (0.5, np.pi / 120)])
+def test_matches_loops(d_rho, d_theta):
+    rng = np.random.default_rng(0)
+    img_binary = (rng.random((30, 41)) < 0.03).astype(np.uint8)
+    img_binary[7, 3:38] = 1
+    img_binary[2:28, 25] = 1
+    diagonal = np.arange(25)
+    img_binary[diagonal + 3, diagonal + 8] = 1
+
+    H_loops, L_loops, res_loops = my_hough_transform_with_loops(img_binary, d_rho, d_theta, 5)
+    H, L, res = my_hough_transform(img_binary, d_rho, d_theta, 5)
+    assert np.array_equal(H, H_loops)
+    assert np.array_equal(L, L_loops)
+    assert res == res_loops
+
+
+# The edges of a rectangle rotated by 20 degrees (its sides are on lines with theta = 20 and -70 degrees),
+# and the smoothed filled rectangle, whose gradients are normal to the sides.
+def get_rotated_rectangle():
+    rows, cols = np.mgrid[0:90, 0:100]
+    angle = np.deg2rad(20)
+    u = (cols - 50) * np.cos(angle) + (rows - 45) * np.sin(angle)
+    v = -(cols - 50) * np.sin(angle) + (rows - 45) * np.cos(angle)
+    filled = (np.abs(u) <= 25) & (np.abs(v) <= 18)
+    edges = (filled & ~binary_erosion(filled)).astype(np.uint8)
+    return edges, gaussian_filter(filled.astype(np.float64), 1)
+
+
+@pytest.mark.parametrize('delta_theta_degrees', [5, 10])
+def test_gradient_voting_finds_the_lines_of_full_voting(delta_theta_degrees):
+    edges, gradient_img = get_rotated_rectangle()
+    distances = {'min_rho_distance': 5, 'min_theta_distance': np.deg2rad(5)}
+    _, L, _ = my_hough_transform(edges, 1, np.pi / 180, 4, **distances)
+    _, L_near, _ = my_hough_transform(edges, 1, np.pi / 180, 4, gradient_img=gradient_img,
+                                      delta_theta=np.deg2rad(delta_theta_degrees), **distances)
+
+    lines = L[np.lexsort(L.T[::-1])]
+    np.testing.assert_array_equal(L_near[np.lexsort(L_near.T[::-1])], lines)
+    np.testing.assert_allclose(np.sort(np.rad2deg(lines[:, 1])), [-71, -71, 20, 20], atol=1)
+
+
+# Every pixel votes like in vote_hough_accumulator, but only for the thetas at most delta_theta away from its normal
+# (or from the normal + pi, so the window of a normal near 90 degrees continues at -90 degrees).
+@pytest.mark.parametrize('gradient_angle_degrees', [0, 33, -60, 88, -178, 179.3])
+def test_gradient_voting_stays_in_the_window(gradient_angle_degrees):
+    img_binary = np.zeros((20, 30), dtype=np.uint8)
+    img_binary[12, 17] = 1
+    rho_max = round(np.sqrt(20 ** 2 + 30 ** 2))
+    rhos = np.arange(-rho_max, rho_max + 1, 1)
+    t_rad = np.deg2rad(np.arange(-90, 91, 1.0))
+    delta_theta = np.deg2rad(4.5)  # Not a multiple of the step of theta, so no theta is at the limit.
+    gradient_angles = np.full(img_binary.shape, np.deg2rad(gradient_angle_degrees))
+
+    H_near = vote_hough_accumulator_near_gradients(img_binary, rhos, t_rad, rho_max, 1, gradient_angles, delta_theta)
+    H = vote_hough_accumulator(img_binary, rhos, t_rad, rho_max, 1)
+
+    # The angular distance between theta and the normal, modulo pi.
+    distance = np.abs(np.mod(t_rad - np.deg2rad(gradient_angle_degrees) + np.pi / 2, np.pi) - np.pi / 2)
+    in_window = distance <= delta_theta
+    assert 8 <= np.count_nonzero(in_window) <= 10
+    np.testing.assert_array_equal(H_near[:, in_window], H[:, in_window])
+    assert not H_near[:, ~in_window].any()
+
+
+# Three segments (from (n1, n2) to (n1, n2)) and a few random edge pixels.
+SEGMENTS = np.array([[10, 20, 120, 20], [140, 30, 140, 110], [20, 40, 80, 100]])
+
+
+def get_segments_image():
+    img_binary = np.zeros((120, 160), dtype=np.uint8)
+    for n1_start, n2_start, n1_end, n2_end in SEGMENTS:
+        t = np.linspace(0, 1, max(abs(n1_end - n1_start), abs(n2_end - n2_start)) + 1)
+        img_binary[np.round(n2_start + t * (n2_end - n2_start)).astype(int),
+                   np.round(n1_start + t * (n1_end - n1_start)).astype(int)] = 1
+    img_binary[np.random.default_rng(0).random(img_binary.shape) < 0.002] = 1
+    return img_binary
+
+
+# The distance of the point (n1, n2) from the segment (n1_start, n2_start, n1_end, n2_end).
+def get_distance_from_segment(n1, n2, segment):
+    start, end, point = segment[:2], segment[2:], np.array([n1, n2])
+    t = np.clip(np.dot(point - start, end - start) / np.dot(end - start, end - start), 0, 1)
+    return np.linalg.norm(point - (start + t * (end - start)))
+
+
+def test_probabilistic_hough_transform_finds_the_segments():
+    img_binary = get_segments_image()
+    _, L, res = my_progressive_probabilistic_hough_transform(img_binary, 1, np.pi / 180, 3, min_line_length=20, seed=0)
+    assert L.shape == (3, 6)
+    # With this seed every segment is found from end to end (in any order and direction).
+    found = [sorted([tuple(line[2:4]), tuple(line[4:6])]) for line in L]
+    for segment in SEGMENTS:
+        expected = sorted([tuple(segment[:2]), tuple(segment[2:])])
+        assert any(np.all(np.abs(np.array(ends) - expected) <= 2) for ends in found)
+    assert res == img_binary.size - 111 - 81 - 61
+
+    # With any seed the ends of the segments that are found are on the segments of the image
+    # (a segment can be found shorter, if its cell is a line with a slightly different theta).
+    for seed in range(1, 6):
+        _, L, _ = my_progressive_probabilistic_hough_transform(img_binary, 1, np.pi / 180, 3, min_line_length=20,
+                                                               seed=seed)
+        for line in L:
+            for n1, n2 in (line[2:4], line[4:6]):
+                assert min(get_distance_from_segment(n1, n2, segment) for segment in SEGMENTS) <= 2
+
+
+def test_probabilistic_hough_transform_is_deterministic():
+    img_binary = get_segments_image()
+    for arguments in [{'seed': 3}, {'seed': 4, 'max_votes': 200, 'line_gap': 1}]:
+        H_a, L_a, res_a = my_progressive_probabilistic_hough_transform(img_binary, 1, np.pi / 180, 3, **arguments)
+        H_b, L_b, res_b = my_progressive_probabilistic_hough_transform(img_binary, 1, np.pi / 180, 3, **arguments)
+        assert np.array_equal(H_a, H_b) and np.array_equal(L_a, L_b) and res_a == res_b
+
+
+@pytest.mark.parametrize('d_rho, d_theta, coarse_factor', [(1, np.pi / 180, 4), (2, np.pi / 90, 3),
+                                                          (0.5, np.pi / 360, 8)])
+@pytest.mark.parametrize('image', ['rectangle', 'segments'])
+def test_coarse_to_fine_lines_match_my_hough_transform(d_rho, d_theta, coarse_factor, image):
+    img_binary = get_rotated_rectangle()[0] if image == 'rectangle' else get_segments_image()
+    distances = {'min_rho_distance': 5, 'min_theta_distance': np.deg2rad(5)}
+    _, L, _ = my_hough_transform(img_binary, d_rho, d_theta, 4, **distances)
+    _, L_coarse_to_fine, _ = my_coarse_to_fine_hough_transform(img_binary, d_rho, d_theta, 4, coarse_factor,
+                                                               **distances)
+
+    # Every line is found within one fine cell (of rho and of theta).
+    assert L_coarse_to_fine.shape == L.shape
+    for rho, theta in L:
+        assert np.any((np.abs(L_coarse_to_fine[:, 0] - rho) <= d_rho + 1e-9)
+                      & (np.abs(L_coarse_to_fine[:, 1] - theta) <= d_theta + 1e-9))
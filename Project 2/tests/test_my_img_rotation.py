@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import my_img_rotation as my_img_rotation_module
+from my_img_rotation import my_img_rotation
+from my_img_rotation import my_img_rotation_with_loops
+from my_img_rotation import my_img_rotation_by_shears
+
+ANGLES = [0, np.pi / 6, np.pi / 2, 2.0, np.pi, -0.7]
+
+
+def get_test_img(shape, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, shape).astype(np.uint8)
+
+
+@pytest.mark.parametrize('shape', [(13, 17), (12, 9, 3)])
+@pytest.mark.parametrize('angle', ANGLES)
+def test_matches_loops(shape, angle):
+    img = get_test_img(shape)
+    expected = my_img_rotation_with_loops(img, angle)
+    rot_img = my_img_rotation(img, angle)
+    assert rot_img.dtype == np.uint8
+    np.testing.assert_array_equal(rot_img, expected)
+
+
+@pytest.mark.parametrize('shape', [(13, 17), (12, 9, 3)])
+def test_average_interpolation_matches_loops(shape):
+    img = get_test_img(shape, seed=1)
+    for angle in ANGLES:
+        expected = my_img_rotation_with_loops(img, angle)
+        np.testing.assert_array_equal(my_img_rotation(img, angle, 'average'), expected)
+        out = np.full(expected.shape, 7, dtype=np.uint8)
+        assert my_img_rotation(img, angle, 'average', out) is out
+        np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize('interpolation', ['nearest', 'bilinear', 'bicubic'])
+def test_interpolations_keep_type_and_constant_image(interpolation):
+    img = np.full((12, 9, 3), 200, dtype=np.uint8)
+    rot_img = my_img_rotation(img, 0.5, interpolation)
+    assert rot_img.dtype == np.uint8
+    assert rot_img.shape == my_img_rotation_with_loops(img, 0.5).shape
+    # The pixels inside the rotated image keep the constant value, the pixels outside it are 0.
+    assert set(np.unique(rot_img)) <= {0, 200}
+    assert np.count_nonzero(rot_img) > 0.75 * img.size
+    # At angle 0 an image with even dimensions is copied (with an odd dimension the centers are half a pixel apart).
+    img = get_test_img((12, 10, 3), seed=2)
+    np.testing.assert_array_equal(my_img_rotation(img, 0, interpolation), img)
+
+
+def test_unknown_interpolation():
+    with pytest.raises(ValueError):
+        my_img_rotation(get_test_img((5, 5)), 0.3, 'lanczos')
+
+
+# At multiples of 90 degrees the shears are integer shifts, if a dimension of the image is even.
+@pytest.mark.parametrize('shape', [(8, 10, 3), (9, 8), (8, 9, 3)])
+@pytest.mark.parametrize('angle', [0, np.pi / 2, -np.pi / 2, np.pi])
+@pytest.mark.parametrize('interpolation', ['bilinear', 'bicubic'])
+def test_shears_match_gather_at_quarters(shape, angle, interpolation):
+    img = get_test_img(shape, seed=3)
+    np.testing.assert_array_equal(my_img_rotation_by_shears(img, angle, interpolation),
+                                  my_img_rotation(img, angle, interpolation))
+
+
+@pytest.mark.parametrize('interpolation', ['nearest', 'bilinear', 'bicubic'])
+def test_shears_match_gather_at_quarters_of_even_image(interpolation):
+    img = get_test_img((8, 10, 3), seed=4)
+    for angle in [0, np.pi / 2, -np.pi / 2, np.pi]:
+        np.testing.assert_array_equal(my_img_rotation_by_shears(img, angle, interpolation),
+                                      my_img_rotation(img, angle, interpolation))
+
+
+def test_shears_are_close_to_gather_and_use_the_executor(monkeypatch):
+    # A smooth image, so that the two interpolations are close inside the rotated image.
+    rows, cols = np.mgrid[0:60, 0:80]
+    img = (127 + 100 * np.sin(rows / 9) * np.cos(cols / 11)).astype(np.uint8)
+    gathered = my_img_rotation(img, 0.6, 'bilinear')
+    sheared = my_img_rotation_by_shears(img, 0.6, 'bilinear')
+    assert sheared.shape == gathered.shape
+    both_inside = (gathered > 0) & (sheared > 0)
+    assert np.mean(np.abs(sheared[both_inside].astype(int) - gathered[both_inside])) < 1.5
+
+    # The blocks (small ones here) of the three passes are calculated with the given executor, with the same result.
+    monkeypatch.setattr(my_img_rotation_module, 'PIXELS_PER_BLOCK', 500)
+    out = np.empty_like(sheared)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert my_img_rotation_by_shears(img, 0.6, 'bilinear', out, executor) is out
+    np.testing.assert_array_equal(out, sheared)
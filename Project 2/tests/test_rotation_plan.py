@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from my_img_rotation import my_img_rotation
+from my_img_rotation import INTERPOLATIONS
+from rotation_plan import RotationPlan
+from rotation_plan import RotationPlanCache
+from rotation_plan import get_max_plan_size
+import rotation_plan
+
+ANGLES = [0, np.pi / 6, np.pi / 2, 2.0, -0.7]
+
+
+@pytest.mark.parametrize('shape', [(13, 17), (12, 9, 3)])
+@pytest.mark.parametrize('interpolation', INTERPOLATIONS)
+def test_plan_matches_my_img_rotation(shape, interpolation):
+    img = np.random.default_rng(0).integers(0, 256, shape).astype(np.uint8)
+    for angle in ANGLES:
+        expected = my_img_rotation(img, angle, interpolation)
+        plan = RotationPlan(shape, angle, interpolation)
+        np.testing.assert_array_equal(plan.rotate(img), expected)
+        np.testing.assert_array_equal(my_img_rotation(img, angle, interpolation, plan_cache=RotationPlanCache()),
+                                      expected)
+
+
+@pytest.mark.parametrize('interpolation', INTERPOLATIONS)
+def test_plan_writes_non_contiguous_out(interpolation):
+    img = np.random.default_rng(1).integers(0, 256, (12, 9, 3)).astype(np.uint8)
+    expected = my_img_rotation(img, 0.5, interpolation)
+
+    # A transposed array and a slice of a larger array, filled with other values.
+    transposed = np.full(expected.shape[::-1], 7, dtype=np.uint8).T
+    padded = np.full((expected.shape[0], expected.shape[1] + 5, 3), 7, dtype=np.uint8)
+    for out in [transposed, padded[:, 2:-3]]:
+        assert not out.flags.c_contiguous
+        assert RotationPlan(img.shape, 0.5, interpolation).rotate(img, out) is out
+        np.testing.assert_array_equal(out, expected)
+    assert np.all(padded[:, :2] == 7) and np.all(padded[:, -3:] == 7)
+
+
+# The indices of the output pixels and the taps: 4 bytes for every index and every weight
+# (with the separable weights of 'bilinear' and 'bicubic').
+@pytest.mark.parametrize('interpolation, bytes_per_pixel', [('nearest', 8), ('average', 20), ('bilinear', 36),
+                                                            ('bicubic', 68)])
+def test_plan_size(interpolation, bytes_per_pixel):
+    plan = RotationPlan((40, 50), 0.4, interpolation)
+    assert plan.nbytes == bytes_per_pixel * len(plan.inside_indices)
+    assert get_max_plan_size((40, 50, 3), 0.4, interpolation) == bytes_per_pixel * plan.rot_shape[0] * plan.rot_shape[1]
+
+
+@pytest.mark.parametrize('interpolation', INTERPOLATIONS)
+def test_too_large_plan_is_not_calculated(interpolation, monkeypatch):
+    img = np.random.default_rng(2).integers(0, 256, (30, 20, 3)).astype(np.uint8)
+    expected = my_img_rotation(img, 0.6, interpolation)
+    max_bytes = get_max_plan_size(img.shape, 0.6, interpolation)
+
+    # The plan that fits (exactly) is calculated and stored.
+    cache = RotationPlanCache(max_bytes=max_bytes)
+    np.testing.assert_array_equal(my_img_rotation(img, 0.6, interpolation, plan_cache=cache), expected)
+    assert cache.get_statistics()['plans'] == 1
+
+    # With a smaller cache, the image is rotated without a plan.
+    def fail(*args):
+        raise AssertionError("A plan was calculated")
+    monkeypatch.setattr(rotation_plan, 'RotationPlan', fail)
+    cache = RotationPlanCache(max_bytes=max_bytes - 1)
+    for _ in range(2):
+        assert cache.get_plan(img.shape, 0.6, interpolation) is None
+        np.testing.assert_array_equal(my_img_rotation(img, 0.6, interpolation, plan_cache=cache), expected)
+    statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses'], statistics['uncached'], statistics['plans']) == (0, 4, 4, 0)
+
+
+def test_cache_reuses_and_evicts_plans():
+    cache = RotationPlanCache(max_plans=2)
+    plan = cache.get_plan((20, 30), 0.3, 'bilinear')
+    assert cache.get_plan((20, 30, 3), 0.3, 'bilinear') is plan
+    cache.get_plan((20, 30), 0.4, 'bilinear')
+    cache.get_plan((20, 30), 0.5, 'bilinear')
+    statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses'], statistics['evictions'], statistics['plans']) == (1, 3, 1, 2)
+    assert cache.get_plan((20, 30), 0.3, 'bilinear') is not plan
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from harris_corner_detector import my_corner_harris
+from harris_corner_detector import my_corner_harris_fast
+from harris_corner_detector import my_corner_peaks
+from tiled_harris_corner_detector import my_corner_harris_tiled
+
+TILE_SIZE = 32
+
+
+# An image of bright rectangles whose corners are on the seams of the tiles of TILE_SIZE (and one pixel
+# before or after them), with some noise, so that many corners are found on the seams.
+def get_image_with_corners_on_seams(img_shape=(150, 170)):
+    rng = np.random.default_rng(0)
+    img = rng.normal(0, 2, img_shape)
+    for top, left, offset in [(1, 1, 0), (2, 3, -1), (3, 1, 1), (1, 4, 0)]:
+        row, col = top * TILE_SIZE + offset, left * TILE_SIZE - offset
+        img[row:row + 20, col:col + 25] += 100
+    return img
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('min_distance, max_corners', [(0, None), (5, 10)])
+def test_tiled_corners_match_untiled(workers, min_distance, max_corners):
+    img = get_image_with_corners_on_seams()
+    k, sigma, rel_threshold = 0.05, 1.5, 0.01
+    expected, expected_scores = my_corner_peaks(my_corner_harris(img, k, sigma), rel_threshold,
+                                                min_distance=min_distance, max_corners=max_corners,
+                                                return_scores=True)
+
+    corners, scores = my_corner_harris_tiled(img, k, sigma, rel_threshold, TILE_SIZE, min_distance=min_distance,
+                                             max_corners=max_corners, return_scores=True, workers=workers)
+    np.testing.assert_array_equal(corners, expected)
+    np.testing.assert_array_equal(scores, expected_scores)
+
+    # The test is meaningful only if some corners are on (or next to) the seams of the tiles.
+    distance_to_seam = np.minimum(corners % TILE_SIZE, TILE_SIZE - corners % TILE_SIZE)
+    assert np.any(np.min(distance_to_seam, axis=1) <= 1)
+
+
+def test_tiled_corners_of_npy_file_match_untiled_fast(tmp_path):
+    img = get_image_with_corners_on_seams()
+    filename = tmp_path / 'img.npy'
+    np.save(filename, img)
+    k, sigma, rel_threshold = 0.05, 2.0, 0.01
+    expected = my_corner_peaks(my_corner_harris_fast(img, k, sigma), rel_threshold)
+    np.testing.assert_array_equal(my_corner_harris_tiled(filename, k, sigma, rel_threshold, TILE_SIZE, workers=1,
+                                                         fast=True), expected)